@@ -0,0 +1,715 @@
+#!/usr/bin/env python3
+
+# Benchmarks for logseq_to_obsidian.py
+#
+# Generates a reproducible synthetic Logseq graph and times the conversion stages on it:
+#
+# > python bench_logseq_to_obsidian.py --pages 2000 --journals 1000 --json bench.json
+# > python bench_logseq_to_obsidian.py --pages 2000 --journals 1000 --compare bench.json
+
+import argparse
+import datetime
+import os
+import json
+import logging
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+from contextlib import contextmanager
+from pathlib import Path
+from unittest import mock
+
+try:
+    import resource # not available on Windows
+except ImportError:
+    resource = None
+
+import logseq_to_obsidian
+from logseq_to_obsidian import (FileIndex, from_logseq_line, replace_any_linked_items, replace_tags,
+                                parse_property_block, format_frontmatter)
+
+
+def best_of(repeat, func, *args):
+    '''Returns the fastest of `repeat` timed calls of func(*args), in seconds.'''
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+# Peak RSS of a child process: VmHWM on Linux, as ru_maxrss is kept across exec (the parent's peak before it)
+CHILD_PEAK_RSS = '''
+import resource
+def peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            return next(int(line.split()[1]) for line in f if line.startswith('VmHWM:')) / 1024
+    except (OSError, StopIteration):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+'''
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# --- Synthetic graphs ---
+
+GRAPH_DEFAULTS = {
+    'pages': 500,
+    'journals': 250,
+    'lines': 20,            # average lines per page or journal
+    'link_density': 0.3,    # average [[links]] per line
+    'tag_density': 0.2,     # average #tags per line
+    'namespaces': 0.2,      # fraction of pages in a namespace (ns___page.md)
+    'properties': 0.5,      # fraction of pages with a property block
+    'code_blocks': 0.1,     # fraction of pages with a fenced code block
+    'assets': 50,           # number of files in assets/
+    'asset_size': 4096,     # bytes per asset
+    'excalidraw': 10,       # number of excalidraw pages
+    'seed': 1,
+}
+
+WORDS = ("the meeting notes about project roadmap follow up with team on design review "
+         "ideas draft summary later check status call email budget plan").split()
+
+
+def _page_name(i, namespaced):
+    return f"ns{i % 7}/page_{i}" if namespaced else f"page_{i}"
+
+
+def _count(rng, density):
+    '''A random count with `density` as average.'''
+    count = int(density)
+    return count + (1 if rng.random() < density - count else 0)
+
+
+def _block_line(rng, params, page_names, asset_count):
+    words = rng.choices(WORDS, k=rng.randint(4, 12))
+    for _ in range(_count(rng, params['link_density'])):
+        words.insert(rng.randrange(len(words) + 1), f"[[{rng.choice(page_names)}]]")
+    for _ in range(_count(rng, params['tag_density'])):
+        # about half of the tags refer to existing pages
+        tag = rng.choice(page_names) if rng.random() < 0.5 else f"topic_{rng.randrange(100)}"
+        words.insert(rng.randrange(len(words) + 1), f"#{tag}")
+    if asset_count and rng.random() < 0.05:
+        words.append(f"![image](../assets/image_{rng.randrange(asset_count)}.png)")
+    marker = rng.choice(("", "", "", "", "TODO ", "DONE ", "LATER "))
+    return "\t" * rng.randint(0, 3) + "- " + marker + " ".join(words)
+
+
+def _page_content(rng, params, page_names, with_properties):
+    lines = []
+    if with_properties:
+        lines += [
+            f"alias:: {rng.choice(WORDS)} {rng.choice(WORDS)}",
+            f"tags:: [{rng.choice(WORDS)}, {rng.choice(WORDS)}]",
+            f"public:: {rng.choice(('true', 'false'))}",
+            f"rank:: {rng.randrange(10)}",
+            "",
+        ]
+    count = rng.randint(1, max(1, 2 * params['lines'] - 1))
+    for _ in range(count):
+        lines.append(_block_line(rng, params, page_names, params['assets']))
+    if rng.random() < params['code_blocks']:
+        at = rng.randrange(len(lines) + 1)
+        lines[at:at] = ["- ```python", "  def example(x):", "      return x # [[not a link]]", "  ```"]
+    return "\n".join(lines) + "\n"
+
+
+def _excalidraw_content(rng, i):
+    elements = [{"id": f"el{i}_{n}", "type": "rectangle", "x": rng.random() * 1000, "y": rng.random() * 1000,
+                 "width": 100, "height": 50, "strokeColor": "#1e1e1e"} for n in range(rng.randint(5, 50))]
+    drawing = json.dumps({"elements": elements, "appState": {"viewBackgroundColor": "#ffffff"}, "files": {}})
+    return (f"excalidraw-plugin:: true\n"
+            f"excalidraw-plugin-alias:: Drawing {i}\n"
+            f"\n"
+            f"- {{{{renderer excalidraw-menu, excalidraw-2025-01-01-00-00-{i:02d}}}}}\n"
+            f"- ```json\n"
+            f"  {drawing}\n"
+            f"  ```\n")
+
+
+def generate_graph(graph_path, **params):
+    '''
+    Writes a synthetic Logseq graph to graph_path. The same parameters (see GRAPH_DEFAULTS)
+    always produce the same graph. Returns the parameters used.
+    '''
+    params = {**GRAPH_DEFAULTS, **params}
+    rng = random.Random(params['seed'])
+    graph_path = Path(graph_path)
+    for directory in ("pages", "journals", "assets", "logseq"):
+        (graph_path / directory).mkdir(parents=True, exist_ok=True)
+
+    page_names = [_page_name(i, rng.random() < params['namespaces']) for i in range(params['pages'])]
+    for name in page_names:
+        content = _page_content(rng, params, page_names, rng.random() < params['properties'])
+        (graph_path / "pages" / f"{name.replace('/', '___')}.md").write_text(content, encoding='utf-8')
+
+    day = datetime.date(2020, 1, 1)
+    for i in range(params['journals']):
+        content = _page_content(rng, params, page_names, False)
+        (graph_path / "journals" / f"{day + datetime.timedelta(days=i):%Y_%m_%d}.md").write_text(content, encoding='utf-8')
+
+    for i in range(params['assets']):
+        (graph_path / "assets" / f"image_{i}.png").write_bytes(rng.randbytes(params['asset_size']))
+
+    for i in range(params['excalidraw']):
+        name = f"excalidraw-2025-01-01-00-00-{i:02d}.md"
+        (graph_path / "pages" / name).write_text(_excalidraw_content(rng, i), encoding='utf-8')
+
+    (graph_path / "logseq" / "config.edn").write_text("{:meta/version 1}\n", encoding='utf-8')
+    return params
+
+
+# --- Graph benchmarks ---
+
+def _stage(seconds, files, size):
+    return {
+        'seconds': round(seconds, 4),
+        'files': files,
+        'files_per_s': round(files / seconds, 1) if seconds else None,
+        'mb_per_s': round(size / seconds / 1e6, 2) if seconds and size is not None else None,
+        'peak_rss_mb': None, # set by bench_graph
+    }
+
+
+GRAPH_STAGES = ('create_file_index', 'process_logseq_md_file', 'page_parser=blocks', 'process_logseq_excalidraw_file',
+                'convert_logseq_to_obsidian')
+
+def graph_stage(stage, graph_path, work_path, jobs=1):
+    '''
+    Times one stage of bench_graph, see GRAPH_STAGES. The stages after create_file_index first
+    build the file index they need, untimed. Returns the results of the stage by their name in
+    print_graph_results (create_file_index also returns the alias scan in it).
+    '''
+    graph_path = Path(graph_path).resolve()
+    work_path = Path(work_path)
+    md_files = sorted(graph_path.glob("journals/**/*.md")) + sorted(graph_path.glob("pages/**/*.md"))
+    excalidraw_files = [md_file for md_file in md_files if logseq_to_obsidian.EXCALIDRAW_FILE_PATTERN.match(md_file.name)]
+    page_files = [md_file for md_file in md_files if not logseq_to_obsidian.EXCALIDRAW_FILE_PATTERN.match(md_file.name)]
+
+    def size(files):
+        return sum(path.stat().st_size for path in files)
+
+    results = {}
+    saved_index, saved_graph = logseq_to_obsidian.file_index, getattr(logseq_to_obsidian, 'logseq_graph_path', None)
+    try:
+        start = time.perf_counter()
+        index = logseq_to_obsidian.create_file_index(graph_path)
+        if stage == 'create_file_index':
+            results['create_file_index'] = _stage(time.perf_counter() - start, len(index), None)
+            # included in create_file_index
+            results['  alias_index'] = _stage(logseq_to_obsidian.stage_metrics['alias_index']['seconds'], len(md_files), None)
+            return results
+
+        logseq_to_obsidian.file_index = index
+        logseq_to_obsidian.logseq_graph_path = graph_path
+
+        if stage in ('process_logseq_md_file', 'page_parser=blocks'):
+            page_parser = 'blocks' if stage == 'page_parser=blocks' else 'lines'
+            vault = work_path / f"{page_parser}-vault"
+            start = time.perf_counter()
+            for md_file in page_files:
+                logseq_to_obsidian.process_logseq_md_file(md_file, vault, errors=[], page_parser=page_parser)
+            results[stage if page_parser == 'lines' else f"  {stage}"] = _stage(time.perf_counter() - start, len(page_files), size(page_files))
+        elif stage == 'process_logseq_excalidraw_file':
+            excalidraw_vault = work_path / "excalidraw-vault"
+            excalidraw_vault.mkdir(parents=True, exist_ok=True)
+            start = time.perf_counter()
+            for md_file in excalidraw_files:
+                logseq_to_obsidian.process_logseq_excalidraw_file(graph_path, md_file, excalidraw_vault)
+            results[stage] = _stage(time.perf_counter() - start, len(excalidraw_files), size(excalidraw_files))
+        elif stage == 'convert_logseq_to_obsidian':
+            graph_files = [path for path in graph_path.rglob("*") if path.is_file()]
+            vault = work_path / "vault"
+            start = time.perf_counter()
+            logseq_to_obsidian.convert_logseq_to_obsidian(graph_path, vault, force_overwrite=True, clean=True, jobs=jobs)
+            results[stage] = _stage(time.perf_counter() - start, len(graph_files), size(graph_files))
+        else:
+            raise ValueError(f"Unknown stage: {stage}")
+    finally:
+        logseq_to_obsidian.file_index = saved_index
+        logseq_to_obsidian.logseq_graph_path = saved_graph
+    return results
+
+
+# runs one stage of bench_graph, so that the peak RSS is the one of that stage (and the index it needs)
+GRAPH_STAGE_CHILD = CHILD_PEAK_RSS + '''
+import json, logging, sys
+sys.path.insert(0, sys.argv[1])
+import bench_logseq_to_obsidian
+logging.getLogger().setLevel(logging.ERROR)
+results = bench_logseq_to_obsidian.graph_stage(sys.argv[2], sys.argv[3], sys.argv[4], int(sys.argv[5]))
+peak = peak_rss_mb()
+print(json.dumps({name: dict(result, peak_rss_mb=peak) for name, result in results.items()}))
+'''
+
+def bench_graph(graph_path, work_path, jobs=1):
+    '''
+    Times create_file_index (and the alias scan in it), process_logseq_md_file (with both page parsers), process_logseq_excalidraw_file and a full
+    convert_logseq_to_obsidian run on a graph. Converted files are written below work_path. Each stage runs in a
+    process of its own, so its peak RSS is not the highest of the stages before it (without the resource module, the
+    stages run in this process and have no peak RSS).
+    '''
+    results = {}
+    for stage in GRAPH_STAGES:
+        if resource is None:
+            results.update(graph_stage(stage, graph_path, work_path, jobs))
+            continue
+        output = subprocess.run([sys.executable, '-c', GRAPH_STAGE_CHILD, str(Path(__file__).resolve().parent), stage,
+                                 str(graph_path), str(work_path), str(jobs)], capture_output=True, text=True, check=True).stdout
+        results.update(json.loads(output))
+    return results
+
+
+def _column(value, width, precision):
+    return f"{'-':>{width}}" if value is None else f"{value:>{width}.{precision}f}"
+
+
+def print_graph_results(results, baseline=None):
+    print(f"{'stage':<32} {'seconds':>9} {'files/s':>10} {'MB/s':>8} {'peak RSS MB':>12}" + ("   vs baseline" if baseline else ""))
+    for stage, result in results.items():
+        line = (f"{stage:<32} {result['seconds']:>9.3f} {_column(result['files_per_s'], 10, 1)} "
+                f"{_column(result['mb_per_s'], 8, 2)} {_column(result['peak_rss_mb'], 12, 1)}")
+        if baseline and stage in baseline and result['seconds']:
+            line += f"   {baseline[stage]['seconds'] / result['seconds']:>6.2f}x"
+        print(line)
+
+
+# --- Micro benchmarks ---
+
+def bench_long_lines(link_counts=(1000, 2000, 4000), repeat=5):
+    '''
+    Times the link and tag rewrites on single lines with many links, like generated index pages.
+    The time per link should stay flat as lines get longer (linear in the line length).
+    '''
+    saved_index = logseq_to_obsidian.file_index
+    logseq_to_obsidian.file_index = FileIndex({f"page{i}": f"pages/page{i}.md" for i in range(0, max(link_counts), 2)}).build_lookup()
+    results = []
+    try:
+        for count in link_counts:
+            link_line = " ".join(f"[[ns/page{i}]]" for i in range(count))
+            tag_line = " ".join(f"#page{i}" for i in range(count))
+            mixed_line = "- " + " ".join(f"[[ns/page{i}]] #page{i}" for i in range(count // 2))
+            result = {
+                'links': count,
+                'replace_any_linked_items': best_of(repeat, replace_any_linked_items, link_line),
+                'replace_tags': best_of(repeat, replace_tags, tag_line),
+                'from_logseq_line': best_of(repeat, from_logseq_line, mixed_line),
+            }
+            results.append(result)
+    finally:
+        logseq_to_obsidian.file_index = saved_index
+    return results
+
+
+def print_long_lines(results):
+    print(f"{'links/line':>10} {'linked items':>14} {'tags':>14} {'full line':>14}   (microseconds per link)")
+    for result in results:
+        count = result['links']
+        print(f"{count:>10} "
+              f"{result['replace_any_linked_items'] / count * 1e6:>14.3f} "
+              f"{result['replace_tags'] / count * 1e6:>14.3f} "
+              f"{result['from_logseq_line'] / count * 1e6:>14.3f}")
+
+
+def bench_property_blocks(property_counts=(10, 100, 1000), body_lines=10000, repeat=5):
+    '''
+    Times parsing the property block of a page and building its frontmatter, for pages with
+    large property blocks followed by a long body (which the parser must not scan).
+    '''
+    results = []
+    for count in property_counts:
+        values = ("some text", "[a, b, c]", "true", "42", '"quoted"')
+        lines = [f"prop-{i}:: {values[i % len(values)]}" for i in range(count)]
+        lines += [""] + ["- body line with [[link]]"] * body_lines
+
+        def parse_and_format():
+            format_frontmatter(parse_property_block(lines).properties)
+
+        results.append({'properties': count, 'seconds': best_of(repeat, parse_and_format)})
+    return results
+
+
+def print_property_blocks(results):
+    print(f"{'properties':>10} {'parse + frontmatter':>20}   (microseconds per property)")
+    for result in results:
+        print(f"{result['properties']:>10} {result['seconds'] / result['properties'] * 1e6:>20.3f}")
+
+
+def bench_large_drawings(sizes_mb=(1, 8, 32), repeat=3):
+    '''
+    Times converting single excalidraw pages with a large embedded drawing (mostly image data,
+    like drawings with pasted screenshots), pretty printed and compact, and the peak memory
+    Python allocated for each.
+    '''
+    results = []
+    with tempfile.TemporaryDirectory(prefix="logseq-bench-drawing-") as tmp:
+        graph_path = Path(tmp)
+        for size in sizes_mb:
+            page = graph_path / f"excalidraw-2024-01-01-{size:02d}-00-00.md"
+            drawing = {"elements": [{"id": f"e{i}", "type": "rectangle", "x": i, "y": i} for i in range(1000)],
+                       "appState": {}, "files": {"img": {"dataURL": "data:image/png;base64," + "A" * (size * 1024 * 1024)}}}
+            page.write_text(f"excalidraw-plugin-alias:: /drawing-{size}/\n- ```json\n  {json.dumps(drawing)}\n  ```\n", encoding='utf-8')
+            del drawing
+            result = {'mb': size}
+            for mode in logseq_to_obsidian.EXCALIDRAW_JSON_FORMATS:
+                convert = lambda: logseq_to_obsidian.process_logseq_excalidraw_file(
+                    graph_path, page, graph_path / mode, compact=mode == 'compact')
+                result[mode] = best_of(repeat, convert)
+                tracemalloc.start()
+                convert()
+                result[f'{mode}_peak_mb'] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+                tracemalloc.stop()
+            results.append(result)
+    return results
+
+
+def print_large_drawings(results):
+    print(f"{'drawing MB':>10} {'pretty s':>10} {'peak MB':>9} {'compact s':>10} {'peak MB':>9}")
+    for result in results:
+        print(f"{result['mb']:>10} {result['pretty']:>10.3f} {result['pretty_peak_mb']:>9.1f} "
+              f"{result['compact']:>10.3f} {result['compact_peak_mb']:>9.1f}")
+
+
+def bench_page_parsers(page_lines=(20, 200, 2000), pages=200, repeat=3):
+    '''
+    Times converting pages in memory line by line and on their block tree (see PAGE_PARSERS),
+    for pages of different lengths with nested blocks and fenced code.
+    '''
+    rng = random.Random(1)
+    page_names = [_page_name(i, i % 5 == 0) for i in range(pages)]
+    saved_index = logseq_to_obsidian.file_index
+    logseq_to_obsidian.file_index = FileIndex({name: f"pages/{name.replace('/', '___')}.md" for name in page_names}).build_lookup()
+    results = []
+    try:
+        for lines in page_lines:
+            params = dict(GRAPH_DEFAULTS, lines=lines, code_blocks=1.0)
+            contents = [_page_content(rng, params, page_names, i % 2 == 0) for i in range(pages)]
+            line_count = sum(content.count("\n") for content in contents)
+            result = {'lines': lines, 'total_lines': line_count}
+            for page_parser in logseq_to_obsidian.PAGE_PARSERS:
+                result[f'{page_parser}_seconds'] = best_of(repeat, lambda: [logseq_to_obsidian.convert_page_content(content, page_parser=page_parser)
+                                                                            for content in contents])
+            results.append(result)
+    finally:
+        logseq_to_obsidian.file_index = saved_index
+    return results
+
+
+def print_page_parsers(results):
+    print(f"{'lines/page':>10} {'lines klines/s':>15} {'blocks klines/s':>16} {'speedup':>8}")
+    for result in results:
+        total = result['total_lines']
+        print(f"{result['lines']:>10} {total / result['lines_seconds'] / 1e3:>15.1f} {total / result['blocks_seconds'] / 1e3:>16.1f} "
+              f"{result['lines_seconds'] / result['blocks_seconds']:>8.2f}")
+
+
+def bench_block_index(block_counts=(10000, 100000, 300000), blocks_per_page=50, repeat=3):
+    '''
+    Times indexing the referenced blocks (id:: properties) of a graph, and the time per
+    ((uuid)) lookup, for graphs with many referenced blocks.
+    '''
+    results = []
+    rng = random.Random(1)
+    for count in block_counts:
+        with tempfile.TemporaryDirectory(prefix="logseq-bench-blocks-") as tmp:
+            graph_path = Path(tmp)
+            (graph_path / "pages").mkdir()
+            uuids = [str(uuid.UUID(int=rng.getrandbits(128), version=4)) for _ in range(count)]
+            for page, start in enumerate(range(0, count, blocks_per_page)):
+                (graph_path / "pages" / f"page{page}.md").write_text(
+                    "".join(f"- block {i} with some text\n  id:: {uuids[i]}\n\t- child\n"
+                            for i in range(start, min(start + blocks_per_page, count))), encoding='utf-8')
+            index = logseq_to_obsidian.create_file_index(graph_path, block_refs=True)
+            seconds = best_of(repeat, logseq_to_obsidian.create_file_index, graph_path, False, True)
+            lookups = best_of(repeat, lambda: [index.find_block(block_uuid) for block_uuid in uuids])
+            results.append({'blocks': count, 'index': seconds, 'lookup': lookups / count})
+    return results
+
+
+def print_block_index(results):
+    print(f"{'blocks':>10} {'index s':>10} {'lookup us':>10}")
+    for result in results:
+        print(f"{result['blocks']:>10} {result['index']:>10.3f} {result['lookup'] * 1e6:>10.3f}")
+
+
+# runs in a process of its own, so that its peak RSS is the one of the backend alone
+INDEX_BACKEND_CHILD = CHILD_PEAK_RSS + '''
+import json, sys, time
+sys.path.insert(0, sys.argv[1])
+import logseq_to_obsidian
+graph, index_db = sys.argv[2], sys.argv[3] or None
+start = time.perf_counter()
+index = logseq_to_obsidian.create_file_index(logseq_to_obsidian.Path(graph), index_db=index_db)
+index_seconds = time.perf_counter() - start
+count = 0
+start = time.perf_counter()
+for name in index:
+    index.resolve(name.casefold())
+    count += 1
+lookup_seconds = (time.perf_counter() - start) / count
+print(json.dumps({'index': index_seconds, 'lookup': lookup_seconds, 'peak_rss_mb': peak_rss_mb()}))
+'''
+
+def bench_index_backends(page_counts=(5000, 20000, 80000)):
+    '''
+    Builds the file index of graphs of page_counts pages (with long names and an alias each) in
+    memory and in an sqlite database (see DiskFileIndex), each in a process of its own, and
+    compares the time to build it, the time per lookup and the peak RSS of the process.
+    '''
+    if resource is None:
+        return []
+    results = []
+    for count in page_counts:
+        with tempfile.TemporaryDirectory(prefix="logseq-bench-index-") as tmp:
+            graph_path = Path(tmp) / "graph"
+            (graph_path / "pages").mkdir(parents=True)
+            for i in range(count):
+                name = f"project___area {i % 97}___a page with a fairly long name number {i}"
+                (graph_path / "pages" / f"{name}.md").write_text(f"alias:: page alias {i}\n\n- text\n", encoding='utf-8')
+            result = {'pages': count}
+            for backend, index_db in (('memory', ''), ('sqlite', str(Path(tmp) / "index.db"))):
+                output = subprocess.run([sys.executable, '-c', INDEX_BACKEND_CHILD, str(Path(__file__).resolve().parent), str(graph_path), index_db],
+                                        capture_output=True, text=True, check=True).stdout
+                result[backend] = json.loads(output)
+            results.append(result)
+    return results
+
+
+def print_index_backends(results):
+    print(f"{'pages':>8} {'memory s':>9} {'lookup us':>10} {'peak MB':>8} {'sqlite s':>9} {'lookup us':>10} {'peak MB':>8}")
+    for result in results:
+        memory, sqlite = result['memory'], result['sqlite']
+        print(f"{result['pages']:>8} {memory['index']:>9.3f} {memory['lookup'] * 1e6:>10.2f} {memory['peak_rss_mb']:>8.1f} "
+              f"{sqlite['index']:>9.3f} {sqlite['lookup'] * 1e6:>10.2f} {sqlite['peak_rss_mb']:>8.1f}")
+
+
+RUN_MEMORY_CHILD = CHILD_PEAK_RSS + '''
+import json, logging, sys, time
+sys.path.insert(0, sys.argv[1])
+import logseq_to_obsidian
+graph, vault, index_db = logseq_to_obsidian.Path(sys.argv[2]).resolve(), sys.argv[3], sys.argv[4] or None
+logging.getLogger().setLevel(logging.ERROR)
+start = time.perf_counter()
+logseq_to_obsidian.logseq_graph_path = graph
+logseq_to_obsidian.file_index = logseq_to_obsidian.create_file_index(graph, index_db=index_db)
+logseq_to_obsidian.convert_logseq_to_obsidian(graph, vault, force_overwrite=True, clean=True, stream_errors=index_db is not None)
+print(json.dumps({'seconds': time.perf_counter() - start, 'peak_rss_mb': peak_rss_mb()}))
+'''
+
+def bench_run_memory(page_counts=(2000, 8000, 32000)):
+    '''
+    Converts synthetic graphs of page_counts pages (and a journal for every fourth page) with the
+    file index in memory, and in an sqlite database with the errors streamed to the vault (see
+    DiskFileIndex and ErrorLog), each full run in a process of its own, and compares their time
+    and the peak RSS of the process, which should stay flat with sqlite as the graph grows.
+    '''
+    if resource is None:
+        return []
+    results = []
+    for count in page_counts:
+        with tempfile.TemporaryDirectory(prefix="logseq-bench-run-") as tmp:
+            graph_path = Path(tmp) / "graph"
+            generate_graph(graph_path, pages=count, journals=count // 4, excalidraw=0)
+            result = {'pages': count}
+            for backend, index_db in (('memory', ''), ('sqlite', str(Path(tmp) / "index.db"))):
+                output = subprocess.run([sys.executable, '-c', RUN_MEMORY_CHILD, str(Path(__file__).resolve().parent), str(graph_path),
+                                         str(Path(tmp) / f"{backend}-vault"), index_db], capture_output=True, text=True, check=True).stdout
+                result[backend] = json.loads(output)
+            results.append(result)
+    return results
+
+
+def print_run_memory(results):
+    print(f"{'pages':>8} {'memory s':>9} {'peak MB':>8} {'sqlite s':>9} {'peak MB':>8}")
+    for result in results:
+        memory, sqlite = result['memory'], result['sqlite']
+        print(f"{result['pages']:>8} {memory['seconds']:>9.3f} {memory['peak_rss_mb']:>8.1f} {sqlite['seconds']:>9.3f} {sqlite['peak_rss_mb']:>8.1f}")
+
+
+def bench_logging(pages=300, lines=200, repeat=3):
+    '''
+    Times a serial conversion logged at the INFO level of the command line (to os.devnull): as it
+    is, with the debug messages formatted as if they were on (what unguarded logging.debug calls
+    cost), and logged at the DEBUG level.
+    '''
+    root = logging.getLogger()
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="logseq-bench-logging-") as tmp, open(os.devnull, 'w') as devnull:
+        graph_path = Path(tmp) / "graph"
+        generate_graph(graph_path, pages=pages, journals=0, assets=20, excalidraw=0, lines=lines)
+        saved_index, saved_graph = logseq_to_obsidian.file_index, logseq_to_obsidian.logseq_graph_path
+        saved_level, saved_handlers = root.level, root.handlers[:]
+        logseq_to_obsidian.file_index = logseq_to_obsidian.create_file_index(graph_path.resolve())
+        logseq_to_obsidian.logseq_graph_path = graph_path.resolve()
+        root.handlers = [logging.StreamHandler(devnull)]
+        root.handlers[0].setFormatter(logging.Formatter(logseq_to_obsidian.LOG_FORMAT))
+        def convert():
+            logseq_to_obsidian.convert_logseq_to_obsidian(graph_path, Path(tmp) / "vault", force_overwrite=True, clean=True, io_threads=0)
+        try:
+            root.setLevel(logging.INFO)
+            results['info'] = best_of(repeat, convert)
+            with mock.patch.object(logseq_to_obsidian, 'debug_enabled', lambda: True):
+                results['info_eager_debug'] = best_of(repeat, convert)
+            root.setLevel(logging.DEBUG)
+            results['debug'] = best_of(repeat, convert)
+        finally:
+            root.setLevel(saved_level)
+            root.handlers = saved_handlers
+            logseq_to_obsidian.file_index = saved_index
+            logseq_to_obsidian.logseq_graph_path = saved_graph
+    return results
+
+
+def print_logging(results):
+    print(f"{'logging':<32} {'seconds':>9}")
+    for key, label in (('info', 'INFO, lazy debug'), ('info_eager_debug', 'INFO, debug formatted'), ('debug', 'DEBUG')):
+        print(f"{label:<32} {results[key]:>9.3f}")
+
+
+@contextmanager
+def throttled_io(latency):
+    '''
+    Adds `latency` seconds to each file read (Path.read_bytes) and each file written (the rename of
+    atomic_write), like a graph and vault on an NFS or SMB mount. The waits release the GIL like
+    network I/O does.
+    '''
+    read_bytes, replace = Path.read_bytes, os.replace
+    def slow_read_bytes(path):
+        time.sleep(latency)
+        return read_bytes(path)
+    def slow_replace(source, target):
+        time.sleep(latency)
+        return replace(source, target)
+    with mock.patch.object(Path, 'read_bytes', slow_read_bytes), mock.patch.object(os, 'replace', slow_replace):
+        yield
+
+
+def bench_io_pipeline(latencies_ms=(0, 1, 5), pages=300, io_threads=(0, logseq_to_obsidian.IO_THREADS)):
+    '''
+    Times serial conversions of a graph with reads and writes in line (io_threads=0) and
+    overlapped with the conversion (see convert_page_files), on throttled I/O (see throttled_io).
+    '''
+    results = []
+    with tempfile.TemporaryDirectory(prefix="logseq-bench-io-") as tmp:
+        graph_path = Path(tmp) / "graph"
+        generate_graph(graph_path, pages=pages, journals=pages // 2, assets=0, excalidraw=0)
+        saved_index, saved_graph = logseq_to_obsidian.file_index, logseq_to_obsidian.logseq_graph_path
+        logseq_to_obsidian.file_index = logseq_to_obsidian.create_file_index(graph_path.resolve())
+        logseq_to_obsidian.logseq_graph_path = graph_path.resolve()
+        try:
+            for latency in latencies_ms:
+                result = {'latency_ms': latency, 'files': pages + pages // 2}
+                for threads in io_threads:
+                    start = time.perf_counter()
+                    with throttled_io(latency / 1000):
+                        logseq_to_obsidian.convert_logseq_to_obsidian(graph_path, Path(tmp) / "vault", force_overwrite=True,
+                                                                      clean=True, io_threads=threads)
+                    result[f'io_threads_{threads}'] = time.perf_counter() - start
+                results.append(result)
+        finally:
+            logseq_to_obsidian.file_index = saved_index
+            logseq_to_obsidian.logseq_graph_path = saved_graph
+    return results
+
+
+def print_io_pipeline(results):
+    columns = [key for key in results[0] if key.startswith('io_threads_')]
+    print(f"{'latency ms':>10} {'files':>7}" + "".join(f" {'='.join(key.rsplit('_', 1)) + ' s':>16}" for key in columns) + f" {'speedup':>8}")
+    for result in results:
+        print(f"{result['latency_ms']:>10} {result['files']:>7}" + "".join(f" {result[key]:>16.3f}" for key in columns)
+              + f" {result[columns[0]] / result[columns[-1]]:>8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Logseq to Obsidian conversion on a synthetic graph.")
+    for key, default in GRAPH_DEFAULTS.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=type(default), default=default,
+                            help=f"Synthetic graph: {key.replace('_', ' ')} (default: {default}).")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Worker processes for the full conversion (default: 1).")
+    parser.add_argument("--graph", help="Benchmark this existing graph instead of generating one.")
+    parser.add_argument("--work-dir", help="Directory for the generated graph and vaults (default: a temporary directory).")
+    parser.add_argument("--skip-micro", action="store_true", help="Skip the micro benchmarks.")
+    parser.add_argument("--json", help="Write the results as JSON to this file.")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare with.")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.ERROR)
+
+    work_path = Path(args.work_dir or tempfile.mkdtemp(prefix="logseq-bench-"))
+    try:
+        if args.graph:
+            graph_path = Path(args.graph)
+            params = {'graph': str(graph_path)}
+        else:
+            graph_path = work_path / "graph"
+            if graph_path.exists():
+                shutil.rmtree(graph_path)
+            params = generate_graph(graph_path, **{key: getattr(args, key) for key in GRAPH_DEFAULTS})
+
+        report = {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'graph': params,
+            'jobs': args.jobs,
+            'results': bench_graph(graph_path, work_path, jobs=args.jobs),
+        }
+        if not args.skip_micro:
+            report['long_lines'] = bench_long_lines()
+            report['property_blocks'] = bench_property_blocks()
+            report['large_drawings'] = bench_large_drawings()
+            report['block_index'] = bench_block_index()
+            report['page_parsers'] = bench_page_parsers()
+            report['io_pipeline'] = bench_io_pipeline()
+            report['logging'] = bench_logging()
+            report['index_backends'] = bench_index_backends()
+            report['run_memory'] = bench_run_memory()
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_path, ignore_errors=True)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+    print_graph_results(report['results'], baseline)
+    if 'long_lines' in report:
+        print()
+        print_long_lines(report['long_lines'])
+        print()
+        print_property_blocks(report['property_blocks'])
+        print()
+        print_large_drawings(report['large_drawings'])
+        print()
+        print_block_index(report['block_index'])
+        print()
+        print_page_parsers(report['page_parsers'])
+        print()
+        print_io_pipeline(report['io_pipeline'])
+        print()
+        print_logging(report['logging'])
+        if report['index_backends']:
+            print()
+            print_index_backends(report['index_backends'])
+        if report['run_memory']:
+            print()
+            print_run_memory(report['run_memory'])
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
@@ -6,10 +6,32 @@ import logging
 import os
 import re
 import shutil
+import sqlite3
+import tempfile
 import argparse
+import fnmatch
 import json
-
+import hashlib
+import heapq
+import io
+import tarfile
+import threading
+import time
+import zipfile
+
+from collections import deque, namedtuple
+from collections.abc import MutableMapping
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache, partial, wraps
+from itertools import groupby, islice
 from pathlib import Path
+from urllib.parse import quote, unquote
+
+try:
+    import fcntl # for reflinks, not available on Windows
+except ImportError:
+    fcntl = None
 
 
 # --- Configuration ---
@@ -17,15 +39,62 @@ LOGSEQ_PAGES_DIR = "pages"
 LOGSEQ_ASSETS_DIR = "assets"
 LOGSEQ_JOURNALS_DIR = "journals"
 LOGSEQ_EXCALIDRAW_DIR = "excalidraw" # Common name, adjust if yours differs
+LOGSEQ_DRAWS_DIR = "draws"
 
 OBSIDIAN_ASSETS_DIR = "assets" # Standard Obsidian assets folder name
 OBSIDIAN_EXCALIDRAW_DIR = "Excalidraw" # Common name for Obsidian Excalidraw plugin folder
 
+# I/O of serial conversions, see prefetch and OutputWriter
+IO_THREADS = 4 # threads reading and threads writing files while pages are converted, 0 to read and write in line
+READ_AHEAD = 32 # source files read before they are converted, at most
+WRITE_BEHIND = 32 # converted files waiting to be written, at most
+
+# Parallel conversions, see convert_page_files
+PARALLEL_CHUNK = 64 # files sent to a worker process at once, at most
+
 
 
 
 # --- Logging Setup ---
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# configured by the command line (see the end of this file), importing this module leaves logging alone
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+PROGRESS_INTERVAL = 5.0 # seconds between two progress messages while journals and pages are converted, 0 for none
+
+def debug_enabled():
+    '''
+    Whether debug messages are logged. Debug messages are only formatted (and passed to logging)
+    when it is, so that debug logging costs nothing when it is off, even for each line or link.
+    '''
+    return logging.root.isEnabledFor(logging.DEBUG)
+
+class ProgressReporter:
+    '''
+    Logs how far the conversion of `total` files is every `interval` seconds, with the throughput
+    (files and lines per second) and the time left, instead of a message for each file.
+    '''
+
+    def __init__(self, total, interval=PROGRESS_INTERVAL):
+        self.total = total
+        self.interval = interval
+        self.files = self.lines = 0
+        self.start = self.last = time.perf_counter()
+
+    def update(self, lines=0):
+        '''Counts a converted file of `lines` lines, and logs the progress if it is time to.'''
+        self.files += 1
+        self.lines += lines
+        if self.interval:
+            now = time.perf_counter()
+            if now - self.last >= self.interval:
+                self.last = now
+                self.report(now)
+
+    def report(self, now):
+        elapsed = now - self.start
+        files_per_s = self.files / elapsed
+        left = (self.total - self.files) / files_per_s if files_per_s else 0
+        logging.info(f"Converted {self.files} of {self.total} files ({files_per_s:.0f} files/s, "
+                     f"{self.lines / elapsed:.0f} lines/s), about {left:.0f}s left")
 
 # --- Regex Patterns ---
 # Logseq page properties (key:: value), potentially with leading spaces/tabs
@@ -42,6 +111,9 @@ ASSET_EMBED_LINK_PATTERN = re.compile(r"(!\[.*?\]\()(\.\./" + re.escape(LOGSEQ_A
 # Simpler embed style like ![../assets/image.png] - Less common? Handled by below
 OBSIDIAN_ASSET_EMBED_PATTERN_SIMPLE = re.compile(r"(!\[)(\.\./" + re.escape(LOGSEQ_ASSETS_DIR) + r"/)(.*?)\]")
 
+# Any other reference to a file in the assets folder, e.g. {{pdf ../assets/doc.pdf}} or file-path:: ../assets/doc.pdf
+ASSET_REFERENCE_PATTERN = re.compile(r"\.\./" + re.escape(LOGSEQ_ASSETS_DIR) + r"/([^\s)\]}|\"']+)")
+
 # Inline quotePatterns (e.g., > text) 
 INLINE_BLOCKQUOTE_PATTERN = re.compile(r"^\s*>\s*(.*)")
 
@@ -52,31 +124,216 @@ EXCALIDRAW_LINK_MD_PATTERN = re.compile(r"(!?\[.*?\]\()(\.\./" + re.escape(LOGSE
 EXCALIDRAW_LINK_WIKI_PATTERN = re.compile(r"(!?\[\[)(\.\./" + re.escape(LOGSEQ_EXCALIDRAW_DIR) + r"/)(.*?)\]\]")
 EXCALIDRAW_FILE_PATTERN = re.compile(r'^(excalidraw-\d\d\d\d-.*\.md$)')
 
-migration_errors = [] # List to store errors for output to the user after migration
+# File extension at the end of a (relative) path, e.g. ".md"
+FILE_EXTENSION_PATTERN = re.compile(r'\.\w+$')
+
+# --- Line Rewriting Patterns (see from_logseq_line) ---
+# A logseq bullet at the start of a line, and the whitespace after it
+LEADING_BULLET_PATTERN = re.compile(r'^\-\s*')
+
+# Logseq tasks, optionally after a bullet, e.g. "- TODO something" (keyword in group 4, text in group 5)
+TODO_PATTERN = re.compile(r'^((\s*)(-?\s)?)(TODO|WAITING|LATER|DOING|NOW|DONE)\W+(.*)$')
+TODO_MARKERS = {'TODO': '[ ]', 'WAITING': '[ ]', 'LATER': '[ ]', 'DOING': '[/]', 'NOW': '[/]', 'DONE': '[x]'}
+
+# Page links, [[page]] or #[[page]] (target in group 1)
+LINK_PATTERN = re.compile(r'#?\[\[(.*?)\]\]')
+# Excalidraw renders, e.g. {{renderer excalidraw, excalidraw-2025-04-07-16-22-56}}
+EXCALIDRAW_RENDER_PATTERN = re.compile(r'\{\{renderer excalidraw, (.*?)\}\}')
+# Tags, e.g. #page or #namespace/page (tag in group 1)
+TAG_PATTERN = re.compile(r'#([\w\/]+)')
+
+# Logseq block uuids, e.g. 6624f4c2-6e1a-4b2b-9a4e-1f1e8d3a0b7c
+BLOCK_UUID = r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}'
+# The id:: property of a block that is referenced elsewhere (indentation in group 1, uuid in group 2)
+BLOCK_ID_PATTERN = re.compile(r'^(\s*)id:: (' + BLOCK_UUID + r')\s*$')
+# The same in the raw bytes of a page, to index the blocks without decoding pages line by line
+BLOCK_ID_BYTES_PATTERN = re.compile(rb'^[ \t]*id:: (' + BLOCK_UUID.encode() + rb')[ \t]*\r?$', re.MULTILINE)
+
+# Everything rewritten inside a line, in one alternation so a line is scanned once:
+# [[page]] or #[[page]] links, excalidraw renders, #tags, block embeds and ((uuid)) block references
+INLINE_PATTERN = re.compile(
+    r'(?P<link>#?\[\[(?P<target>.*?)\]\])'
+    r'|\{\{renderer excalidraw, (?P<render>.*?)\}\}'
+    r'|#(?P<tag>[\w\/]+)'
+    r'|\{\{embed \(\((?P<embed>' + BLOCK_UUID + r')\)\)\}\}'
+    r'|\(\((?P<block>' + BLOCK_UUID + r')\)\)'
+)
+
+logseq_graph_path = None # The graph being converted, set by the command line or a Converter
+migration_errors = [] # List to store errors for output to the user after migration (or an ErrorLog)
+asset_references = set() # Asset files (relative to the assets folder) referenced by the pages converted so far
+asset_canonical = {} # Duplicate asset -> the asset with the same content that is kept, see find_duplicate_assets
+
+# A conversion works on these module globals (and file_index, conversion_cache, the metrics...),
+# so conversions in one process run one at a time, holding this lock: see serialized and Converter
+_converter_lock = threading.RLock()
+
+def serialized(func):
+    '''Makes func hold _converter_lock while it runs, so it never sees the state of a Converter converting in another thread.'''
+    @wraps(func)
+    def locked(*args, **kwargs):
+        with _converter_lock:
+            return func(*args, **kwargs)
+    return locked
+
+class ErrorLog:
+    '''
+    Stands for migration_errors when errors are streamed: each error is appended to the file at
+    `path` (migration-errors.md) as it happens, instead of kept in memory until the end. The file
+    is only created with the first error.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.count = 0
+
+    def append(self, error):
+        if self.file is None:
+            self.file = open(self.path, 'w', encoding='utf-8')
+        self.file.write(f"- {error}\n")
+        self.file.flush()
+        self.count += 1
+
+    def extend(self, errors):
+        for error in errors:
+            self.append(error)
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+# --- Metrics ---
+# Collected during a run and written with --metrics-json
+rule_hits = dict.fromkeys(('tab', 'bullet', 'todo', 'link', 'render', 'tag', 'tag_link',
+                           'asset_embed', 'asset_link', 'excalidraw_link', 'block_id', 'block_ref', 'block_embed',
+                           'alias_link', 'asset_dedupe'), 0) # how often each rewrite rule fired
+stage_metrics = {} # stage -> {'seconds': ..., 'files': ...}
+
+class FileTimings:
+    '''
+    Times of the converted journals and pages: their number and total seconds, and the (seconds,
+    file) of the `keep` slowest ones in a heap, so a long run or watch does not grow with every file.
+    '''
+
+    def __init__(self, keep=20):
+        self.keep = keep
+        self.clear()
+
+    def clear(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest = []
+
+    def add(self, seconds, file):
+        self.count += 1
+        self.seconds += seconds
+        if len(self.slowest) < self.keep:
+            heapq.heappush(self.slowest, (seconds, file))
+        elif self.slowest and seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (seconds, file))
+
+file_timings = FileTimings() # of every converted journal or page
+transfer_stats = dict.fromkeys(('copied', 'linked', 'skipped', 'fallbacks', 'bytes_copied', 'bytes_avoided'), 0) # assets, excalidraw and draws
+
+def reset_metrics():
+    rule_hits.update(dict.fromkeys(rule_hits, 0))
+    stage_metrics.clear()
+    file_timings.clear()
+    transfer_stats.update(dict.fromkeys(transfer_stats, 0))
+
+@contextmanager
+def timed_stage(name):
+    '''Times a stage of the conversion, the caller can set the number of files in the yielded dict.'''
+    entry = {'seconds': 0.0, 'files': 0}
+    start = time.perf_counter()
+    try:
+        yield entry
+    finally:
+        entry['seconds'] = round(time.perf_counter() - start, 6)
+        stage_metrics[name] = entry
+
+def write_metrics_json(metrics_path, top=20):
+    '''Writes the metrics of the run, including the `top` slowest files, as JSON.'''
+    report = {
+        'stages': stage_metrics,
+        'rules': rule_hits,
+        'resolution': file_index.stats,
+        'transfer': transfer_stats,
+        'files': {'count': file_timings.count, 'seconds': round(file_timings.seconds, 6)},
+        'slowest': [{'file': file, 'seconds': round(seconds, 6)} for seconds, file in heapq.nlargest(top, file_timings.slowest)],
+        'errors': len(migration_errors),
+    }
+    if conversion_cache is not None:
+        report['cache'] = dict(conversion_cache.stats, hit_rate=conversion_cache.hit_rate())
+    Path(metrics_path).write_text(json.dumps(report, indent=2), encoding='utf-8')
+    logging.info(f"Metrics written to {metrics_path}")
 
 # --- Helper Functions ---
 
+def record_asset_reference(name):
+    '''Remembers that an asset is referenced, as written in the link and URL-decoded.'''
+    name = name.strip()
+    asset_references.add(name)
+    asset_references.add(unquote(name))
+
+def canonical_asset(name):
+    '''
+    Returns the name (as written in a link) of the asset that is kept in the vault for the asset
+    `name`: with deduplication, a duplicate is replaced by the asset it duplicates.
+    '''
+    if not asset_canonical:
+        return name
+    canonical = asset_canonical.get(name)
+    if canonical is None:
+        decoded = unquote(name)
+        if decoded == name or decoded not in asset_canonical:
+            return name
+        canonical = quote(asset_canonical[decoded]) # URL-encoded like the link
+    rule_hits['asset_dedupe'] += 1
+    return canonical
+
+def _rewrite_asset_reference(match):
+    '''Records (and points to the kept duplicate) any other reference to ../assets/...'''
+    name = canonical_asset(match.group(1))
+    record_asset_reference(name)
+    return f"../{LOGSEQ_ASSETS_DIR}/{name}"
+
 def convert_asset_link(match):
     """Converts a Logseq asset link relative path to Obsidian path."""
     prefix = match.group(1) # E.g., "![alt text](" or "[link text]("
     # group 2 is "../assets/"
     rest_of_link = match.group(3) # E.g., "image.png)"
+    name = rest_of_link[:-1].split(' "')[0] # without ")" and an optional "title"
+    canonical = canonical_asset(name)
+    rest_of_link = canonical + rest_of_link[len(name):]
+    record_asset_reference(canonical)
     # Assume assets are moved to OBSIDIAN_ASSETS_DIR at the vault root
     new_path = f"{OBSIDIAN_ASSETS_DIR}/"
-    logging.debug(f"Converting asset link: {match.group(0)} -> {prefix}{new_path}{rest_of_link}")
+    rule_hits['asset_link'] += 1
+    if debug_enabled():
+        logging.debug(f"Converting asset link: {match.group(0)} -> {prefix}{new_path}{rest_of_link}")
     return f"{prefix}{new_path}{rest_of_link}"
 
 def convert_asset_embed_to_obsidian_embed(match):
     """Converts a Logseq asset embed ![...](../assets/...) to Obsidian ![[assets/...]] """
     # group 1 is "!["
     # group 2 is "../assets/"
-    filename = match.group(3) # E.g., "image.png"
+    filename = canonical_asset(match.group(3)) # E.g., "image.png"
+    record_asset_reference(filename)
     new_embed = f"![[{OBSIDIAN_ASSETS_DIR}/{filename}]]"
-    logging.debug(f"Converting asset embed: {match.group(0)} -> {new_embed}")
+    rule_hits['asset_embed'] += 1
+    if debug_enabled():
+        logging.debug(f"Converting asset embed: {match.group(0)} -> {new_embed}")
     return new_embed
 
 def convert_excalidraw_link(match, link_type):
     """Converts a Logseq Excalidraw link relative path to Obsidian path."""
+    rule_hits['excalidraw_link'] += 1
     if link_type == 'md':
         prefix = match.group(1) # E.g., "![alt text](" or "[link text]("
         # group 2 is "../excalidraw/"
@@ -85,7 +342,8 @@ def convert_excalidraw_link(match, link_type):
         # Extract filename, remove trailing ')' if present
         filename = filename_and_suffix.rstrip(')')
         new_embed = f"![[{OBSIDIAN_EXCALIDRAW_DIR}/{filename}]]"
-        logging.debug(f"Converting MD Excalidraw link: {match.group(0)} -> {new_embed}")
+        if debug_enabled():
+            logging.debug(f"Converting MD Excalidraw link: {match.group(0)} -> {new_embed}")
         return new_embed
     elif link_type == 'wiki':
         prefix = match.group(1) # E.g., "![[" or "[["
@@ -93,136 +351,327 @@ def convert_excalidraw_link(match, link_type):
         filename = match.group(3) # E.g., "drawing.excalidraw"
         # Ensure it's an embed style ![[...]]
         new_embed = f"![[{OBSIDIAN_EXCALIDRAW_DIR}/{filename}]]"
-        logging.debug(f"Converting Wiki Excalidraw link: {match.group(0)} -> {new_embed}")
+        if debug_enabled():
+            logging.debug(f"Converting Wiki Excalidraw link: {match.group(0)} -> {new_embed}")
         return new_embed
     return match.group(0) # Should not happen
 
 
 def remove_leading_bullets(line): 
-    line = re.sub(r'\t(.*)', r'\1', line) # remove leading tab
-    line = re.sub(r'^\-\s*', '', line)
+    line = line.replace('\t', '', 1) # remove leading tab
+    line = LEADING_BULLET_PATTERN.sub('', line)
     return line
 
 
+def _replace_todo_match(match):
+    return f"{match.group(2)}- {TODO_MARKERS[match.group(4)]} {match.group(5)}"
+
 def replace_any_todo_items(line):
-    line = re.sub(r'^((\s*)(-?\s)?)(TODO|WAITING|LATER)\W+(.*)$', r'\2- [ ] \5', line)
-    line = re.sub(r'^((\s*)(-?\s)?)(DOING|NOW)\W+(.*)$', r'\2- [/] \5', line)
-    line = re.sub(r'^((\s*)(-?\s)?)(DONE)\W+(.*)$', r'\2- [x] \5', line)
-    return line
+    return TODO_PATTERN.sub(_replace_todo_match, line)
+
+def alias_link_target(relative_path, namespaceToFolder=False):
+    '''The name to link to a page by, in the vault, from its path relative to the graph.'''
+    name = Path(relative_path).stem
+    return name.replace('___', '/') if namespaceToFolder else name
+
+def _rewrite_link(text, target, namespaceToFolder=False):
+    '''Rewrites one [[target]] link (`text`, optionally prefixed with #) to the obsidian format.'''
+    rule_hits['link'] += 1
+    if '|' not in target:
+        if file_index.aliases:
+            # Obsidian does not follow aliases, so a link to an alias becomes [[page|alias]]
+            value, kind = file_index.resolve_with_kind(target)
+            if kind == 'alias':
+                rule_hits['alias_link'] += 1
+                return f"{text[:len(text) - len(target) - 2]}{alias_link_target(value, namespaceToFolder)}|{target}]]"
+        elif file_index.probes is not None:
+            # the link still depends on what it resolves to, e.g. an alias added later (see plan_incremental)
+            file_index.probes[target] = file_index.find(target)[0]
+    if namespaceToFolder:
+        # if there is a ___  the link, we need to replace it with a slash in the file 
+        updated_link = target.replace('___', '\\/')
+    else:
+        # logseq does not have folders, so if there is a folder assumed in the link, we need to 
+        # replace the slash with ___ to retain the connection to the original file 
+        updated_link = target.replace('/', '___')
+    return text[:len(text) - len(target) - 2] + updated_link + ']]'
 
 def replace_any_linked_items(line, namespaceToFolder=False):
-    # Links can be in the form of [[...]] or [...](...)
-    # This regex captures both styles and replaces them with the Obsidian format
-    # iterate over all the matches in the line, replace it with the obsidian format 
-    logseq_link_pattern = r'#?\[\[(.*?)\]\]'
-    if not namespaceToFolder: # if no conversion to folders, the kinks must be updated to the obsidian format
-        for match in re.finditer(logseq_link_pattern, line):
-            # logseq does not have folders, so if there is a folder assumed in the link, we need to 
-            # replace the slash with ___ to retain the connection to the original file 
-            updated_link = re.sub(r'\/', '___', match.group(1))  # replace / with ___ to match the obsidian format
-            line = line.replace(match.group(1), updated_link)
+    # Links can be in the form of [[...]] or #[[...]]
+    # Only the matched links are rewritten, and the line is built once
+    return LINK_PATTERN.sub(lambda match: _rewrite_link(match.group(0), match.group(1), namespaceToFolder), line)
 
-    else:
-        for match in re.finditer(logseq_link_pattern, line):
-            # if there is a ___  the link, we need to 
-            # replace it with a slash in the file 
-            
-            link = match.group(1)
-            updated_link = re.sub(r'___', '\/', link)  # replace / with ___ to match the obsidian format
-            line = line.replace(link, updated_link)  
-
-    return line
+def _replace_excalidraw_render_match(match):
+    rule_hits['render'] += 1
+    return f"![[{OBSIDIAN_EXCALIDRAW_DIR}/{match.group(1)}]]"
 
 def replace_excalidraw_renders(line):
     # Excalidraw renders are in the form of {{renderer excalidraw, ...}}
     # {{renderer excalidraw, excalidraw-2025-04-07-16-22-56}}
-    render_pattern = r'{{renderer excalidraw, (.*?)}}'
-    line = re.sub(render_pattern, r'![[Excalidraw/\1]]', line)
-
-    return line
+    return EXCALIDRAW_RENDER_PATTERN.sub(_replace_excalidraw_render_match, line)
+
+def _rewrite_tag(text, tag, namespaceToFolder=False):
+    '''Rewrites one #tag (`text`) to a link if the tag refers to an existing page, or an alias of one.'''
+    rule_hits['tag'] += 1
+    value, kind = file_index.resolve_with_kind(tag)
+    if value is None:
+        return text
+    rule_hits['tag_link'] += 1 # yes, the tag is a link to an existing page
+    if kind == 'alias':
+        rule_hits['alias_link'] += 1
+        return f'#[[{alias_link_target(value, namespaceToFolder)}|{tag}]]'
+    return f'#[[{tag}]]'  # Convert to Obsidian link format
 
 def replace_tags(line): 
+    # Only the matched tags are rewritten, and the line is built once
+    return TAG_PATTERN.sub(lambda match: _rewrite_tag(match.group(0), match.group(1)), line)
 
-    tag_pattern = r'#([\w\/]+)'
 
-    # find any links
-    for match in re.finditer(tag_pattern, line):
-        tag = match.group(1)
-        if file_exists(tag): # yes, the tag is a link to an existing page
-            # logging.debug(f"TAG #{tag}: {line} - found {file_exists(tag)}")
-            line = line.replace(tag, f'[[{tag}]]')  # Convert to Obsidian link format
-            # logging.debug(f"REPLCED #{tag}: {line}")
-    return line
+def _rewrite_block_reference(text, block_uuid, embed=False):
+    '''
+    Rewrites one ((uuid)) block reference (`text`), or {{embed ((uuid))}} if embed, to a link
+    to the anchor of the block. Left as it is without a block index or if the block is unknown.
+    '''
+    if file_index.blocks is None:
+        return text
+    target = file_index.resolve_block(block_uuid)
+    if target is None:
+        return text
+    rule_hits['block_embed' if embed else 'block_ref'] += 1
+    return f"{'!' if embed else ''}[[{target}#^{block_uuid}]]"
+
+def _rewrite_inline_match(match, namespaceToFolder=False):
+    '''Rewrites one match of INLINE_PATTERN: a [[link]], an excalidraw render, a #tag or a block reference.'''
+    kind = match.lastgroup
+    if kind == 'link':
+        return _rewrite_link(match.group(0), match.group('target'), namespaceToFolder)
+    elif kind == 'render':
+        rule_hits['render'] += 1
+        return f"![[{OBSIDIAN_EXCALIDRAW_DIR}/{match.group('render')}]]"
+    elif kind == 'tag':
+        return _rewrite_tag(match.group(0), match.group('tag'), namespaceToFolder)
+    else:
+        return _rewrite_block_reference(match.group(0), match.group(kind), embed=kind == 'embed')
+
+_INLINE_REWRITERS = {
+    False: partial(_rewrite_inline_match, namespaceToFolder=False),
+    True: partial(_rewrite_inline_match, namespaceToFolder=True),
+}
 
 
 def from_logseq_line(line, namespaceToFolder=False): 
     '''
     process a markdown line and removes logseq peculiarities, eg
     - unnecessary leading bullets 
+    - tasks, links, excalidraw renders and tags
+    - with a block index (see create_file_index), block references and the id:: of referenced
+      blocks, which become Obsidian block anchors (^uuid)
+
+    All rules are applied in one pass over the line: the bullet and task rules only look at
+    the start of the line, and the inline rules share one compiled pattern that is applied
+    left to right. Rules are skipped when the characters that trigger them are missing.
     '''
-    line = remove_leading_bullets(line) # must be called before todo_items
-    line = replace_any_todo_items(line)
-    line = replace_any_linked_items(line, namespaceToFolder=namespaceToFolder) 
-    line = replace_excalidraw_renders(line)
-    line = replace_tags(line)
+    # leading tab and bullet, must be handled before task items
+    if '\t' in line:
+        rule_hits['tab'] += 1
+        line = line.replace('\t', '', 1)
+    if line.startswith('-'):
+        rule_hits['bullet'] += 1
+        line = LEADING_BULLET_PATTERN.sub('', line)
+
+    todo_match = TODO_PATTERN.match(line)
+    if todo_match:
+        rule_hits['todo'] += 1
+        line = _replace_todo_match(todo_match)
+
+    if file_index.blocks is not None and 'id::' in line:
+        id_match = BLOCK_ID_PATTERN.match(line)
+        if id_match:
+            rule_hits['block_id'] += 1
+            return f"{id_match.group(1)}^{id_match.group(2)}"
+
+    if '[[' in line or '#' in line or '{{' in line or '((' in line:
+        line = INLINE_PATTERN.sub(_INLINE_REWRITERS[bool(namespaceToFolder)], line)
     return line
 
 
-def process_logseq_excalidraw_file(logseq_graph_path, logseq_file_path, obsidian_excalidraw_path):
-    """
-    Reads a Logseq Markdown file containong an embedded excalidraw file, converts its content, and writes
-    an excalidraw file to the Obsidian vault.
-    """
-    logging.debug(f'Processing excalidraw file: {logseq_file_path}') 
-
-    try:
-        content = logseq_file_path.read_text(encoding='utf-8')
-    except Exception as e:
-        logging.error(f"Error reading file {logseq_file_path}: {e}")
-        return
-    
-    frontmatter_processed = False
-    plugin_alias = ''
-
-    for line in content.splitlines():
-        if not frontmatter_processed:
-            prop_match = PROP_PATTERN.match(line)
+# --- Page Properties ---
+
+# The property block at the top of a page: typed values (for the frontmatter), the values as
+# written, and the index of the first line after the block
+PropertyBlock = namedtuple('PropertyBlock', ['properties', 'raw', 'end'])
+
+def property_value(value):
+    '''Converts a Logseq property value to the type used in the YAML frontmatter.'''
+    # Basic handling for potential list values ( Obsidian syntax)
+    if value.startswith('[') and value.endswith(']'):
+        # Attempt to make it a YAML list if comma-separated
+        items = [item.strip() for item in value[1:-1].split(',')]
+        if len(items) > 1:
+            return items # Store as list for YAML
+        return value # Keep as string if not clearly a list
+    lower = value.lower()
+    if lower == 'true' or lower == 'false':
+        return lower == 'true'
+    if value.isdigit():
+        return int(value)
+    # Simple string value, remove potential quotes if Obsidian might add them
+    return value.strip('"\'')
+
+def parse_property_block(lines, allow_blank=True):
+    '''
+    Parses the Logseq properties (key:: value) at the top of a page, once for all converters.
+    Stops at the first line that is not a property (blank lines are allowed between properties
+    if allow_blank), without looking at the rest of the page.
+    '''
+    properties = {}
+    raw = {}
+    end = 0
+    for end, line in enumerate(lines):
+        prop_match = PROP_PATTERN.match(line)
+        if prop_match:
+            key = prop_match.group(1).strip()
+            value = prop_match.group(2).strip()
+            raw[key] = value
+            properties[key] = property_value(value)
+        elif not (allow_blank and line.strip() == ""):
+            # First line that is not a property or blank line marks end of potential properties
+            break
+    else:
+        end = len(lines)
+    if debug_enabled():
+        logging.debug(f"Found {len(properties)} properties in the first {end} lines")
+    return PropertyBlock(properties, raw, end)
+
+def format_frontmatter(properties):
+    '''Builds the YAML frontmatter for the page properties in one go ('' without properties).'''
+    if not properties:
+        return ""
+    properties = dict(properties)
+    # delete some irrelevant properties
+    properties.pop('query-table', None) 
+    # change the name on some keys before processing
+    if "alias" in properties:
+        properties["aliases"] = properties.pop("alias")
+
+    parts = ["---\n"]
+    for key, value in properties.items():
+        # Basic YAML formatting (does not handle complex types perfectly)
+        if isinstance(value, list):
+            parts.append(f"{key}:\n")
+            parts.extend(f"  - {item}\n" for item in value)
+        elif isinstance(value, bool):
+            parts.append(f"{key}: {str(value).lower()}\n") # YAML booleans are lowercase
+        else:
+            # Add quotes if value contains special characters like ':'? For simplicity, let's not overcomplicate.
+            parts.append(f"{key}: {value}\n")
+    parts.append("---\n\n") # Add separator and extra newline
+    return "".join(parts)
+
+
+# --- Block Tree ---
+# With page_parser='blocks', a page is tokenized once into its blocks, and the converters run
+# on the blocks instead of on every line on its own (see convert_page_blocks)
+
+PAGE_PARSERS = ('lines', 'blocks')
+
+# The bullet that starts a block, after its indentation (group 1), and the task keyword of the
+# block (group 2) if any
+BLOCK_START_PATTERN = re.compile(r'([ \t]*)-(?: |$)(?:(TODO|WAITING|LATER|DOING|NOW|DONE)\W+)?')
+FENCE = "```"
+
+# A block of a page:
+# depth: the nesting level, the number of tabs before the bullet (0 for top-level blocks)
+# indent: the whitespace before the bullet
+# bullet: whether the block starts with a bullet, the lines before the first bullet do not
+# marker: the task keyword of the block (TODO, DONE, ...), or None
+# properties: the block properties (key:: value lines right after the first line), raw values
+# lines: the first line after the bullet and marker, then the other lines as they are in the page
+# fenced: the numbers of the lines (in `lines`) in ``` fenced regions, fences included
+PageBlock = namedtuple('PageBlock', ('depth', 'indent', 'bullet', 'marker', 'properties', 'lines', 'fenced'))
+
+def parse_blocks(lines, start=0):
+    '''
+    Tokenizes the lines of a page, from `start` (after the page properties), into its blocks.
+    The blocks are yielded one at a time in page order, the tree follows from their depth.
+    '''
+    block = PageBlock(0, '', False, None, {}, [], set())
+    in_fence = in_properties = False
+    for number in range(start, len(lines)):
+        line = lines[number]
+        if in_fence:
+            block.fenced.add(len(block.lines))
+            block.lines.append(line)
+            in_fence = not line.lstrip().startswith(FENCE)
+            continue
+        start_match = BLOCK_START_PATTERN.match(line) if '-' in line else None
+        if start_match:
+            if block.lines:
+                yield block
+            indent = start_match.group(1)
+            text = line[start_match.end():]
+            block = PageBlock(indent.count('\t'), indent, True, start_match.group(2), {}, [text], set())
+            in_fence = text.startswith(FENCE)
+            in_properties = not in_fence
+        else:
+            in_fence = line.lstrip().startswith(FENCE)
+            prop_match = in_properties and not in_fence and '::' in line and PROP_PATTERN.match(line)
             if prop_match:
-                key = prop_match.group(1).strip()
-                value = prop_match.group(2).strip()
-                if key == "excalidraw-plugin-alias":
-                    # Extract the alias value from the property
-                    plugin_alias = value.strip('"\'\/')
-                    logging.debug(f"Found Excalidraw plugin alias: {plugin_alias}")
+                block.properties[prop_match.group(1)] = prop_match.group(2).strip()
             else:
-                # First line that is not a property or blank line marks end of potential properties
-                frontmatter_processed = True
-                break
-    
-    json_pattern = r"json\n(.*?)\n"
-    match = re.search(json_pattern, content, re.DOTALL)
-
-    if match:
-        json_string = match.group(1)
-
-        # Create a new JSON object and add the "version", type, and source properties
-        json_object = json.loads(json_string)
-        json_object["type"] = "excalidraw"
-        json_object["version"] = 2
-        json_object["source"] = "https://excalidraw.com"
-
-        # Convert back to string
-        updated_json_string = json.dumps(json_object, indent=4)
-
-        # --- Determine Output Path (Handle Namespaces -> Folders) ---
-        obsidian_file_path = obsidian_excalidraw_path / logseq_file_path.name
-
-        # Create parent directories if they don't exist
-        obsidian_file_path.parent.mkdir(parents=True, exist_ok=True)
-
-        drawing = f'\n```json\n{updated_json_string}\n```\n'
-
-        final_content = f'''---
+                in_properties = False
+            block.lines.append(line)
+        if in_fence:
+            block.fenced.add(len(block.lines) - 1)
+    if block.lines:
+        yield block
+
+def convert_block(block, converted, fenced, namespaceToFolder=False):
+    '''
+    Converts a block (see parse_blocks) to the Obsidian format, appending its lines to `converted`
+    and the numbers (in `converted`) of the lines in fenced regions to `fenced`. Blocks below the
+    top level move up one level (one tab less), the bullets of blocks at the top level after that
+    are removed (as from_logseq_line does) and tasks become
+    - [ ] items. Lines in fenced regions only move with their block, no other rule touches them.
+    '''
+    lines = block.lines
+    shift = '\t' in block.indent
+    if block.fenced:
+        fenced.extend(len(converted) + number for number in sorted(block.fenced))
+    for number, line in enumerate(lines):
+        if number and shift:
+            stripped = line.lstrip()
+            if '\t' in line[:len(line) - len(stripped)]:
+                rule_hits['tab'] += 1
+                line = line[:len(line) - len(stripped)].replace('\t', '', 1) + stripped
+        if not (block.fenced and number in block.fenced):
+            if number and file_index.blocks is not None and 'id::' in line:
+                id_match = BLOCK_ID_PATTERN.match(line)
+                if id_match:
+                    rule_hits['block_id'] += 1
+                    converted.append(f"{id_match.group(1)}^{id_match.group(2)}")
+                    continue
+            if '[[' in line or '#' in line or '{{' in line or '((' in line:
+                line = INLINE_PATTERN.sub(_INLINE_REWRITERS[bool(namespaceToFolder)], line)
+        converted.append(line)
+    if block.bullet:
+        rule_hits['bullet'] += 1
+        first = len(converted) - len(lines)
+        indent = block.indent
+        if shift:
+            rule_hits['tab'] += 1
+            indent = indent.replace('\t', '', 1)
+        if block.marker:
+            rule_hits['todo'] += 1
+            converted[first] = f"{indent}- {TODO_MARKERS[block.marker]} {converted[first]}"
+        elif indent: # blocks that end up at the top level become paragraphs
+            converted[first] = f"{indent}- {converted[first]}"
+
+
+EXCALIDRAW_JSON_FORMATS = ('pretty', 'compact')
+# Keys the Obsidian plugin needs in the drawing, added or replacing the values Logseq wrote
+EXCALIDRAW_KEYS = {"type": "excalidraw", "version": 2, "source": "https://excalidraw.com"}
+EXCALIDRAW_HEADER = '''---
 
 excalidraw-plugin: parsed
 tags: [excalidraw]
@@ -237,77 +686,324 @@ aliases: [{plugin_alias}]
 
 %%
 ## Drawing
-{drawing}
+
+```json
+'''
+EXCALIDRAW_FOOTER = '''
+```
+
 '''
 
+JSON_STRING_END = re.compile(r'["\\]')
+JSON_STRUCTURE = re.compile(r'["{}\[\],:]')
+JSON_NESTED = re.compile(r'[^"{}\[\]]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"{}\[\]]*)*([{}\[\]])?') # up to the next bracket, strings included
+
+class ExcalidrawKeys:
+    '''
+    Sets EXCALIDRAW_KEYS in a json object copied in chunks (see _stream_json_line) the way
+    dict.update does in the pretty path: the values of the keys already at the top level of the
+    object are replaced as the chunks go through feed, and `missing` are the keys left to add at
+    its end. Only the nesting depth and the strings are followed: below the top level, everything
+    up to the next bracket (e.g. an embedded image) is skipped with one match, and once all the
+    keys were found the rest is not scanned.
+    '''
+
+    def __init__(self):
+        self.missing = dict(EXCALIDRAW_KEYS)
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False # the next character of the string is escaped
+        self.expect_key = False # the next string at the top level is a key
+        self.key = None # a top-level key being read (json text), None when not in one
+        self.replace = None # the key of EXCALIDRAW_KEYS whose value follows its colon
+        self.skipping = False # in the value being replaced
+
+    def feed(self, text):
+        '''Returns text with the values of the keys already in the object replaced.'''
+        output = []
+        position = 0
+        while position < len(text):
+            if not self.missing and not self.replace and not self.skipping:
+                output.append(text[position:])
+                break
+            if self.in_string:
+                start = position
+                if self.escaped:
+                    self.escaped = False
+                    position += 1
+                match = JSON_STRING_END.search(text, position)
+                end = len(text) if match is None else match.end()
+                if match is not None and match.group() == '\\':
+                    self.escaped = end == len(text)
+                    end = min(end + 1, len(text))
+                elif match is not None:
+                    self.in_string = False
+                if self.key is not None:
+                    self.key += text[start:end]
+                    if not self.in_string:
+                        name = json.loads(self.key)
+                        if name in self.missing:
+                            self.replace = name
+                            del self.missing[name]
+                        self.key = None
+                if not self.skipping:
+                    output.append(text[start:end])
+                position = end
+                continue
+            if self.depth > 1:
+                # below the top level only the brackets count, the rest is skipped in one match each
+                start = position
+                while self.depth > 1:
+                    match = JSON_NESTED.match(text, position)
+                    position = match.end()
+                    bracket = match.group(1)
+                    if bracket is None: # the end of the chunk, or of a string
+                        break
+                    self.depth += 1 if bracket in '{[' else -1
+                if not self.skipping:
+                    output.append(text[start:position])
+                if self.depth == 1:
+                    continue
+            match = JSON_STRUCTURE.search(text, position)
+            end = len(text) if match is None else match.start()
+            if not self.skipping:
+                output.append(text[position:end])
+            position = end
+            if match is None:
+                break
+            character = match.group()
+            if self.skipping and self.depth == 1 and character in ',}':
+                self.skipping = False
+            if character == '"':
+                self.in_string = True
+                if self.depth == 1 and self.expect_key:
+                    self.key = '"'
+            elif character in '{[':
+                self.depth += 1
+                self.expect_key = self.depth == 1
+            elif character in '}]':
+                self.depth -= 1
+            elif character == ',' and self.depth == 1:
+                self.expect_key = True
+            elif character == ':' and self.depth == 1:
+                self.expect_key = False
+                if self.replace is not None:
+                    output.append(f": {json.dumps(EXCALIDRAW_KEYS[self.replace])}")
+                    self.replace = None
+                    self.skipping = True
+                    position += 1
+                    continue
+            if not self.skipping:
+                output.append(character)
+            position += 1
+        return ''.join(output)
+
+def _stream_json_line(source, target, chunk_size=1024 * 1024):
+    '''
+    Copies the rest of the current line of `source`, a json object, to `target` in chunks and sets
+    EXCALIDRAW_KEYS in it without parsing it: the values of the keys it has are replaced, the
+    others are added before its closing brace (see ExcalidrawKeys). Only the closing brace and the
+    whitespace after it are held back, so memory use does not depend on the size of the drawing.
+    Returns False if the line is not a json object followed by a newline.
+    '''
+    excalidraw_keys = ExcalidrawKeys()
+    held = "" # the last closing brace seen and the whitespace after it
+    last = "" # last non-blank character written
+    started = False
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            return False
+        if not started:
+            chunk = chunk.lstrip(" \t")
+            started = bool(chunk)
+        newline = chunk.find("\n")
+        text = held + (chunk if newline < 0 else chunk[:newline])
+        brace = text.rfind("}")
+        if newline >= 0:
+            if brace < 0 or text[brace + 1:].strip():
+                return False
+            before = excalidraw_keys.feed(text[:brace])
+            keys = ", ".join(f"{json.dumps(key)}: {json.dumps(value)}" for key, value in excalidraw_keys.missing.items())
+            separator = "" if not keys or (before.rstrip()[-1:] or last) == "{" else ", "
+            target.write(before + separator + keys + excalidraw_keys.feed(text[brace:]))
+            return True
+        if brace >= 0 and not text[brace + 1:].strip():
+            # might be the closing brace of the object
+            written, held = excalidraw_keys.feed(text[:brace]), text[brace:]
+        else:
+            written, held = excalidraw_keys.feed(text), ""
+        target.write(written)
+        if written.strip():
+            last = written.rstrip()[-1]
+
+def process_logseq_excalidraw_file(logseq_graph_path, logseq_file_path, obsidian_excalidraw_path, compact=False):
+    """
+    Reads a Logseq Markdown file containong an embedded excalidraw file, converts its content, and writes
+    an excalidraw file to the Obsidian vault.
+
+    The page is streamed: only the lines before the json are read as lines. By default the drawing
+    is parsed and pretty printed straight to the output file. With compact=True it is copied in
+    chunks as it is, with the keys the plugin needs added, which keeps memory use flat for
+    large drawings (e.g. with embedded images).
+    """
+    if debug_enabled():
+        logging.debug(f'Processing excalidraw file: {logseq_file_path}')
+
+    # --- Determine Output Path ---
+    obsidian_file_path = obsidian_excalidraw_path / logseq_file_path.name
+
+    try:
+        source = logseq_file_path.open(encoding='utf-8')
+    except Exception as e:
+        logging.error(f"Error reading file {logseq_file_path}: {e}")
+        return
+
+    with source:
+        # the json is on the line after the first line ending with "json", e.g. "- ```json"
+        head = []
+        line = source.readline()
+        while line and not line.endswith("json\n"):
+            head.append(line.rstrip("\n"))
+            line = source.readline()
+        if not line:
+            logging.error(f'No json in the excalidraw diagram: {obsidian_file_path} ')
+            return
+
+        block = parse_property_block(head, allow_blank=False)
+        # Extract the alias value from the property
+        plugin_alias = block.raw.get("excalidraw-plugin-alias", "").strip('"\'/')
+
         # --- Write the converted file ---
+        found = False
         try:
-            obsidian_file_path.write_text(final_content, encoding='utf-8')
-            logging.info(f"Converted: {logseq_file_path.name} -> {obsidian_file_path}")
-        except Exception as e:
-            logging.error(f"Error writing file {obsidian_file_path}: {e}")
-    else: 
-        logging.error(f'No json in the excalidraw diagram: {obsidian_file_path} ')
-
-def process_logseq_md_file(logseq_file_path, obsidian_vault_path, namespaceToFolder=False):
+            with open_output(obsidian_file_path, streamed=True) as target:
+                target.write(EXCALIDRAW_HEADER.format(plugin_alias=plugin_alias))
+                if compact:
+                    found = _stream_json_line(source, target)
+                else:
+                    json_string = source.readline()
+                    found = json_string.endswith("\n")
+                    if found:
+                        # Add the "version", type, and source properties
+                        json_object = json.loads(json_string)
+                        json_object.update(EXCALIDRAW_KEYS)
+                        json.dump(json_object, target, indent=4)
+                if not found:
+                    raise ValueError("no json line") # nothing is written
+                target.write(EXCALIDRAW_FOOTER)
+        except ValueError:
+            if found: # invalid json
+                raise
+            logging.error(f'No json in the excalidraw diagram: {obsidian_file_path} ')
+            return
+        if debug_enabled():
+            logging.debug(f"Converted: {logseq_file_path.name} -> {obsidian_file_path}")
+
+def obsidian_md_file_path(logseq_file_path, obsidian_vault_path, namespaceToFolder=False):
+    """Returns where a converted journal or page ends up in the Obsidian vault."""
+    # Ensure paths are absolute before calculating relative path
+    relative_path = logseq_file_path.resolve().relative_to(logseq_graph_path)
+    if debug_enabled():
+        logging.debug(f"graph path: {logseq_graph_path}, file {logseq_file_path}, relative path: {relative_path}")
+    return obsidian_vault_path / obsidian_page_path(relative_path.as_posix(), namespaceToFolder)
+
+def obsidian_page_path(relative_path, namespaceToFolder=False):
+    '''Returns the vault-relative path of a journal or page from its graph-relative path (both with '/').'''
+    if namespaceToFolder:
+        # If the filename of the logseq file contains triple underscores (___) in the name, 
+        # treat those names as a folder separator in the destination vault
+        # This is how logseq deals with namespaces
+        directory, _, name = relative_path.rpartition('/')
+        if "___" in name:
+            relative_path = f"{directory}/{name.replace('___', '/')}" if directory else name.replace('___', '/')
+    return relative_path
+
+def process_logseq_md_file(logseq_file_path, obsidian_vault_path, namespaceToFolder=False, errors=None, page_parser='lines', data=None):
     """
     Reads a Logseq Markdown file, converts its content, and writes
     it to the corresponding location in the Obsidian vault.
+    Errors are appended to `errors`, or to the global migration_errors if not given.
+    page_parser (see PAGE_PARSERS) decides how the content is converted, see convert_page_content.
+    data is the content of the file if it was read already (see read_source).
+    Returns the number of lines of the file (None if it could not be read).
     """
+    if errors is None:
+        errors = migration_errors
 
-    logging.debug(f"Converting: {logseq_file_path.name}")
+    if debug_enabled():
+        logging.debug(f"Converting: {logseq_file_path.name}")
 
     try:
-        content = logseq_file_path.read_text(encoding='utf-8')
+        if data is None:
+            data = logseq_file_path.read_bytes()
+        elif isinstance(data, Exception):
+            raise data
+        content = data.decode('utf-8')
     except Exception as e:
         logging.error(f"Error reading file {logseq_file_path}: {e}")
         return
 
+    cached = conversion_cache.get(data) if conversion_cache is not None else None
+    if cached is not None:
+        final_content = cached['content']
+        asset_references.update(cached['assets'])
+        if file_index.probes is not None:
+            file_index.probes.update(cached['deps'])
+    elif conversion_cache is not None:
+        # record what this page alone refers to and resolves, for the cache entry
+        saved_references, saved_probes = set(asset_references), file_index.probes
+        asset_references.clear()
+        file_index.probes = {}
+        try:
+            final_content = convert_page_content(content, namespaceToFolder, page_parser)
+            conversion_cache.put(data, {'content': final_content, 'assets': sorted(asset_references), 'deps': file_index.probes})
+        finally:
+            asset_references.update(saved_references)
+            if saved_probes is not None:
+                saved_probes.update(file_index.probes)
+            file_index.probes = saved_probes
+    else:
+        final_content = convert_page_content(content, namespaceToFolder, page_parser)
+
+    # --- Determine Output Path (Handle Namespaces -> Folders) ---
+    try:
+        obsidian_file_path = obsidian_md_file_path(logseq_file_path, obsidian_vault_path, namespaceToFolder)
+        logseq_file_path = logseq_file_path.resolve()
+
+    # --- Write the converted file ---
+        with open_output(obsidian_file_path) as f:
+            f.write(final_content)
+        if debug_enabled():
+            logging.debug(f"Converted: {logseq_file_path.name} -> {obsidian_file_path}")
+
+    except Exception as e:
+        logging.error(f"Error when processing {logseq_file_path}: {e} - at line {e.__traceback__.tb_lineno}")
+        errors.append(f"- Error (line:{ {e.__traceback__.tb_lineno}}) processing {logseq_file_path}:\n  - {e}\n occured ")
+    return content.count("\n")
+
+
+def convert_page_content(content, namespaceToFolder=False, page_parser='lines'):
+    '''
+    Converts the content of a journal or page to the content of the Obsidian note: properties
+    to frontmatter, then line by line (see from_logseq_line) outside of code blocks, then
+    asset and excalidraw links. Asset references are recorded in asset_references.
+    With page_parser='blocks', the page is converted block by block, see convert_page_blocks.
+    '''
+    if page_parser == 'blocks':
+        return convert_page_blocks(content, namespaceToFolder)
     lines = content.splitlines()
-    properties = {}
     content_lines = []
-    errors = []
-    frontmatter_processed = False
     in_blockquote = False
-    initial_block = True # Are we still in the potential frontmatter/property block at the top?
-    aliases = []
 
     # --- Extract properties and separate from content ---
-    for i, line in enumerate(lines):
-        if not frontmatter_processed:
-            logging.debug(f"evaluating frontmatter on {line}")
-            prop_match = PROP_PATTERN.match(line)
-            if prop_match and initial_block:
-                key = prop_match.group(1).strip()
-                value = prop_match.group(2).strip()
-                 # Basic handling for potential list values ( Obsidian syntax)
-                if value.startswith('[') and value.endswith(']'):
-                     # Attempt to make it a YAML list if comma-separated
-                     items = [item.strip() for item in value[1:-1].split(',')]
-                     if len(items) > 1:
-                         properties[key] = items # Store as list for YAML
-                     else:
-                         properties[key] = value # Keep as string if not clearly a list
-                elif value.lower() in ['true', 'false']:
-                    properties[key] = bool(value.lower() == 'true')
-                elif value.isdigit():
-                     properties[key] = int(value)
-                else:
-                     # Simple string value, remove potential quotes if Obsidian might add them
-                     properties[key] = value.strip('"\'')
-                logging.debug(f"Found property: {key} -> {properties[key]}")
-            elif line.strip() == "" and initial_block:
-                # Allow blank lines between properties
-                logging.debug(f"Skipping blank line: {line}")
-                pass
-            else:
-                # First line that is not a property or blank line marks end of potential properties
-                logging.debug(f"Frontmatter ending: {line}")
+    block = parse_property_block(lines)
+    if block.end < len(lines):
+        # The first line after the properties is always converted
+        content_lines.append(from_logseq_line(lines[block.end], namespaceToFolder=namespaceToFolder))
 
-                initial_block = False
-                frontmatter_processed = True
-                content_lines.append(from_logseq_line(line, namespaceToFolder=namespaceToFolder))
-        elif in_blockquote: 
+    for line in lines[block.end + 1:]:
+        if in_blockquote: 
             if line.startswith("```"): # end blockquote
                 in_blockquote = False
             content_lines.append(line)
@@ -329,111 +1025,1912 @@ def process_logseq_md_file(logseq_file_path, obsidian_vault_path, namespaceToFol
     new_content = "\n".join(content_lines)
 
     # --- Convert Links ---
+    new_content = convert_file_links(new_content)
+
+    # --- Add YAML Frontmatter ---
+    frontmatter = format_frontmatter(block.properties)
+
+    final_content = frontmatter + new_content.lstrip() # Remove leading whitespace before content
+
+    # Remaining references to assets, e.g. in properties or macros
+    if f"../{LOGSEQ_ASSETS_DIR}/" in final_content:
+        final_content = ASSET_REFERENCE_PATTERN.sub(_rewrite_asset_reference, final_content)
+    return final_content
+
+
+def convert_file_links(text):
+    '''Converts the links to assets and excalidraw drawings in (several lines of) converted text.'''
     # IMPORTANT: Process more specific embed conversions BEFORE general link conversions
     # Convert Logseq image embeds ![...](../assets/...) to Obsidian ![[assets/...]]
-    new_content = OBSIDIAN_ASSET_EMBED_PATTERN_SIMPLE.sub(convert_asset_embed_to_obsidian_embed, new_content)
+    text = OBSIDIAN_ASSET_EMBED_PATTERN_SIMPLE.sub(convert_asset_embed_to_obsidian_embed, text)
     # Convert other Logseq asset links [text](../assets/...) or ![...](../assets/...)
-    new_content = ASSET_LINK_PATTERN.sub(convert_asset_link, new_content)
+    text = ASSET_LINK_PATTERN.sub(convert_asset_link, text)
 
     # Convert Excalidraw Links (try both markdown and wiki styles)
-    new_content = EXCALIDRAW_LINK_MD_PATTERN.sub(lambda m: convert_excalidraw_link(m, 'md'), new_content)
-    new_content = EXCALIDRAW_LINK_WIKI_PATTERN.sub(lambda m: convert_excalidraw_link(m, 'wiki'), new_content)
+    text = EXCALIDRAW_LINK_MD_PATTERN.sub(lambda m: convert_excalidraw_link(m, 'md'), text)
+    text = EXCALIDRAW_LINK_WIKI_PATTERN.sub(lambda m: convert_excalidraw_link(m, 'wiki'), text)
+    return text
+
+def _convert_chunk(lines):
+    '''Joins consecutive converted lines of a page (outside of fenced regions), and converts the file links in them.'''
+    text = "\n".join(lines)
+    if '../' in text:
+        text = convert_file_links(text)
+        # Remaining references to assets, e.g. in properties or macros
+        if f"../{LOGSEQ_ASSETS_DIR}/" in text:
+            text = ASSET_REFERENCE_PATTERN.sub(_rewrite_asset_reference, text)
+    return text
+
+def convert_page_blocks(content, namespaceToFolder=False):
+    '''
+    Converts the content of a journal or page like convert_page_content, but on its block tree:
+    the page is tokenized once (see parse_blocks), the blocks are converted with their structure
+    (see convert_block), and fenced code is left alone by all rules, file links included.
+    '''
+    lines = content.splitlines()
+    block = parse_property_block(lines)
+    converted = []
+    fenced = []
+    for page_block in parse_blocks(lines, block.end):
+        convert_block(page_block, converted, fenced, namespaceToFolder)
+
+    # the file links are converted in the text between the fenced regions
+    parts = []
+    start = 0
+    for number in fenced + [len(converted)]:
+        if number > start:
+            parts.append(_convert_chunk(converted[start:number]))
+        if number < len(converted):
+            parts.append(converted[number])
+        start = number + 1
+
+    frontmatter = format_frontmatter(block.properties)
+    if f"../{LOGSEQ_ASSETS_DIR}/" in frontmatter:
+        frontmatter = ASSET_REFERENCE_PATTERN.sub(_rewrite_asset_reference, frontmatter)
+    return frontmatter + "\n".join(parts).lstrip()
+
+
+def convert_page_file(md_file, obsidian_vault_path, obsidian_excalidraw_path, namespaceToFolder=False, excalidraw=False, excalidraw_compact=False, page_parser='lines', data=None):
+    '''
+    Converts a single journal or page file. Used both for serial runs and as the unit of work
+    sent to the worker pool, so it returns what it produced instead of touching global state:
+    a dict with the errors, the vault-relative output files, the tags/links it resolved
+    (name -> resolved path), the assets it references, the time it took, its number of lines
+    and the resolution and rule and cache counters for this file. In a worker writing to an archive, the output
+    files are returned too (see PendingOutput), for the main process to add to the archive.
+    data is the content of md_file if it was read already (see prefetch).
+    '''
+    errors = []
+    outputs = []
+    lines = 0
+    start = time.perf_counter()
+    stats_before = dict(file_index.stats)
+    rules_before = dict(rule_hits)
+    cache_before = dict(conversion_cache.stats) if conversion_cache is not None else {}
+    file_index.probes = {}
+    asset_references.clear()
+    try:
+        if excalidraw and EXCALIDRAW_FILE_PATTERN.match(md_file.name):
+            outputs.append(obsidian_excalidraw_path / md_file.name)
+            process_logseq_excalidraw_file(logseq_graph_path, md_file, obsidian_excalidraw_path, compact=excalidraw_compact)
+        else:
+            outputs.append(obsidian_md_file_path(md_file, obsidian_vault_path, namespaceToFolder))
+            lines = process_logseq_md_file(md_file, obsidian_vault_path, namespaceToFolder, errors=errors, page_parser=page_parser, data=data) or 0
+    except Exception as e:
+        logging.error(f"Error when processing {md_file}: {e}")
+        errors.append(f"- Error processing {md_file}:\n  - {e}\n occured ")
+    deps, file_index.probes = file_index.probes, None
+    resolution = {key: file_index.stats[key] - stats_before[key] for key in stats_before}
+    rules = {key: rule_hits[key] - rules_before[key] for key in rules_before}
+    cache = {key: conversion_cache.stats[key] - cache_before[key] for key in cache_before}
+    return {
+        'errors': errors,
+        'outputs': [output.relative_to(obsidian_vault_path).as_posix() for output in outputs],
+        'deps': deps,
+        'assets': sorted(asset_references),
+        'seconds': time.perf_counter() - start,
+        'lines': lines,
+        'resolution': resolution,
+        'rules': rules,
+        'cache': cache,
+        'files': output_archive.take() if isinstance(output_archive, PendingOutput) else [],
+    }
+
+
+def _init_worker(index, graph_path, cache=None, archive_root=None, canonical=None):
+    '''
+    Pool initializer: share the (read-only) file index, graph path, conversion cache and duplicate
+    assets with a worker process. With archive_root, the worker returns its output files instead
+    of writing them (see PendingOutput).
+    '''
+    global file_index, logseq_graph_path, conversion_cache, output_archive, asset_canonical
+    file_index = index
+    if isinstance(index, DiskFileIndex):
+        index.connect() # not the connection of the parent process, when forked
+    logseq_graph_path = graph_path
+    conversion_cache = cache
+    asset_canonical = canonical or {}
+    output_archive = PendingOutput(archive_root) if archive_root is not None else None
 
-    # --- Add YAML Frontmatter ---
-    frontmatter = ""
-    if properties:
-        frontmatter += "---\n"
-
-        # delete some irrelevant properties
-        properties.pop('query-table', None) 
-
-        # change the name on some keys before processing
-        if "alias" in properties:
-            aliases = properties.pop("alias")
-            properties["aliases"] = aliases     
-
-        for key, value in properties.items():
-            # Basic YAML formatting (does not handle complex types perfectly)
-            if isinstance(value, list):
-                frontmatter += f"{key}:\n"
-                for item in value:
-                    frontmatter += f"  - {item}\n"
-            elif isinstance(value, bool):
-                 frontmatter += f"{key}: {str(value).lower()}\n" # YAML booleans are lowercase
-            else:
-                # Add quotes if value contains special characters like ':'? For simplicity, let's not overcomplicate.
-                # Handle potential multi-line strings minimally by replacing newlines? No, keep simple.
-                 frontmatter += f"{key}: {value}\n"
 
-        frontmatter += "---\n\n" # Add separator and extra newline
+def walk_md_files(directory):
+    '''
+    Yields the Markdown files below directory in the order of sorted(directory.rglob('*.md')),
+    listing one directory at a time instead of collecting the paths of the whole tree.
+    '''
+    names, directories = [], set() # only the names, a huge pages directory has a lot of them
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False): # as rglob, which does not follow symlinks to directories
+                    directories.add(entry.name)
+                    names.append(entry.name)
+                elif entry.name.endswith('.md') and entry.is_file():
+                    names.append(entry.name)
+    except (FileNotFoundError, NotADirectoryError):
+        return
+    names.sort()
+    for name in names:
+        if name in directories:
+            yield from walk_md_files(Path(directory) / name)
+        else:
+            yield Path(directory) / name
 
-    final_content = frontmatter + new_content.lstrip() # Remove leading whitespace before content
+def changed_files(md_files, logseq_graph_path, changed):
+    '''Keeps the files in `changed` (graph-relative paths), or all of them if changed is None.'''
+    if changed is None:
+        return md_files
+    return (md_file for md_file in md_files if md_file.relative_to(logseq_graph_path).as_posix() in changed)
 
+def chunked(items, size):
+    '''Yields lists of up to `size` of items, in order.'''
+    items = iter(items)
+    while chunk := list(islice(items, size)):
+        yield chunk
 
-    # --- Determine Output Path (Handle Namespaces -> Folders) ---
-    try:
-        # Ensure paths are absolute before calculating relative path
-        logging.debug(f"graph path: {logseq_graph_path}, file {logseq_file_path}")
-        logseq_file_path = logseq_file_path.resolve()
-        
-        relative_path = logseq_file_path.relative_to(logseq_graph_path)
-        obsidian_file_path = obsidian_vault_path / relative_path
-        logging.debug(f"relative path: {relative_path}")
+def convert_page_chunk(convert, md_files):
+    '''Converts a chunk of files in a worker process, see convert_page_files.'''
+    return [convert(md_file) for md_file in md_files]
+
+def convert_page_files(md_files, obsidian_vault_path, obsidian_excalidraw_path, namespaceToFolder=False, excalidraw=False, jobs=1, excalidraw_compact=False, on_result=None, page_parser='lines', io_threads=IO_THREADS, read_ahead=READ_AHEAD, write_behind=WRITE_BEHIND, progress_interval=PROGRESS_INTERVAL, total=None):
+    '''
+    Converts journal or page files, serially or with a pool of `jobs` worker processes, and
+    returns how many were converted. md_files can be any iterable, it is consumed as the files
+    are converted (`total` is its length, for the progress, if it has none).
+    Results are merged in the order of md_files, so the output (including migration-errors.md)
+    does not depend on the number of jobs. on_result(md_file, result) is called for each file
+    as soon as its result is merged, e.g. to record the progress or the manifest entry; the
+    results are not kept. With jobs, chunks of files are sent to the workers, up to
+    read_ahead chunks ahead of the results merged.
+    Serially, with io_threads, the files are read (up to read_ahead files ahead) and written (up
+    to write_behind files behind) on io_threads threads each, see prefetch and OutputWriter. The
+    result of a file is merged once the file is written.
+    The progress is logged every progress_interval seconds, see ProgressReporter.
+    '''
+    convert = partial(convert_page_file, obsidian_vault_path=obsidian_vault_path,
+                      obsidian_excalidraw_path=obsidian_excalidraw_path,
+                      namespaceToFolder=namespaceToFolder, excalidraw=excalidraw,
+                      excalidraw_compact=excalidraw_compact, page_parser=page_parser)
+    reporter = ProgressReporter(len(md_files) if total is None else total, progress_interval)
+    def merge(md_file, result, pooled):
+        if pooled:
+            # the workers counted on their own copies of the index and rules
+            for key, count in result['resolution'].items():
+                file_index.stats[key] += count
+            for key, count in result['rules'].items():
+                rule_hits[key] += count
+            for key, count in result['cache'].items():
+                conversion_cache.stats[key] += count
+            for name, text in result['files']:
+                output_archive.write_text(name, text)
+        migration_errors.extend(result['errors'])
+        file_timings.add(result['seconds'], str(md_file))
+        reporter.update(result['lines'])
+        if on_result is not None:
+            on_result(md_file, result)
+
+    if jobs > 1 and reporter.total > 1:
+        chunksize = max(1, min(reporter.total // (jobs * 4), PARALLEL_CHUNK))
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                 initargs=(file_index, Path(logseq_graph_path).resolve(), conversion_cache,
+                                           output_archive.root if output_archive is not None else None,
+                                           asset_canonical)) as executor:
+            for chunk, results in prefetch(chunked(md_files, chunksize), partial(convert_page_chunk, convert),
+                                           depth=max(jobs * 2, read_ahead // chunksize), executor=executor):
+                for md_file, result in zip(chunk, results):
+                    merge(md_file, result, pooled=True)
+    elif io_threads > 0 and reporter.total > 1:
+        global output_writer
+        def read(md_file):
+            if excalidraw and EXCALIDRAW_FILE_PATTERN.match(md_file.name):
+                return None # streamed, see process_logseq_excalidraw_file
+            return read_source(md_file)
+        def merge_written(md_file, result, writes):
+            for path, write in writes:
+                error = write.exception()
+                if error is not None:
+                    logging.error(f"Error when writing {path}: {error}")
+                    result['errors'].append(f"- Error processing {md_file}:\n  - {error}\n occured ")
+            merge(md_file, result, pooled=False)
+        written = deque() # converted files whose result waits for their writes
+        output_writer = OutputWriter(io_threads, max(1, write_behind)) if output_archive is None else None
+        try:
+            for md_file, data in prefetch(md_files, read, io_threads, read_ahead):
+                result = convert(md_file, data=data)
+                written.append((md_file, result, output_writer.take() if output_writer is not None else []))
+                while written and all(write.done() for _, write in written[0][2]):
+                    merge_written(*written.popleft())
+        finally:
+            if output_writer is not None:
+                output_writer.close()
+                output_writer = None
+            # also when interrupted: the files converted until then are written, and finished
+            while written:
+                merge_written(*written.popleft())
+    else:
+        for md_file in md_files:
+            merge(md_file, convert(md_file), pooled=False)
+    return reporter.files
 
-        if namespaceToFolder:
-            # If the filename of the logseq file contains triple underscores (___) in the name, 
-            # treat those names as a folder separator in the destination vault
-            # This is how logseq deals with namespaces
-            if "___" in obsidian_file_path.name:
-                parts = obsidian_file_path.name.split("___")
-                obsidian_file_path = obsidian_file_path.parent / Path(*parts)
 
+# --- Main Conversion Logic ---
 
-        # Create parent directories if they don't exist
-        obsidian_file_path.parent.mkdir(parents=True, exist_ok=True)
+class FileIndex(dict):
+    '''
+    Index of the files in a Logseq graph: page name (file stem, namespaces as '/') -> relative path.
 
-    # --- Write the converted file ---
-        obsidian_file_path.write_text(final_content, encoding='utf-8')
-        logging.info(f"Converted: {logseq_file_path.name} -> {obsidian_file_path}")
+    Besides the plain mapping, a resolution table is precomputed by build_lookup(), so a tag or
+    link can be resolved with a couple of hash lookups instead of scanning all entries.
+    The table covers relative paths with the extension stripped, namespaces written with
+    either '___' or '/', and case-folded variants of all of these. The few names that more than
+    one page resolves to keep all their claims (see claim_name), so update_lookup can change
+    the table for the pages that changed without building it again.
 
-    except Exception as e:
-        logging.error(f"Error when processing {logseq_file_path}: {e} - at line {e.__traceback__.tb_lineno}")
-        migration_errors.append(f"- Error (line:{ {e.__traceback__.tb_lineno}}) processing {logseq_file_path}:\n  - {e}\n occured ")
+    Page aliases (the alias:: property) have a table of their own, consulted after the page
+    names, so a page always wins over an alias with the same name.
 
+    Optionally it also indexes blocks (see add_blocks): block uuid -> the page the block is on.
+    The uuids are kept as 16 bytes and the pages as numbers into a list, so the index stays
+    small for graphs with hundreds of thousands of referenced blocks.
+    '''
 
-# --- Main Conversion Logic ---
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lookup = {}
+        self.lookup_claims = {} # names in lookup that several pages claim -> [[tier, relative path], ...], see claim_name
+        self.stats = {'direct': 0, 'fallback': 0, 'alias': 0, 'miss': 0, 'block': 0, 'block_miss': 0} # how tags/links/blocks were resolved
+        self.probes = None # when a dict, records every name resolved and its result
+        self.aliases = {} # alias -> relative path of the page, see add_alias
+        self.alias_lookup = {} # aliases and their case-folded forms, built by build_lookup()
+        self.alias_claims = {} # names in alias_lookup that several pages claim, like lookup_claims
+        self.page_aliases = {} # relative path of a page -> the aliases it has in aliases, see aliases_of
+        self.blocks = None # block uuid (bytes) -> number of the page in block_pages, None if blocks are not indexed
+        self.block_pages = [] # pages with referenced blocks, as linked in the vault (None once removed)
+        self.free_block_pages = [] # numbers in block_pages freed by remove_blocks, reused by add_blocks
+        self.page_blocks = {} # page in block_pages -> [(its number, the uuids of its blocks)], for remove_blocks
+        self.include, self.exclude = INDEX_INCLUDE, INDEX_EXCLUDE # the files in the index, see create_file_index
+
+    def _names(self, key, value):
+        stripped_name = FILE_EXTENSION_PATTERN.sub('', value)
+        return (key, key.replace('/', '___'), stripped_name, stripped_name.replace('___', '/'))
+
+    def _claims(self, key, value):
+        '''The names an entry resolves, and their tier: 0 for its names, 1 for their case-folded forms.'''
+        names = self._names(key, value)
+        claims = dict.fromkeys(names, 0)
+        for name in names:
+            claims.setdefault(name.casefold(), 1)
+        return claims
+
+    @staticmethod
+    def _alias_claims(alias):
+        '''The names an alias resolves, and their tier, like _claims.'''
+        claims = {alias: 0}
+        claims.setdefault(alias.casefold(), 1)
+        return claims
+
+    def _tier(self, table, name, value):
+        '''The tier of the claim of value on name in table (lookup or alias_lookup), when it is its only claim.'''
+        if table is self.lookup:
+            return self._claims(page_name(value), value).get(name, 1)
+        return 0 if self.aliases.get(name) == value else 1
+
+    def claim_name(self, table, claims, name, tier, value):
+        '''
+        Records that value (a page) resolves name in table (lookup or alias_lookup). The claim of
+        the lowest tier wins, exact forms over case-folded forms of other pages, then the first
+        one: a new claim comes after the others of its tier. The claims of the names claimed
+        more than once are kept in `claims` (lookup_claims or alias_claims), so unclaim_name
+        finds the next one; other names only have their value in table.
+        '''
+        current = table.get(name)
+        if current is None:
+            table[name] = value
+            return
+        listed = claims.get(name)
+        if listed is None:
+            if current == value:
+                return
+            listed = [[self._tier(table, name, current), current]]
+        elif any(claimed == value for _, claimed in listed):
+            return
+        position = next((i for i, (claimed_tier, _) in enumerate(listed) if claimed_tier > tier), len(listed))
+        listed.insert(position, [tier, value])
+        claims[name] = listed
+        table[name] = listed[0][1]
+
+    def unclaim_name(self, table, claims, name, value):
+        '''Takes back a claim of claim_name, name then resolves to the next claim if there is one.'''
+        listed = claims.get(name)
+        if listed is None:
+            if table.get(name) == value:
+                del table[name]
+            return
+        listed = [claim for claim in listed if claim[1] != value]
+        if len(listed) > 1:
+            claims[name] = listed
+        else:
+            del claims[name]
+        table[name] = listed[0][1]
+
+    def build_lookup(self):
+        '''(Re)build the resolution tables from the current entries and aliases.'''
+        self.lookup, self.lookup_claims = {}, {}
+        for key, value in self.items():
+            for name, tier in self._claims(key, value).items():
+                self.claim_name(self.lookup, self.lookup_claims, name, tier, value)
+        self.alias_lookup, self.alias_claims = {}, {}
+        for alias, value in self.aliases.items():
+            for name, tier in self._alias_claims(alias).items():
+                self.claim_name(self.alias_lookup, self.alias_claims, name, tier, value)
+        return self
+
+    def update_lookup(self, removed=(), added=(), removed_aliases=(), added_aliases=()):
+        '''
+        Updates the resolution tables for the entries (key, relative path) removed from and added
+        to the index since they were built, and for the aliases (alias, relative path) likewise:
+        only the names of those are claimed again (see claim_name), instead of building the tables
+        again. The entries and aliases added must be the last ones, as build_lookup would order them.
+        '''
+        for key, value in removed:
+            for name in self._claims(key, value):
+                self.unclaim_name(self.lookup, self.lookup_claims, name, value)
+        for alias, value in removed_aliases:
+            for name in self._alias_claims(alias):
+                self.unclaim_name(self.alias_lookup, self.alias_claims, name, value)
+        for key, value in added:
+            for name, tier in self._claims(key, value).items():
+                self.claim_name(self.lookup, self.lookup_claims, name, tier, value)
+        for alias, value in added_aliases:
+            for name, tier in self._alias_claims(alias).items():
+                self.claim_name(self.alias_lookup, self.alias_claims, name, tier, value)
+        return self
+
+    def add_alias(self, alias, relative_path):
+        '''Records an alias of the page at relative_path (the first page with an alias keeps it).'''
+        if self.aliases.setdefault(alias, relative_path) == relative_path and alias not in self.page_aliases.get(relative_path, ()):
+            self.page_aliases.setdefault(relative_path, []).append(alias)
+
+    def aliases_of(self, relative_path):
+        '''The aliases the page at relative_path has in aliases, in the order they were added.'''
+        return list(self.page_aliases.get(relative_path, ()))
+
+    def remove_aliases(self, relative_path):
+        '''Forgets the aliases of the page at relative_path, e.g. before it is indexed again, and returns them.'''
+        aliases = self.aliases_of(relative_path)
+        for alias in aliases:
+            del self.aliases[alias]
+        self.page_aliases.pop(relative_path, None)
+        return aliases
+
+    def add_blocks(self, page, block_uuids):
+        '''Records the uuids of the blocks on a page, `page` is the page as linked in the vault.'''
+        if self.blocks is None:
+            self.blocks = {}
+        if self.free_block_pages:
+            number = self.free_block_pages.pop()
+            self.block_pages[number] = page
+        else:
+            number = len(self.block_pages)
+            self.block_pages.append(page)
+        blocks = [bytes.fromhex(block_uuid.replace('-', '')) for block_uuid in block_uuids]
+        for block in blocks:
+            self.blocks.setdefault(block, number)
+        self.page_blocks.setdefault(page, []).append((number, blocks))
+
+    def remove_blocks(self, page):
+        '''
+        Forgets the blocks on a page (as linked in the vault), e.g. before the page is indexed again,
+        touching only the blocks of that page (see page_blocks). The number of the page is freed
+        for the next page added, so block_pages does not grow when pages are indexed again and
+        again (see update_file_index).
+        '''
+        for number, blocks in self.page_blocks.pop(page, ()):
+            for block in blocks:
+                if self.blocks.get(block) == number:
+                    del self.blocks[block]
+            self.block_pages[number] = None
+            self.free_block_pages.append(number)
+
+    def find_block(self, block_uuid):
+        '''Returns the page (as linked in the vault) a block is on, or None.'''
+        try:
+            number = self.blocks.get(bytes.fromhex(block_uuid.replace('-', '')))
+        except (AttributeError, ValueError): # no block index, or not a uuid
+            return None
+        return None if number is None else self.block_pages[number]
+
+    def find(self, tag_or_reference):
+        '''
+        Returns (relative path or None, how it was found), without counting the lookup.
+        A block reference, ((uuid)), is looked up in the block index instead.
+        '''
+        if tag_or_reference.startswith('(('):
+            value = self.find_block(tag_or_reference[2:-2])
+            return value, 'block' if value is not None else 'block_miss'
+        value = self.get(tag_or_reference)
+        if value is not None:
+            return value, 'direct'
+        value = self.lookup.get(tag_or_reference)
+        if value is None:
+            value = self.lookup.get(tag_or_reference.casefold())
+        if value is not None:
+            return value, 'fallback'
+        value = self.alias_lookup.get(tag_or_reference)
+        if value is None:
+            value = self.alias_lookup.get(tag_or_reference.casefold())
+        if value is not None:
+            return value, 'alias'
+        return None, 'miss'
+
+    def resolve_with_kind(self, tag_or_reference):
+        '''Returns (relative path or None, how it was found) for a tag or reference, and counts it.'''
+        value, kind = self.find(tag_or_reference)
+        self.stats[kind] += 1
+        if self.probes is not None:
+            self.probes[tag_or_reference] = value
+        if (kind == 'fallback' or kind == 'alias') and debug_enabled():
+            logging.debug(f"found a matching value: {value} for {tag_or_reference} ({kind})")
+        return value, kind
+
+    def resolve(self, tag_or_reference):
+        '''Returns the relative path of the page a tag or reference points to, or None.'''
+        return self.resolve_with_kind(tag_or_reference)[0]
+
+    def resolve_block(self, block_uuid):
+        '''Returns the page (as linked in the vault) a referenced block is on, or None.'''
+        return self.resolve(f"(({block_uuid}))")
+
+    def digest(self):
+        '''A hash of everything tags, links and block references can resolve to.'''
+        digest = hashlib.sha256()
+        for table in (self, self.aliases):
+            for name, value in sorted(table.items()):
+                digest.update(f"{name}\0{value}\n".encode())
+            digest.update(b"\0")
+        if self.blocks is not None:
+            for block, number in sorted(self.blocks.items()):
+                digest.update(block + self.block_pages[number].encode() + b"\n")
+        return digest.hexdigest()
+
+
+INDEX_DB_CACHE_KB = 8 * 1024 # page cache of a DiskFileIndex, what it keeps in memory at most
+
+class IndexTable(MutableMapping):
+    '''A table (key -> value) of a DiskFileIndex, as a mapping in the order the keys were added.'''
+
+    def __init__(self, index, name):
+        self.index = index
+        self.name = name
+
+    def _execute(self, sql, parameters=()):
+        return self.index.db.execute(sql.format(table=self.name), parameters)
+
+    def get(self, key, default=None):
+        row = self._execute("SELECT value FROM {table} WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def __getitem__(self, key):
+        row = self._execute("SELECT value FROM {table} WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return row[0]
+
+    def __setitem__(self, key, value):
+        self._execute("INSERT INTO {table} VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value", (key, value))
+
+    def setdefault(self, key, default=None):
+        self._execute("INSERT OR IGNORE INTO {table} VALUES (?, ?)", (key, default))
+        return self[key]
+
+    def __delitem__(self, key):
+        if self._execute("DELETE FROM {table} WHERE key = ?", (key,)).rowcount == 0:
+            raise KeyError(key)
+
+    def __iter__(self):
+        return (key for key, in self._execute("SELECT key FROM {table} ORDER BY rowid"))
+
+    def items(self):
+        return self._execute("SELECT key, value FROM {table} ORDER BY rowid")
+
+    def sorted_items(self):
+        '''The items sorted by key, like sorted(items()) (text is compared as UTF-8, i.e. by code point).'''
+        return self._execute("SELECT key, value FROM {table} ORDER BY key, value")
+
+    def __len__(self):
+        return self._execute("SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def __bool__(self):
+        return self._execute("SELECT 1 FROM {table} LIMIT 1").fetchone() is not None
+
+    def clear(self):
+        self._execute("DELETE FROM {table}")
+
+class JsonIndexTable(IndexTable):
+    '''An IndexTable whose values are json, e.g. the claims of names (see FileIndex.claim_name).'''
+
+    def get(self, key, default=None):
+        value = super().get(key)
+        return default if value is None else json.loads(value)
+
+    def __getitem__(self, key):
+        return json.loads(super().__getitem__(key))
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, json.dumps(value))
+
+class DiskFileIndex(FileIndex):
+    '''
+    A FileIndex kept in an sqlite database at `path` instead of in memory, for huge graphs: the
+    entries, the resolution tables, the aliases and the blocks are tables (see IndexTable), and
+    only a page cache of INDEX_DB_CACHE_KB is in memory, whatever the size of the graph.
+    Lookups are the same as with a FileIndex, they are just slower. The database is a scratch
+    file, created again for each index; worker processes open it instead of copying the index.
+    '''
 
-file_index = {}
-def create_file_index(logseq_graph_path, namespaceToFolder=False):
+    TABLES = ('entries', 'lookup', 'aliases', 'alias_lookup', 'blocks', 'block_pages', 'lookup_claims', 'alias_claims')
+
+    def __init__(self, path, create=True, has_blocks=False):
+        dict.__init__(self)
+        self.path = Path(path)
+        if create:
+            self.path.unlink(missing_ok=True)
+        self.connect()
+        if create:
+            for table in self.TABLES:
+                self.db.execute(f"CREATE TABLE {table} (key PRIMARY KEY, value)")
+            # the aliases and blocks of a page, see remove_aliases and remove_blocks
+            self.db.execute("CREATE INDEX aliases_value ON aliases (value)")
+            self.db.execute("CREATE INDEX blocks_value ON blocks (value)")
+            self.db.execute("CREATE INDEX block_pages_value ON block_pages (value)")
+        (self.entries, self.lookup, self._aliases, self.alias_lookup, self._blocks, self.block_pages,
+         self.lookup_claims, self.alias_claims) = (
+            (JsonIndexTable if table.endswith('_claims') else IndexTable)(self, table) for table in self.TABLES)
+        self.has_blocks = has_blocks
+        self.free_block_pages = [] # keys in block_pages freed by remove_blocks, reused by add_blocks
+        self.stats = {'direct': 0, 'fallback': 0, 'alias': 0, 'miss': 0, 'block': 0, 'block_miss': 0}
+        self.probes = None
+        self.include, self.exclude = INDEX_INCLUDE, INDEX_EXCLUDE
+
+    def connect(self):
+        '''Opens the database, e.g. in a worker process (a connection is not shared between processes).'''
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        # a scratch file: nothing to recover after a crash
+        self.db.execute("PRAGMA journal_mode = OFF")
+        self.db.execute("PRAGMA synchronous = OFF")
+        self.db.execute(f"PRAGMA cache_size = -{INDEX_DB_CACHE_KB}")
+
+    def __reduce__(self):
+        self.db.commit()
+        return (_open_disk_file_index, (self.path, self.has_blocks, self.include, self.exclude))
+
+    # the entries (page name -> relative path)
+    def get(self, key, default=None):
+        return self.entries.get(key, default)
+    def __getitem__(self, key):
+        return self.entries[key]
+    def __setitem__(self, key, value):
+        self.entries[key] = value
+    def __delitem__(self, key):
+        del self.entries[key]
+    def __contains__(self, key):
+        return self.entries.get(key) is not None
+    def __iter__(self):
+        return iter(self.entries)
+    def __len__(self):
+        return len(self.entries)
+    def __bool__(self):
+        return bool(self.entries)
+    def items(self):
+        return self.entries.items()
+    def keys(self):
+        return iter(self.entries)
+    def values(self):
+        return (value for _, value in self.entries.items())
+
+    @property
+    def aliases(self):
+        return self._aliases
+
+    @aliases.setter
+    def aliases(self, aliases):
+        aliases = list(aliases.items()) if aliases is not self._aliases else []
+        self._aliases.clear()
+        self._aliases.update(aliases)
+
+    @property
+    def blocks(self):
+        return self._blocks if self.has_blocks else None
+
+    @blocks.setter
+    def blocks(self, blocks):
+        self.has_blocks = blocks is not None
+        if blocks is not self._blocks:
+            self._blocks.clear()
+            self.block_pages.clear()
+            if blocks:
+                raise ValueError("blocks are added to a DiskFileIndex with add_blocks")
+
+    def build_lookup(self):
+        '''
+        (Re)build the resolution tables from the current entries, like FileIndex.build_lookup: all
+        the claims go to a temporary table, the winners to the resolution table and the names
+        claimed by several pages to its claims table.
+        '''
+        self.db.execute("CREATE TEMP TABLE IF NOT EXISTS claims (name, tier, value)")
+        for table, claims, source, names in (
+                ('lookup', 'lookup_claims', 'entries', self._claims),
+                ('alias_lookup', 'alias_claims', 'aliases', lambda alias, value: self._alias_claims(alias))):
+            self.db.execute(f"DELETE FROM {table}")
+            self.db.execute(f"DELETE FROM {claims}")
+            self.db.execute("DELETE FROM temp.claims")
+            rows = self.db.execute(f"SELECT key, value FROM {source} ORDER BY rowid")
+            self.db.executemany("INSERT INTO temp.claims VALUES (?, ?, ?)",
+                                ((name, tier, value) for key, value in rows for name, tier in names(key, value).items()))
+            # the lowest tier wins, then the first claim
+            self.db.execute(f"INSERT OR IGNORE INTO {table} SELECT name, value FROM temp.claims ORDER BY tier, rowid")
+            rows = self.db.execute("SELECT name, tier, value FROM temp.claims WHERE name IN "
+                                   "(SELECT name FROM temp.claims GROUP BY name HAVING COUNT(DISTINCT value) > 1) "
+                                   "ORDER BY name, tier, rowid")
+            for name, group in groupby(rows, key=lambda row: row[0]):
+                listed = []
+                for _, tier, value in group:
+                    if all(claimed != value for _, claimed in listed):
+                        listed.append([tier, value])
+                self.db.execute(f"INSERT INTO {claims} VALUES (?, ?)", (name, json.dumps(listed)))
+        self.db.execute("DELETE FROM temp.claims")
+        self.db.commit()
+        return self
+
+    def update_lookup(self, removed=(), added=(), removed_aliases=(), added_aliases=()):
+        super().update_lookup(removed, added, removed_aliases, added_aliases)
+        self.db.commit()
+        return self
+
+    def add_alias(self, alias, relative_path):
+        self.aliases.setdefault(alias, relative_path)
+
+    def aliases_of(self, relative_path):
+        return [alias for alias, in self.db.execute("SELECT key FROM aliases WHERE value = ? ORDER BY rowid", (relative_path,))]
+
+    def remove_aliases(self, relative_path):
+        aliases = self.aliases_of(relative_path)
+        self.db.execute("DELETE FROM aliases WHERE value = ?", (relative_path,))
+        return aliases
+
+    def add_blocks(self, page, block_uuids):
+        self.has_blocks = True
+        if self.free_block_pages:
+            number = self.free_block_pages.pop()
+        else:
+            number = self.db.execute("SELECT COALESCE(MAX(key) + 1, 0) FROM block_pages").fetchone()[0]
+        self.block_pages[number] = page
+        self.db.executemany("INSERT OR IGNORE INTO blocks VALUES (?, ?)",
+                            ((bytes.fromhex(block_uuid.replace('-', '')), number) for block_uuid in block_uuids))
+
+    def remove_blocks(self, page):
+        numbers = [number for number, in self.db.execute("SELECT key FROM block_pages WHERE value = ?", (page,))]
+        self.db.execute("DELETE FROM blocks WHERE value IN (SELECT key FROM block_pages WHERE value = ?)", (page,))
+        self.db.execute("DELETE FROM block_pages WHERE value = ?", (page,))
+        self.free_block_pages.extend(numbers)
+
+    def digest(self):
+        '''The same hash as FileIndex.digest, computed without loading the tables.'''
+        digest = hashlib.sha256()
+        for table in (self.entries, self._aliases):
+            for name, value in table.sorted_items():
+                digest.update(f"{name}\0{value}\n".encode())
+            digest.update(b"\0")
+        if self.has_blocks:
+            for block, page in self.db.execute("SELECT blocks.key, block_pages.value FROM blocks JOIN block_pages "
+                                                "ON blocks.value = block_pages.key ORDER BY blocks.key, blocks.value"):
+                digest.update(block + page.encode() + b"\n")
+        return digest.hexdigest()
+
+def _open_disk_file_index(path, has_blocks, include, exclude):
+    index = DiskFileIndex(path, create=False, has_blocks=has_blocks)
+    index.include, index.exclude = include, exclude
+    return index
+
+
+# Files in the index (graph-relative paths with '/', fnmatch globs where * also matches '/'):
+# the pages and journals, but no hidden files or folders (e.g. .DS_Store, .git)
+INDEX_INCLUDE = (f'{LOGSEQ_PAGES_DIR}/*', f'{LOGSEQ_JOURNALS_DIR}/*')
+INDEX_EXCLUDE = ('.*', '*/.*')
+
+@lru_cache(maxsize=None)
+def _globs_pattern(globs):
+    '''One compiled pattern for a list of fnmatch globs (never matches if there are none).'''
+    return re.compile('|'.join(fnmatch.translate(glob) for glob in globs) or r'(?!)')
+
+def _glob_roots(globs):
+    '''The folders (graph-relative) that must be scanned to find all files matching the globs.'''
+    roots = set()
+    for glob in globs:
+        prefix = re.split(r'[*?\[]', glob, maxsplit=1)[0]
+        roots.add(prefix.rpartition('/')[0])
+    # no need to scan a folder within another one
+    return sorted(root for root in roots
+                  if not any(other != root and (other == '' or root.startswith(other + '/')) for other in roots))
+
+def _scan_index_dir(directory, prefix, include, exclude):
+    try:
+        entries = os.scandir(directory)
+    except (FileNotFoundError, NotADirectoryError):
+        return
+    with entries:
+        for entry in entries:
+            relative_path = prefix + entry.name
+            if exclude.match(relative_path):
+                continue
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+            if is_dir:
+                if not entry.is_symlink(): # like os.walk
+                    yield from _scan_index_dir(entry.path, relative_path + '/', include, exclude)
+            elif include.match(relative_path):
+                yield relative_path
+
+def index_scope_files(logseq_graph_path, include=INDEX_INCLUDE, exclude=INDEX_EXCLUDE):
+    '''
+    Yields the graph-relative paths (with '/') of the files to index: the ones that match one
+    of the include globs and none of the exclude globs. Only the folders the include globs can
+    match in are scanned, with os.scandir, and excluded folders are skipped entirely.
     '''
-    Create an index of all files in the Logseq graph directory. 
+    include_pattern, exclude_pattern = _globs_pattern(tuple(include)), _globs_pattern(tuple(exclude))
+    for root in _glob_roots(include):
+        yield from _scan_index_dir(os.path.join(logseq_graph_path, root), root + '/' if root else '', include_pattern, exclude_pattern)
+
+def in_index_scope(relative_path, include=INDEX_INCLUDE, exclude=INDEX_EXCLUDE):
+    '''Tells if a file (graph-relative path with '/') belongs in the index, see index_scope_files.'''
+    return (_globs_pattern(tuple(include)).match(relative_path) is not None and
+            not any(_globs_pattern(tuple(exclude)).match(prefix) for prefix in _path_prefixes(relative_path)))
+
+def _path_prefixes(relative_path):
+    '''The folders a graph-relative path is in, and the path itself: a, a/b, a/b/c.md'''
+    parts = relative_path.split('/')
+    return ['/'.join(parts[:i]) for i in range(1, len(parts) + 1)]
+
+def page_name(relative_path):
+    '''The page name of a file in the index: its name without extension, namespaces written with '/'.'''
+    name = relative_path.rpartition('/')[2]
+    dot = name.rfind('.')
+    if dot > 0:
+        name = name[:dot]
+    return name.replace('___', '/')
+
+def is_page_file(relative_path):
+    '''Tells if a graph-relative path (with '/') is a journal or page in Markdown.'''
+    return relative_path.endswith('.md') and relative_path.partition('/')[0] in (LOGSEQ_PAGES_DIR, LOGSEQ_JOURNALS_DIR)
+
+file_index = FileIndex()
+def create_file_index(logseq_graph_path, namespaceToFolder=False, block_refs=False, include=INDEX_INCLUDE, exclude=INDEX_EXCLUDE, index_db=None):
+    '''
+    Create an index of the pages and journals in the Logseq graph directory (or the files
+    selected by the include and exclude globs, see index_scope_files).
     This is useful for debugging or tracking files and when creating/evaluating links to pages not yet processed.
+    The aliases of the pages are indexed as well (see index_aliases), and with block_refs the
+    blocks with an id:: property (see index_blocks).
+    With index_db, the index is kept in an sqlite database at that path (see DiskFileIndex).
     '''
-    file_index = {}
-    for root, dirs, files in os.walk(logseq_graph_path):
-        for file in files:
-            file_path = Path(root) / file
-            relative_path = file_path.relative_to(logseq_graph_path)
-            file_index[file_path.stem.replace('___', '/')] = str(relative_path) 
-    logging.debug(f"File index created with {file_index} entries.")
+    with timed_stage('index') as stage:
+        file_index = DiskFileIndex(index_db) if index_db else FileIndex()
+        file_index.include, file_index.exclude = tuple(include), tuple(exclude)
+        md_files = []
+        stage['files'] = 0
+        for relative_path in index_scope_files(logseq_graph_path, include, exclude):
+            file_index[page_name(relative_path)] = relative_path
+            if is_page_file(relative_path) and not index_db:
+                md_files.append(relative_path)
+            stage['files'] += 1
+    def page_files():
+        if not index_db:
+            return md_files
+        # scanned again for the aliases and the blocks, instead of kept in memory
+        return (relative_path for relative_path in index_scope_files(logseq_graph_path, include, exclude) if is_page_file(relative_path))
+    index_aliases(file_index, logseq_graph_path, page_files())
+    file_index.build_lookup()
+    if debug_enabled():
+        logging.debug(f"File index created with {len(file_index)} entries and {len(file_index.aliases)} aliases.")
+    if block_refs:
+        index_blocks(file_index, logseq_graph_path, page_files(), namespaceToFolder)
+    if index_db:
+        file_index.db.commit() # worker processes read it from the database
     return file_index
 
+# Aliases are searched for in the first ALIAS_SCAN_BYTES of a page, and further only while the
+# property block goes on, up to ALIAS_SCAN_LIMIT
+ALIAS_SCAN_BYTES = 4096
+ALIAS_SCAN_LIMIT = 64 * 1024
+
+def read_page_aliases(file_path):
+    '''Returns the aliases in the property block of a page (alias:: a, [[b]]), reading only the start of the page.'''
+    head = b''
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(ALIAS_SCAN_BYTES)
+            head += chunk
+            lines = head.decode('utf-8', errors='replace').splitlines()
+            more = len(chunk) == ALIAS_SCAN_BYTES and len(head) < ALIAS_SCAN_LIMIT
+            if more:
+                lines.pop() # may be cut off, read again with the next chunk
+            block = parse_property_block(lines)
+            if block.end < len(lines) or not more:
+                break
+    return property_aliases(block)
+
+def property_aliases(block):
+    '''Returns the aliases in a parsed property block (alias:: a, [[b]]).'''
+    aliases = block.raw.get('alias', '')
+    return [alias for alias in (item.strip().strip('[]"\'').strip() for item in aliases.split(',')) if alias]
+
+def index_aliases(file_index, logseq_graph_path, md_files):
+    '''Records the aliases of the pages and journals (graph-relative paths with '/', any iterable) in the file index.'''
+    with timed_stage('alias_index') as stage:
+        stage['files'] = 0
+        for relative_path in md_files:
+            stage['files'] += 1
+            try:
+                aliases = read_page_aliases(logseq_graph_path / relative_path)
+            except OSError as e:
+                logging.error(f"Error reading file {relative_path}: {e}")
+                continue
+            for alias in aliases:
+                file_index.add_alias(alias, relative_path)
+
+def block_page_link(relative_path, namespaceToFolder=False):
+    '''The link to a converted page or journal in the vault, from its path relative to the graph.'''
+    page = Path(relative_path).with_suffix('')
+    if namespaceToFolder:
+        page = page.parent / page.name.replace('___', '/')
+    return page.as_posix()
+
+def index_blocks(file_index, logseq_graph_path, md_files, namespaceToFolder=False):
+    '''
+    First pass for block references: records the id:: of the blocks on every page and journal
+    (graph-relative paths with '/' in md_files) in the file index. One page is read at a time and only
+    searched if it has an id:: at all; excalidraw pages are skipped.
+    '''
+    with timed_stage('block_index') as stage:
+        if file_index.blocks is None:
+            file_index.blocks = {}
+        stage['files'] = 0
+        for relative_path in md_files:
+            stage['files'] += 1
+            if EXCALIDRAW_FILE_PATTERN.match(relative_path.rpartition('/')[2]):
+                continue
+            try:
+                data = (logseq_graph_path / relative_path).read_bytes()
+            except OSError as e:
+                logging.error(f"Error reading file {relative_path}: {e}")
+                continue
+            if b'id::' in data:
+                block_uuids = [match.group(1).decode() for match in BLOCK_ID_BYTES_PATTERN.finditer(data)]
+                if block_uuids:
+                    file_index.add_blocks(block_page_link(relative_path, namespaceToFolder), block_uuids)
+    if debug_enabled():
+        logging.debug(f"Block index created with {len(file_index.blocks)} blocks on {len(file_index.block_pages)} pages.")
+
+def update_file_index(file_index, logseq_graph_path, changed, removed, namespaceToFolder=False):
+    '''
+    Updates the file index in memory for the files added or changed (`changed`) and removed
+    (graph-relative paths), instead of walking the graph again: entries, aliases and blocks of
+    those files, and only the names they resolve in the resolution tables (see update_lookup).
+    '''
+    removed_entries, added_entries = [], {}
+    for relative_path in removed:
+        key = page_name(relative_path)
+        if file_index.get(key) == relative_path:
+            del file_index[key]
+            removed_entries.append((key, relative_path))
+    changed = [relative_path for relative_path in changed if in_index_scope(relative_path, file_index.include, file_index.exclude)]
+    for relative_path in changed:
+        key = page_name(relative_path)
+        current = file_index.get(key)
+        if current == relative_path:
+            continue # an edited page resolves the same names
+        if current is not None:
+            # moved to the end, where update_lookup puts its claims
+            del file_index[key]
+            if added_entries.pop(key, None) is None:
+                removed_entries.append((key, current))
+        file_index[key] = relative_path
+        added_entries[key] = relative_path
+    md_files = [relative_path for relative_path in changed if is_page_file(relative_path)]
+
+    stale = {*changed, *removed}
+    removed_aliases = [(alias, relative_path) for relative_path in stale for alias in file_index.remove_aliases(relative_path)]
+    index_aliases(file_index, logseq_graph_path, md_files)
+    added_aliases = [(alias, relative_path) for relative_path in md_files for alias in file_index.aliases_of(relative_path)]
+    if file_index.blocks is not None:
+        for relative_path in stale:
+            file_index.remove_blocks(block_page_link(relative_path, namespaceToFolder))
+        index_blocks(file_index, logseq_graph_path, md_files, namespaceToFolder)
+    file_index.update_lookup(removed_entries, added_entries.items(), removed_aliases, added_aliases)
+
 def file_exists(tag_or_reference):
-    if tag_or_reference in file_index:
-        return file_index[tag_or_reference]
-    else:
-        # check if tag exists as a value in the dictionart
+    return file_index.resolve(tag_or_reference)
+
+# --- Incremental Conversion ---
+
+MANIFEST_FILE = ".logseq-manifest.json" # in the vault root, dot files are hidden in Obsidian
+MANIFEST_VERSION = 3
+
+# Source directories recorded in the manifest
+SOURCE_DIRS = (LOGSEQ_PAGES_DIR, LOGSEQ_JOURNALS_DIR, LOGSEQ_ASSETS_DIR, LOGSEQ_EXCALIDRAW_DIR, LOGSEQ_DRAWS_DIR)
+# Source directories that are copied as-is, and their name in the vault
+COPIED_SOURCE_DIRS = {
+    LOGSEQ_ASSETS_DIR: OBSIDIAN_ASSETS_DIR,
+    LOGSEQ_EXCALIDRAW_DIR: OBSIDIAN_EXCALIDRAW_DIR,
+    LOGSEQ_DRAWS_DIR: LOGSEQ_DRAWS_DIR,
+}
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _snapshot_dir(directory, prefix, snapshot):
+    try:
+        entries = os.scandir(directory)
+    except FileNotFoundError:
+        return
+    with entries:
+        for entry in entries:
+            relative_path = prefix + entry.name
+            try:
+                if entry.is_dir():
+                    if not entry.is_symlink(): # like os.walk
+                        _snapshot_dir(entry.path, relative_path + '/', snapshot)
+                    continue
+                stat = entry.stat()
+            except FileNotFoundError: # removed while scanning
+                continue
+            snapshot[relative_path] = (stat.st_size, stat.st_mtime_ns)
+
+def snapshot_sources(logseq_graph_path):
+    '''
+    Returns {graph-relative path: (size, mtime_ns)} of every file in the source directories of
+    the graph, from os.scandir entries, without reading any file.
+    '''
+    snapshot = {}
+    for source_dir in SOURCE_DIRS:
+        _snapshot_dir(Path(logseq_graph_path) / source_dir, source_dir + '/', snapshot)
+    return snapshot
 
-        for key, value in file_index.items():
-            stripped_name = re.sub(r'\.w+$', '', value) 
-            if stripped_name == tag_or_reference:
-                logging.debug(f"found a matching value: {value} from stripped {stripped_name}")
-                return value 
+def scan_sources(logseq_graph_path, previous=None, snapshot=None):
+    '''
+    Records size, mtime and content hash of every file in the source directories of the graph,
+    keyed by the path relative to the graph. Files with the same size and mtime as in the
+    previous manifest are not hashed again. A snapshot (see snapshot_sources) that was
+    just taken can be given to avoid scanning the directories again.
+    '''
+    previous = previous or {}
+    if snapshot is None:
+        snapshot = snapshot_sources(logseq_graph_path)
+    sources = {}
+    for relative_path, (size, mtime_ns) in snapshot.items():
+        entry = previous.get(relative_path)
+        if entry and entry['size'] == size and entry['mtime_ns'] == mtime_ns:
+            sha256 = entry['sha256']
+        else:
+            sha256 = file_digest(Path(logseq_graph_path) / relative_path)
+        sources[relative_path] = {'size': size, 'mtime_ns': mtime_ns, 'sha256': sha256}
+    return sources
 
+def load_manifest(obsidian_vault_path):
+    '''Returns the manifest of the previous run into this vault, or None.'''
+    manifest_path = obsidian_vault_path / MANIFEST_FILE
+    try:
+        manifest = json.loads(manifest_path.read_text(encoding='utf-8'))
+    except FileNotFoundError:
         return None
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable manifest {manifest_path}: {e}")
+        return None
+    if manifest.get('version') != MANIFEST_VERSION:
+        logging.warning(f"Ignoring manifest {manifest_path} from another version")
+        return None
+    return manifest
+
+def save_manifest(obsidian_vault_path, manifest):
+    manifest_path = obsidian_vault_path / MANIFEST_FILE
+    with atomic_write(manifest_path) as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    logging.info(f"Manifest written to {manifest_path}")
+
+def plan_incremental(manifest, sources, options):
+    '''
+    Compares the scanned sources with the manifest of the previous run, and returns the
+    set of graph-relative source files that must be converted or copied again.
+    Unchanged pages are included when one of their tags/links now resolves differently,
+    e.g. because the page it refers to was added or removed.
+    '''
+    if manifest is None or manifest['options'] != options:
+        return set(sources)
+    previous = manifest['sources']
+    changed = {relative_path for relative_path, entry in sources.items()
+               if relative_path not in previous or previous[relative_path]['sha256'] != entry['sha256']}
+    for relative_path, entry in previous.items():
+        if relative_path in sources and relative_path not in changed:
+            for name, resolved in entry['deps'].items():
+                if file_index.find(name)[0] != resolved:
+                    changed.add(relative_path)
+                    break
+    return changed
+
+def copied_file_output(relative_path):
+    '''Returns the vault-relative path of a source file that is copied as-is, or None.'''
+    source_dir, _, rest = relative_path.partition('/')
+    if source_dir in COPIED_SOURCE_DIRS:
+        return f"{COPIED_SOURCE_DIRS[source_dir]}/{rest}"
+    return None
+
+def copy_changed_files(logseq_graph_path, obsidian_vault_path, source_dir, changed, link_mode='copy'):
+    '''
+    Copies (or links, see transfer_file) the changed files of one of COPIED_SOURCE_DIRS to the vault.
+    Returns the number of files copied and the set of files that could not be copied.
+    '''
+    count = 0
+    failed = set()
+    for relative_path in sorted(changed):
+        if relative_path.startswith(source_dir + '/'):
+            target = obsidian_vault_path / copied_file_output(relative_path)
+            try:
+                if output_archive is None:
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                transfer_file(logseq_graph_path / relative_path, target, link_mode)
+                count += 1
+            except Exception as e:
+                logging.error(f"Could not copy {relative_path}: {e}")
+                failed.add(relative_path)
+    return count, failed
+
+def manifest_result(result):
+    '''The part of the result of a converted journal or page the manifest needs (see update_manifest), kept instead of the result.'''
+    return {key: result[key] for key in ('outputs', 'deps', 'assets', 'errors')}
+
+def update_manifest(manifest, sources, options, page_results, failed, orphans=frozenset()):
+    '''
+    Builds the manifest for this run from the scanned sources, the results of the converted
+    pages and the previous manifest (for files that were not touched).
+    Files that failed are left out, so the next run tries them again, and assets that were
+    not copied (orphaned or duplicates) have no outputs.
+    '''
+    previous = manifest['sources'] if manifest and manifest['options'] == options else {}
+    entries = {}
+    for relative_path, entry in sources.items():
+        result = page_results.get(relative_path)
+        if relative_path in failed or (result and result['errors']):
+            continue
+        entry = dict(entry)
+        if result is not None:
+            entry['outputs'] = result['outputs']
+            entry['deps'] = result['deps']
+            entry['assets'] = result['assets']
+        elif relative_path in previous and relative_path not in orphans:
+            entry['outputs'] = previous[relative_path]['outputs']
+            entry['deps'] = previous[relative_path]['deps']
+            entry['assets'] = previous[relative_path]['assets']
+        else:
+            output = copied_file_output(relative_path)
+            entry['outputs'] = [output] if output and relative_path not in orphans else []
+            entry['deps'] = {}
+            entry['assets'] = []
+        entries[relative_path] = entry
+    return {'version': MANIFEST_VERSION, 'options': options, 'sources': entries}
+
+def remove_stale_outputs(obsidian_vault_path, manifest, new_manifest, page_results):
+    '''Deletes files written by an earlier run whose source is gone or now goes elsewhere.'''
+    if manifest is None:
+        return
+    current = {output for entry in new_manifest['sources'].values() for output in entry['outputs']}
+    current.update(output for result in page_results.values() for output in result['outputs'])
+    for entry in manifest['sources'].values():
+        for output in entry['outputs']:
+            if output not in current:
+                logging.info(f"Removing stale file {output}")
+                (obsidian_vault_path / output).unlink(missing_ok=True)
+
+
+# --- Conversion Cache ---
+
+CACHE_SIZE_MB = 512 # default size cap of the conversion cache
+
+class ConversionCache:
+    '''
+    Persistent cache of converted journals and pages, that can be shared by runs and vaults.
+
+    It is a folder with one JSON file per converted page (its content, the assets it refers to
+    and what its tags and links resolved to), named by a hash of the page as read and of the
+    `context`: everything else the output depends on (see cache_context). Pages with the same
+    content in the same context are converted once. When the folder grows over max_bytes,
+    the least recently used entries are evicted (the mtime of an entry is its last use).
+    '''
+
+    def __init__(self, path, context, max_bytes=CACHE_SIZE_MB * 1024 * 1024):
+        self.path = Path(path)
+        self.context = context.encode()
+        self.max_bytes = max_bytes
+        self.stats = {'hits': 0, 'misses': 0, 'evicted': 0}
+
+    def _entry_path(self, data):
+        key = hashlib.sha256(self.context + b"\0" + data).hexdigest()
+        return self.path / key[:2] / f"{key}.json"
+
+    def get(self, data):
+        '''Returns the entry for a page (its bytes as read), or None.'''
+        entry_path = self._entry_path(data)
+        try:
+            entry = json.loads(entry_path.read_text(encoding='utf-8'))
+            os.utime(entry_path) # last used
+        except (OSError, ValueError): # missing, evicted meanwhile or damaged
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        return entry
+
+    def put(self, data, entry):
+        '''Stores the entry for a page (its bytes as read).'''
+        entry_path = self._entry_path(data)
+        try:
+            entry_path.parent.mkdir(parents=True, exist_ok=True)
+            with atomic_write(entry_path) as f:
+                json.dump(entry, f)
+        except OSError as e:
+            logging.warning(f"Could not write to the conversion cache {self.path}: {e}")
+
+    def hit_rate(self):
+        lookups = self.stats['hits'] + self.stats['misses']
+        return round(self.stats['hits'] / lookups, 4) if lookups else None
+
+    def evict(self):
+        '''Removes the least recently used entries until the cache is within max_bytes, returns their number.'''
+        entries = []
+        total = 0
+        for entry_path in self.path.glob('*/*.json'):
+            try:
+                stat = entry_path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry_path))
+            total += stat.st_size
+        evicted = 0
+        for _, size, entry_path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            entry_path.unlink(missing_ok=True)
+            total -= size
+            evicted += 1
+        self.stats['evicted'] += evicted
+        return evicted
+
+conversion_cache = None # the ConversionCache of the run, if any
+
+def cache_context(namespaceToFolder=False, page_parser='lines'):
+    '''A hash of what converted pages depend on besides their content: this converter, the options, the file index and the duplicate assets.'''
+    digest = hashlib.sha256(Path(__file__).read_bytes())
+    digest.update(json.dumps({'namespaceToFolder': namespaceToFolder, 'pageParser': page_parser, 'blockRefs': file_index.blocks is not None,
+                              'dedupeAssets': sorted(asset_canonical.items())}).encode())
+    digest.update(file_index.digest().encode())
+    return digest.hexdigest()
+
+
+# --- Checkpoints ---
+
+PROGRESS_FILE = ".logseq-progress.jsonl" # in the vault root while a conversion runs
+PROGRESS_SYNC_EVERY = 100 # entries appended to the progress journal between two fsyncs
+
+@contextmanager
+def atomic_write(path, encoding='utf-8'):
+    '''
+    Opens a (hidden) temporary file next to `path` for writing, and renames it to `path` when
+    the block ends without an exception. `path` is never left half-written.
+    '''
+    temp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp") # several processes may write the same file
+    try:
+        with open(temp_path, 'w', encoding=encoding) as f:
+            yield f
+        os.replace(temp_path, path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+class ProgressJournal:
+    '''
+    Durable record of the journals and pages finished by a conversion, PROGRESS_FILE in the vault.
+
+    Every file gets a JSON line as soon as its output is in place (written atomically), with
+    the size and mtime its source had before it was converted, and its result (outputs, deps
+    and assets, for the manifest and --referenced-assets-only). The first line holds the
+    options of the run. The journal is removed when the conversion completes, so a journal
+    left in the vault is from an interrupted run, and --resume skips the files it lists
+    unless their source changed since.
+    '''
+
+    def __init__(self, obsidian_vault_path, options):
+        self.path = obsidian_vault_path / PROGRESS_FILE
+        self.options = options
+        self.done = {} # graph-relative path -> entry, of the files finished by the interrupted run
+        self.sources = {} # graph-relative path -> (size, mtime_ns) of the files being converted, until recorded
+        self.file = None
+        self.unsynced = 0
+
+    def load(self):
+        '''Reads the journal of an interrupted run with the same options, returns the number of files it finished.'''
+        try:
+            lines = self.path.read_text(encoding='utf-8').splitlines()
+        except FileNotFoundError:
+            return 0
+        try:
+            header = json.loads(lines[0])
+        except (IndexError, json.JSONDecodeError):
+            header = None
+        if header is None or header.get('options') != self.options:
+            logging.warning(f"Ignoring progress journal {self.path} from a run with other options")
+            return 0
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                break # cut off by the interruption
+            self.done[entry['source']] = entry
+        return len(self.done)
+
+    def open(self):
+        '''Starts the journal with the entries loaded so far, new entries are appended.'''
+        with atomic_write(self.path) as f:
+            f.write(json.dumps({'options': self.options}) + "\n")
+            for entry in self.done.values():
+                f.write(json.dumps(entry) + "\n")
+        self.file = self.path.open('a', encoding='utf-8')
+
+    def pending(self, md_files, logseq_graph_path, finished=None):
+        '''
+        Yields the files of md_files that were not finished, or whose source changed since, as
+        md_files is consumed. finished(relative_path, result) is called for the others, with the
+        result the earlier run recorded.
+        '''
+        for md_file in md_files:
+            relative_path = md_file.relative_to(logseq_graph_path).as_posix()
+            stat = md_file.stat()
+            source = (stat.st_size, stat.st_mtime_ns)
+            entry = self.done.pop(relative_path, None) # in the journal already, and not needed again
+            if entry is not None and (entry['size'], entry['mtime_ns']) == source:
+                if finished is not None:
+                    finished(relative_path, dict(entry['result'], errors=[]))
+                continue
+            self.sources[relative_path] = source
+            yield md_file
+
+    def record(self, relative_path, result):
+        '''Appends a finished file to the journal, files with errors are not recorded so they are tried again.'''
+        size, mtime_ns = self.sources.pop(relative_path)
+        if result['errors'] or self.file is None: # not opened, e.g. when writing an archive
+            return
+        entry = {'source': relative_path, 'size': size, 'mtime_ns': mtime_ns,
+                 'result': {key: result[key] for key in ('outputs', 'deps', 'assets')}}
+        self.file.write(json.dumps(entry) + "\n")
+        self.file.flush()
+        self.unsynced += 1
+        if self.unsynced >= PROGRESS_SYNC_EVERY:
+            os.fsync(self.file.fileno())
+            self.unsynced = 0
+
+    def close(self, completed=False):
+        '''Closes the journal, and removes it if the conversion completed.'''
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        if completed:
+            self.path.unlink(missing_ok=True)
+
+
+# --- Archive Output ---
+
+ARCHIVE_FORMATS = {'.zip': 'zip', '.tar': 'tar', '.tar.gz': 'gz', '.tgz': 'gz', '.tar.bz2': 'bz2', '.tar.xz': 'xz'}
+ARCHIVE_SPOOL_BYTES = 1024 * 1024 # text of a member kept in memory, at most, see ArchiveMember
+
+def archive_format(path):
+    '''Returns the format (a value of ARCHIVE_FORMATS) of an archive by the extension of path, or None.'''
+    name = Path(path).name.lower()
+    for extension, kind in ARCHIVE_FORMATS.items():
+        if name.endswith(extension):
+            return kind
+    return None
+
+class ArchiveMember(io.TextIOBase):
+    '''
+    A member of an ArchiveOutput being written as text, see ArchiveOutput.open_text. Up to
+    ARCHIVE_SPOOL_BYTES, the text is kept in memory, so a member dropped because writing it
+    failed leaves no trace. Beyond, a zip member is streamed into the archive as it is written,
+    and a tar member (whose size comes before its data) is spooled to a temporary file.
+    '''
+
+    def __init__(self, archive_output, name):
+        self.archive_output = archive_output
+        self.name = name
+        self.data = io.BytesIO() if archive_output.format == 'zip' else tempfile.SpooledTemporaryFile(ARCHIVE_SPOOL_BYTES)
+        self.stream = None # the zip member, once streamed
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        data = text.encode('utf-8')
+        self.size += len(data)
+        if self.stream is not None:
+            self.stream.write(data)
+        else:
+            self.data.write(data)
+            if self.archive_output.format == 'zip' and self.size > ARCHIVE_SPOOL_BYTES:
+                self.stream = self.archive_output.archive.open(self.archive_output.zip_info(self.name), 'w', force_zip64=True)
+                self.stream.write(self.data.getvalue())
+                self.data = None
+        return len(text)
+
+    def add(self):
+        '''Adds the member to the archive.'''
+        archive = self.archive_output.archive
+        if self.stream is not None:
+            self.stream.close()
+        elif self.archive_output.format == 'zip':
+            archive.writestr(self.name, self.data.getvalue())
+        else:
+            info = tarfile.TarInfo(self.name)
+            info.size = self.size
+            info.mtime = int(time.time())
+            info.mode = 0o644
+            self.data.seek(0)
+            archive.addfile(info, self.data)
+            self.data.close()
+        self.archive_output.members += 1
+
+    def discard(self):
+        '''Drops the member, a zip member already streamed is left truncated in the archive.'''
+        if self.stream is not None:
+            self.stream.close()
+            logging.warning(f"{self.name} is incomplete in the archive {self.archive_output.root}")
+        else:
+            self.data.close()
+
+class ArchiveOutput:
+    '''
+    Writes the vault as a zip or tar archive instead of a directory, see open_output.
+
+    The members are named by their path relative to the archive path, which stands for the vault
+    root. Nothing is staged on disk: converted files are added to the archive as they are written
+    (large ones through ArchiveMember, so they are not held in memory), and copied files (assets,
+    excalidraw and draws) are streamed into it from the graph. The archive is written to a hidden
+    temporary file and renamed when closed, like atomic_write, or removed by abort.
+    '''
+
+    def __init__(self, archive_path, compression_level=None):
+        self.root = Path(archive_path)
+        self.format = archive_format(archive_path)
+        self.temp_path = self.root.with_name(f".{self.root.name}.{os.getpid()}.tmp")
+        self.members = 0
+        if self.format == 'zip':
+            self.archive = zipfile.ZipFile(self.temp_path, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=compression_level)
+        elif self.format == 'tar' or compression_level is None:
+            self.archive = tarfile.open(self.temp_path, 'w' if self.format == 'tar' else f"w:{self.format}")
+        elif self.format == 'xz':
+            self.archive = tarfile.open(self.temp_path, 'w:xz', preset=compression_level)
+        else:
+            self.archive = tarfile.open(self.temp_path, f"w:{self.format}", compresslevel=compression_level)
+
+    def member_name(self, path):
+        return Path(path).relative_to(self.root).as_posix()
+
+    def zip_info(self, name):
+        '''The zip member for name as writestr makes it, for ZipFile.open (which would date it 1980).'''
+        info = zipfile.ZipInfo(name, time.localtime(time.time())[:6])
+        info.compress_type = self.archive.compression
+        info._compresslevel = self.archive.compresslevel # as ZipFile.open sets it for a name
+        info.external_attr = 0o600 << 16
+        return info
+
+    @contextmanager
+    def open_text(self, path):
+        '''Opens the member for path for writing text (an ArchiveMember), it is added to the archive when the block ends without an exception.'''
+        member = ArchiveMember(self, self.member_name(path))
+        try:
+            yield member
+        except BaseException:
+            member.discard()
+            raise
+        member.add()
+
+    def write_text(self, name, text):
+        data = text.encode('utf-8')
+        if self.format == 'zip':
+            self.archive.writestr(name, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            info.mode = 0o644
+            self.archive.addfile(info, io.BytesIO(data))
+        self.members += 1
+
+    def add_file(self, source, path):
+        '''Copies the file source into the archive as the member for path.'''
+        name = self.member_name(path)
+        if self.format == 'zip':
+            self.archive.write(source, name)
+            size = os.stat(source).st_size
+        else:
+            with open(source, 'rb') as source_file:
+                info = self.archive.gettarinfo(arcname=name, fileobj=source_file)
+                self.archive.addfile(info, source_file)
+            size = info.size
+        self.members += 1
+        transfer_stats['copied'] += 1
+        transfer_stats['bytes_copied'] += size
+
+    def close(self):
+        self.archive.close()
+        os.replace(self.temp_path, self.root)
+
+    def abort(self):
+        '''Closes the archive of a conversion that failed and removes its temporary file.'''
+        try:
+            self.archive.close()
+        finally:
+            self.temp_path.unlink(missing_ok=True)
+
+class PendingOutput:
+    '''
+    Stands for the ArchiveOutput in a worker process: the files written are kept in memory until
+    convert_page_file returns them (take), and the main process adds them to the archive.
+    '''
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.files = []
+
+    @contextmanager
+    def open_text(self, path):
+        buffer = io.StringIO()
+        yield buffer
+        self.files.append((Path(path).relative_to(self.root).as_posix(), buffer.getvalue()))
+
+    def take(self):
+        files, self.files = self.files, []
+        return files
+
+output_archive = None # the ArchiveOutput (or PendingOutput in a worker) the vault is written to, if any
+
+@contextmanager
+def open_output(path, streamed=False):
+    '''
+    Opens a file of the vault for writing text: atomically in the vault directory (creating its
+    parent directories), or as a member of output_archive when the vault is written as an archive.
+    While pages are converted with an output_writer, the file is written by its threads, unless
+    streamed (written as it is produced, e.g. large drawings, instead of kept in memory until then).
+    '''
+    if output_archive is not None:
+        with output_archive.open_text(path) as f:
+            yield f
+    elif output_writer is not None and not streamed:
+        with output_writer.open_text(path) as f:
+            yield f
+    else:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_write(path) as f:
+            yield f
+
+# --- I/O Pipeline ---
+# Serial conversions overlap reading the sources, converting and writing the vault (see
+# convert_page_files): the sources are read ahead (prefetch) and the converted files are
+# written behind (OutputWriter), each on its own threads, so the conversion waits on neither.
+
+def read_source(path):
+    '''Returns the content (bytes) of a source file, or the exception reading it raised.'''
+    try:
+        return path.read_bytes()
+    except Exception as e:
+        return e
+
+def prefetch(items, read, threads=IO_THREADS, depth=READ_AHEAD, executor=None):
+    '''
+    Yields (item, read(item)) for each of items, in order, with up to `depth` items read ahead on
+    a pool of `threads` threads, or on `executor` (e.g. a pool of worker processes).
+    '''
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix='reader') if executor is None else nullcontext(executor) as executor:
+        pending = deque()
+        items = iter(items)
+        for item in items:
+            pending.append((item, executor.submit(read, item)))
+            if len(pending) >= depth:
+                break
+        while pending:
+            item, future = pending.popleft()
+            for next_item in items:
+                pending.append((next_item, executor.submit(read, next_item)))
+                break
+            yield item, future.result()
+
+class OutputWriter:
+    '''
+    Writes the files of the vault on a pool of threads while pages are converted, see open_output.
+    At most `depth` files wait to be written: opening one more waits until one of them is. Files
+    are written with atomic_write, and the directories made are remembered instead of made again
+    for each file.
+    '''
+
+    def __init__(self, threads=IO_THREADS, depth=WRITE_BEHIND):
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='writer')
+        self.slots = threading.BoundedSemaphore(depth)
+        self.directories = set()
+        self.writes = []
+
+    @contextmanager
+    def open_text(self, path):
+        '''Opens path for writing text, it is written by the pool when the block ends without an exception.'''
+        buffer = io.StringIO()
+        yield buffer
+        self.slots.acquire()
+        try:
+            self.writes.append((path, self.executor.submit(self._write, path, buffer.getvalue())))
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def _write(self, path, text):
+        try:
+            if path.parent not in self.directories:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                self.directories.add(path.parent)
+            with atomic_write(path) as f:
+                f.write(text)
+        finally:
+            self.slots.release()
+
+    def take(self):
+        '''Returns the writes (path, future) started since the last call.'''
+        writes, self.writes = self.writes, []
+        return writes
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+output_writer = None # the OutputWriter files of the vault are written with, while pages are converted
 
-def convert_logseq_to_obsidian(logseq_graph_path, obsidian_vault_path, force_overwrite=False, clean=False, namespaceToFolder=False):
-    """Main function to orchestrate the conversion."""
+# --- Watch Mode ---
+
+WATCH_INTERVAL = 1.0 # seconds between two snapshots of the graph
+WATCH_DEBOUNCE = 2.0 # seconds without further changes before a burst of edits is synced
+
+def diff_snapshots(old, new):
+    '''Returns the files added or changed, and the files removed, between two snapshots (see snapshot_sources).'''
+    changed = {relative_path for relative_path, stat in new.items() if old.get(relative_path) != stat}
+    removed = old.keys() - new.keys()
+    return changed, removed
+
+def sync_changes(logseq_graph_path, obsidian_vault_path, manifest, snapshot, changed, removed, link_mode='copy'):
+    '''
+    Brings the vault up to date with a new snapshot of the graph, given the files added or
+    changed and removed since the manifest was written: updates the file index, converts the
+    changed journals and pages and the pages whose links now resolve differently, copies the
+    changed files, removes the outputs of removed files and saves the new manifest, which
+    is returned. With deduplicated assets, changed assets may change which ones are duplicates,
+    and then all pages are converted again. The conversion cache moves to the context of the
+    updated index (see cache_context), so pages are not served as converted with the old one.
+    The metrics and errors are those of this sync only: the errors are appended to
+    migration-errors.md in the vault, after the ones of the conversion and earlier syncs.
+    '''
+    global asset_canonical, conversion_cache
+    reset_metrics()
+    migration_errors.clear() # in the report already
+    options = manifest['options']
+    if options.get('dedupeAssets') and any(relative_path.startswith(LOGSEQ_ASSETS_DIR + '/') for relative_path in changed | removed):
+        asset_canonical, bytes_saved = find_duplicate_assets(logseq_graph_path)
+        options = dict(options, dedupeAssets=duplicate_assets_digest())
+    namespaceToFolder = options['namespaceToFolder']
+    update_file_index(file_index, logseq_graph_path, changed, removed, namespaceToFolder)
+    if conversion_cache is not None:
+        conversion_cache = ConversionCache(conversion_cache.path, cache_context(namespaceToFolder, options.get('pageParser', 'lines')),
+                                           conversion_cache.max_bytes)
+    sources = scan_sources(logseq_graph_path, manifest['sources'], snapshot)
+    to_update = plan_incremental(manifest, sources, options)
+
+    page_results = {}
+    def keep_result(md_file, result):
+        page_results[md_file.relative_to(logseq_graph_path).as_posix()] = manifest_result(result)
+    obsidian_excalidraw = obsidian_vault_path / OBSIDIAN_EXCALIDRAW_DIR
+    for source_dir, excalidraw in ((LOGSEQ_JOURNALS_DIR, False), (LOGSEQ_PAGES_DIR, True)):
+        md_files = sorted(logseq_graph_path / relative_path for relative_path in to_update
+                          if relative_path.startswith(source_dir + '/') and relative_path.endswith('.md'))
+        convert_page_files(md_files, obsidian_vault_path, obsidian_excalidraw, namespaceToFolder, excalidraw=excalidraw, on_result=keep_result,
+                           excalidraw_compact=options['excalidrawJson'] == 'compact', page_parser=options.get('pageParser', 'lines'))
+
+    failed = set()
+    orphans = set()
+    for source_dir in COPIED_SOURCE_DIRS:
+        if source_dir == LOGSEQ_ASSETS_DIR and options['referencedAssetsOnly']:
+            referenced = {name for result in page_results.values() for name in result['assets']}
+            referenced.update(name for relative_path, entry in manifest['sources'].items()
+                              if relative_path not in page_results and relative_path in sources for name in entry['assets'])
+            count, copy_failed, orphans = transfer_assets(logseq_graph_path, obsidian_vault_path, None, link_mode, referenced)
+            write_orphaned_assets(obsidian_vault_path, orphans)
+        elif source_dir == LOGSEQ_ASSETS_DIR:
+            count, copy_failed, _ = transfer_assets(logseq_graph_path, obsidian_vault_path, to_update, link_mode)
+        else:
+            count, copy_failed = copy_changed_files(logseq_graph_path, obsidian_vault_path, source_dir, to_update, link_mode)
+        failed |= copy_failed
+
+    duplicates = {f"{LOGSEQ_ASSETS_DIR}/{name}" for name in asset_canonical}
+    new_manifest = update_manifest(manifest, sources, options, page_results, failed, orphans | duplicates)
+    remove_stale_outputs(obsidian_vault_path, manifest, new_manifest, page_results)
+    save_manifest(obsidian_vault_path, new_manifest)
+    if migration_errors:
+        error_file_path = obsidian_vault_path / "migration-errors.md"
+        with open(error_file_path, 'a', encoding='utf-8') as error_file:
+            for error in migration_errors:
+                error_file.write(f"- {error}\n")
+        logging.info(f"{len(migration_errors)} errors logged to {error_file_path}")
+        migration_errors.clear()
+    logging.info(f"Synced {len(to_update)} changed and {len(removed)} removed files")
+    return new_manifest
+
+@serialized
+def watch_graph(logseq_graph_path, obsidian_vault_path, link_mode='copy', interval=WATCH_INTERVAL, debounce=WATCH_DEBOUNCE, polls=None):
+    '''
+    Keeps a vault in sync with the graph, after a conversion with incremental=True (which wrote
+    the manifest). The source directories are polled with stat snapshots (see snapshot_sources),
+    which needs no file notification service and works the same on every OS. Edits are
+    collected until the graph has not changed for `debounce` seconds, and then synced at once
+    (see sync_changes). Runs until interrupted, or for `polls` snapshots.
+    '''
+    logseq_graph_path = Path(logseq_graph_path)
+    obsidian_vault_path = Path(obsidian_vault_path).resolve()
+    manifest = load_manifest(obsidian_vault_path)
+    if manifest is None:
+        logging.error(f"No manifest in {obsidian_vault_path}, convert the graph with --incremental first")
+        return False
+
+    # start from what the manifest has, so edits made since it was written are synced too
+    snapshot = {relative_path: (entry['size'], entry['mtime_ns']) for relative_path, entry in manifest['sources'].items()}
+    changed, removed = set(), set()
+    last_change = None
+    logging.info(f"Watching {logseq_graph_path} for changes (Ctrl-C to stop)")
+    poll = 0
+    while polls is None or poll < polls:
+        if poll:
+            time.sleep(interval)
+        poll += 1
+        current = snapshot_sources(logseq_graph_path)
+        new_changed, new_removed = diff_snapshots(snapshot, current)
+        snapshot = current
+        if new_changed or new_removed:
+            changed = (changed - new_removed) | new_changed
+            removed = (removed - new_changed) | new_removed
+            last_change = time.monotonic()
+        elif last_change is not None and time.monotonic() - last_change >= debounce:
+            manifest = sync_changes(logseq_graph_path, obsidian_vault_path, manifest, snapshot, changed, removed, link_mode)
+            changed, removed = set(), set()
+            last_change = None
+    return True
+
+
+# --- Asset Transfer ---
+
+def transfer_assets(logseq_graph_path, obsidian_vault_path, changed=None, link_mode='copy', referenced=None):
+    '''
+    Puts the files of the assets folder in the vault: all of them, the ones in `changed`
+    (graph-relative paths) or, with `referenced` (names relative to the assets folder),
+    only the referenced ones. Duplicates of another asset (see asset_canonical) are left out.
+    Returns the number of files, the files that failed and the orphaned (unreferenced, not
+    copied) files.
+    '''
+    logseq_assets = logseq_graph_path / LOGSEQ_ASSETS_DIR
+    obsidian_assets = obsidian_vault_path / OBSIDIAN_ASSETS_DIR
+    if referenced is None and not asset_canonical:
+        if changed is None:
+            return transfer_tree(logseq_assets, obsidian_assets, link_mode), set(), set()
+        count, failed = copy_changed_files(logseq_graph_path, obsidian_vault_path, LOGSEQ_ASSETS_DIR, changed, link_mode)
+        return count, failed, set()
+
+    # all referenced assets are transferred, transfer_file skips the unchanged ones
+    wanted = set()
+    orphans = set()
+    for root, dirs, files in os.walk(logseq_assets):
+        for file in files:
+            relative_path = (Path(root) / file).relative_to(logseq_graph_path).as_posix()
+            name = relative_path[len(LOGSEQ_ASSETS_DIR) + 1:]
+            if name in asset_canonical:
+                continue
+            if referenced is None:
+                if changed is None or relative_path in changed:
+                    wanted.add(relative_path)
+            elif name in referenced:
+                wanted.add(relative_path)
+            else:
+                orphans.add(relative_path)
+    count, failed = copy_changed_files(logseq_graph_path, obsidian_vault_path, LOGSEQ_ASSETS_DIR, wanted, link_mode)
+    return count, failed, orphans
+
+def find_duplicate_assets(logseq_graph_path, threads=None):
+    '''
+    Finds the assets with the same content as another one. Only files that have the same size
+    as another one are hashed, on `threads` threads (by default the one of ThreadPoolExecutor,
+    sized for I/O from the number of CPUs, whatever the number of worker processes). The first
+    of a set of identical assets (in sorted order) is kept. Returns {duplicate: kept asset}, names relative to the assets folder,
+    and the number of bytes of the duplicates.
+    '''
+    logseq_assets = Path(logseq_graph_path) / LOGSEQ_ASSETS_DIR
+    sizes = {}
+    _snapshot_dir(logseq_assets, '', sizes)
+    by_size = {}
+    for name, (size, mtime_ns) in sizes.items():
+        by_size.setdefault(size, []).append(name)
+    candidates = sorted(name for names in by_size.values() if len(names) > 1 for name in names)
+    with ThreadPoolExecutor(max_workers=threads) as executor: # hashlib releases the GIL
+        digests = executor.map(file_digest, [logseq_assets / name for name in candidates])
+        kept = {}
+        duplicates = {}
+        for name, digest in zip(candidates, digests):
+            canonical = kept.setdefault((sizes[name][0], digest), name)
+            if canonical != name:
+                duplicates[name] = canonical
+    return duplicates, sum(sizes[name][0] for name in duplicates)
+
+def duplicate_assets_digest():
+    '''A hash of asset_canonical, in the options: the pages linking to duplicates change with it.'''
+    return hashlib.sha256(json.dumps(sorted(asset_canonical.items())).encode()).hexdigest()
+
+def write_orphaned_assets(obsidian_vault_path, orphans):
+    '''
+    Lists the assets that no page refers to (and were not copied) in orphaned-assets.md. Without
+    orphans, the report of an earlier run into the vault (incremental, or a watch sync) is removed.
+    '''
+    report_path = obsidian_vault_path / "orphaned-assets.md"
+    if not orphans:
+        if output_archive is None:
+            report_path.unlink(missing_ok=True)
+        return
+    with open_output(report_path) as report_file:
+        for relative_path in sorted(orphans):
+            report_file.write(f"- {relative_path}\n")
+    logging.info(f"{len(orphans)} orphaned assets were not copied, see {report_path}")
+
+LINK_MODES = ('copy', 'hardlink', 'reflink', 'symlink')
+FICLONE = 0x40049409 # Linux ioctl to clone (reflink) a file on btrfs, xfs, ...
+
+def _reflink(source, target):
+    if fcntl is None:
+        raise OSError("reflinks are not supported on this platform")
+    with open(source, 'rb') as source_file, open(target, 'wb') as target_file:
+        fcntl.ioctl(target_file.fileno(), FICLONE, source_file.fileno())
+    shutil.copystat(source, target)
+
+def transfer_file(source, target, link_mode='copy'):
+    '''
+    Puts the file source at target by copying it, or as a hard link, reflink (copy-on-write clone)
+    or symlink, depending on link_mode. Falls back to copying when the link can not be made,
+    e.g. across file systems. A target that already matches link_mode (the same inode for a hard
+    link, the right symlink, a separate file with the same size and mtime for a copy) is left
+    alone, any other target is replaced. Returns what was done: 'copied', 'linked' or 'skipped'.
+    When writing an archive, the file is always copied into it (see ArchiveOutput.add_file).
+    '''
+    if output_archive is not None:
+        output_archive.add_file(source, target)
+        return 'copied'
+    source_stat = os.stat(source)
+    try:
+        target_stat = os.lstat(target)
+    except FileNotFoundError:
+        target_stat = None
+    if target_stat is not None:
+        same_file = (target_stat.st_dev, target_stat.st_ino) == (source_stat.st_dev, source_stat.st_ino)
+        if link_mode == 'symlink':
+            unchanged = os.path.islink(target) and os.readlink(target) == os.path.abspath(source)
+        elif link_mode == 'hardlink' and target_stat.st_dev == source_stat.st_dev:
+            unchanged = same_file
+        else:
+            # a copy (or the copy a hard link fell back to across file systems), never the source itself
+            unchanged = (not os.path.islink(target) and not same_file and target_stat.st_size == source_stat.st_size
+                         and target_stat.st_mtime_ns == source_stat.st_mtime_ns)
+        if unchanged:
+            transfer_stats['skipped'] += 1
+            transfer_stats['bytes_avoided'] += source_stat.st_size
+            return 'skipped'
+        # never write through an old link into the source
+        os.unlink(target)
+
+    if link_mode != 'copy':
+        try:
+            if link_mode == 'hardlink':
+                os.link(source, target)
+            elif link_mode == 'reflink':
+                _reflink(source, target)
+            elif link_mode == 'symlink':
+                os.symlink(os.path.abspath(source), target)
+            transfer_stats['linked'] += 1
+            transfer_stats['bytes_avoided'] += source_stat.st_size
+            return 'linked'
+        except OSError as e:
+            if debug_enabled():
+                logging.debug(f"Could not {link_mode} {source}, copying instead: {e}")
+            transfer_stats['fallbacks'] += 1
+            if os.path.lexists(target):
+                os.unlink(target)
+
+    shutil.copy2(source, target)
+    transfer_stats['copied'] += 1
+    transfer_stats['bytes_copied'] += source_stat.st_size
+    return 'copied'
+
+def transfer_tree(source, target, link_mode='copy'):
+    '''Puts all files below source at the same place below target, see transfer_file. Returns the number of files.'''
+    count = 0
+    for root, dirs, files in os.walk(source):
+        target_dir = Path(target) / Path(root).relative_to(source)
+        if output_archive is None:
+            target_dir.mkdir(parents=True, exist_ok=True)
+        for file in files:
+            transfer_file(Path(root) / file, target_dir / file, link_mode)
+            count += 1
+    return count
+
+
+@serialized
+def convert_logseq_to_obsidian(logseq_graph_path, obsidian_vault_path, force_overwrite=False, clean=False, namespaceToFolder=False, jobs=1, incremental=False, metrics_json=None, metrics_top=20, link_mode='copy', referenced_assets_only=False, excalidraw_json='pretty', resume=False, cache_dir=None, cache_size_mb=CACHE_SIZE_MB, archive=False, compression_level=None, dedupe_assets=False, page_parser='lines', io_threads=IO_THREADS, read_ahead=READ_AHEAD, write_behind=WRITE_BEHIND, progress_interval=PROGRESS_INTERVAL, stream_errors=False):
+    """
+    Main function to orchestrate the conversion.
+    The journals and pages converted are recorded in a progress journal in the vault (see
+    ProgressJournal). With resume=True, a conversion that was interrupted continues where it
+    stopped: the vault is not cleaned, and files it finished are not converted again (files
+    that are copied are skipped anyway when unchanged, see transfer_file).
+    With cache_dir, converted journals and pages are kept in a ConversionCache there (up to
+    cache_size_mb), and a page that was converted before in the same context is not converted again.
+    With incremental=True, a manifest of the sources is kept in the vault and a later run
+    only converts, copies or deletes what changed since.
+    With metrics_json, stage and per-file timings and rule counters are written to that file.
+    link_mode (see LINK_MODES) decides how assets, excalidraw and draws files are put in the vault.
+    With referenced_assets_only, assets are copied after the pages are converted and only if a page
+    refers to them; the others are listed in orphaned-assets.md.
+    excalidraw_json (see EXCALIDRAW_JSON_FORMATS) decides how embedded drawings are written.
+    With archive=True, obsidian_vault_path is a zip or tar archive (see ARCHIVE_FORMATS) the vault
+    is written to, with compression_level (see ArchiveOutput); it can not be updated incrementally
+    or resumed.
+    With dedupe_assets, assets with the same content are put in the vault once, and links to the
+    duplicates point to the one that is kept (see find_duplicate_assets).
+    page_parser (see PAGE_PARSERS) decides how journals and pages are converted: line by line, or
+    on their block tree (see convert_page_blocks).
+    With io_threads, serial conversions read the sources up to read_ahead files ahead and write the
+    vault up to write_behind files behind on io_threads threads each (see convert_page_files).
+    The progress of the journals and pages is logged every progress_interval seconds (see ProgressReporter).
+    With stream_errors, errors are appended to migration-errors.md as they happen (see ErrorLog),
+    instead of kept in memory and written at the end.
+    """
 
     logseq_graph_path = Path(logseq_graph_path).resolve()
     logseq_graph_path = Path(os.path.relpath(logseq_graph_path, Path.cwd()))
@@ -449,7 +2946,39 @@ def convert_logseq_to_obsidian(logseq_graph_path, obsidian_vault_path, force_ove
         logging.error(f"Logseq 'pages' directory not found: {logseq_pages}")
         return False
 
-    if obsidian_vault_path.exists():
+    if archive:
+        if archive_format(obsidian_vault_path) is None:
+            logging.error(f"Unknown archive format: {obsidian_vault_path}, use one of {', '.join(ARCHIVE_FORMATS)}")
+            return False
+        if incremental or resume:
+            logging.error("An archive can not be updated incrementally or resumed")
+            return False
+        if obsidian_vault_path.exists() and not force_overwrite:
+            logging.error(f"Output archive {obsidian_vault_path} already exists. Use --force to overwrite.")
+            return False
+
+    global asset_canonical
+    asset_canonical = {}
+    file_timings.keep = metrics_top
+    if dedupe_assets:
+        with timed_stage('asset_dedupe') as stage:
+            asset_canonical, stage['bytes_saved'] = find_duplicate_assets(logseq_graph_path)
+            stage['files'] = len(asset_canonical)
+        logging.info(f"Asset deduplication: {len(asset_canonical)} duplicates, {stage_metrics['asset_dedupe']['bytes_saved']} bytes saved")
+
+    options = {'namespaceToFolder': namespaceToFolder, 'referencedAssetsOnly': referenced_assets_only,
+               'excalidrawJson': excalidraw_json, 'pageParser': page_parser, 'blockRefs': file_index.blocks is not None,
+               'dedupeAssets': duplicate_assets_digest() if dedupe_assets else False}
+    progress = ProgressJournal(obsidian_vault_path, options)
+    resumed = progress.load() if resume else 0
+    manifest = load_manifest(obsidian_vault_path) if incremental else None
+    if resumed:
+        logging.info(f"Resuming the conversion into {obsidian_vault_path}, {resumed} files were finished")
+    elif resume:
+        logging.warning(f"No interrupted conversion to resume in {obsidian_vault_path}")
+    if manifest is not None:
+        logging.info(f"Updating vault {obsidian_vault_path} incrementally")
+    elif obsidian_vault_path.exists() and not resumed and not archive: # a resumed run keeps what is in the vault
         if force_overwrite:
             logging.warning(f"Output directory {obsidian_vault_path} exists. Overwriting.")
             try:
@@ -479,111 +3008,361 @@ def convert_logseq_to_obsidian(logseq_graph_path, obsidian_vault_path, force_ove
             return False
 
     # --- Create Obsidian Vault Structure ---
+    global output_archive
+    output_archive = None
     try:
-        obsidian_vault_path.mkdir(parents=True, exist_ok=True)
-        logging.info(f"Created Obsidian vault directory: {obsidian_vault_path}")
+        if archive:
+            obsidian_vault_path.parent.mkdir(parents=True, exist_ok=True)
+            output_archive = ArchiveOutput(obsidian_vault_path, compression_level)
+            logging.info(f"Writing the Obsidian vault to the archive {obsidian_vault_path}")
+        else:
+            obsidian_vault_path.mkdir(parents=True, exist_ok=True)
+            logging.info(f"Created Obsidian vault directory: {obsidian_vault_path}")
     except Exception as e:
-        logging.error(f"Could not create Obsidian vault directory {obsidian_vault_path}: {e}")
+        logging.error(f"Could not create Obsidian vault {obsidian_vault_path}: {e}")
         return False
+    if not archive: # an archive is written in one go, there is nothing to resume
+        progress.open()
 
-    # --- Copy Assets ---
-    logseq_assets = logseq_graph_path / LOGSEQ_ASSETS_DIR
-    obsidian_assets = obsidian_vault_path / OBSIDIAN_ASSETS_DIR
-    if logseq_assets.is_dir():
-        try:
-            shutil.copytree(logseq_assets, obsidian_assets)
-            logging.info(f"Copied assets to {obsidian_assets}")
-        except Exception as e:
-            logging.error(f"Could not copy assets from {logseq_assets}: {e}")
-            # Continue conversion even if assets fail? Yes.
-    else:
-        logging.warning(f"Logseq assets directory not found: {logseq_assets}")
-
-    # --- Copy Journals ---
-    logseq_journals = logseq_graph_path / LOGSEQ_JOURNALS_DIR
-    obsidian_journals = obsidian_vault_path / LOGSEQ_JOURNALS_DIR # Keep same name usually
-    file_count = 0
-    if logseq_journals.is_dir():
-        try:
-            logging.info(f"Copying journals to {obsidian_journals}")
+    global migration_errors
+    saved_errors = migration_errors
+    try:
+        if stream_errors and not archive:
+            migration_errors = ErrorLog(obsidian_vault_path / "migration-errors.md")
+            migration_errors.extend(saved_errors)
+
+        global conversion_cache
+        conversion_cache = None
+        if cache_dir:
+            conversion_cache = ConversionCache(cache_dir, cache_context(namespaceToFolder, page_parser), cache_size_mb * 1024 * 1024)
+
+        # the results of the journals and pages are not kept, only what the manifest and the assets need
+        page_results = {} # graph-relative path -> manifest_result, with incremental
+        referenced = set() # the assets the journals and pages refer to, with referenced_assets_only
+        def finished(relative_path, result):
+            if incremental:
+                page_results[relative_path] = manifest_result(result)
+            if referenced_assets_only:
+                referenced.update(result['assets'])
+
+        def convert_pending(directory, **kwargs):
+            '''
+            Converts the journals or pages below directory that were not finished by an interrupted run,
+            listing them as they are converted, and returns how many were converted.
+            '''
+            def on_result(md_file, result):
+                relative_path = md_file.relative_to(logseq_graph_path).as_posix()
+                progress.record(relative_path, result)
+                finished(relative_path, result)
+            total = sum(1 for _ in changed_files(walk_md_files(directory), logseq_graph_path, changed))
+            md_files = progress.pending(changed_files(walk_md_files(directory), logseq_graph_path, changed), logseq_graph_path, finished)
+            return convert_page_files(md_files, obsidian_vault_path, obsidian_excalidraw, namespaceToFolder, jobs=jobs, on_result=on_result,
+                                      io_threads=io_threads, read_ahead=read_ahead, write_behind=write_behind,
+                                      progress_interval=progress_interval, total=total, **kwargs)
+
+        # --- Compare with the previous run ---
+        changed = None # None means everything
+        failed = set()
+        if incremental:
+            with timed_stage('manifest') as stage:
+                sources = scan_sources(logseq_graph_path, manifest['sources'] if manifest else None)
+                changed = plan_incremental(manifest, sources, options)
+                stage['files'] = len(sources)
+            logging.info(f"{len(changed)} of {len(sources)} source files changed since the last run")
+
+        # --- Copy Assets ---
+        logseq_assets = logseq_graph_path / LOGSEQ_ASSETS_DIR
+        obsidian_assets = obsidian_vault_path / OBSIDIAN_ASSETS_DIR
+        orphans = set()
+        def copy_assets(referenced=None):
+            nonlocal failed, orphans
+            with timed_stage('assets') as stage:
+                if logseq_assets.is_dir():
+                    try:
+                        stage['files'], copy_failed, orphans = transfer_assets(logseq_graph_path, obsidian_vault_path, changed, link_mode, referenced)
+                        failed |= copy_failed
+                        logging.info(f"Copied assets to {obsidian_assets}")
+                    except Exception as e:
+                        logging.error(f"Could not copy assets from {logseq_assets}: {e}")
+                        # Continue conversion even if assets fail? Yes.
+                else:
+                    logging.warning(f"Logseq assets directory not found: {logseq_assets}")
 
-            for md_file in logseq_journals.rglob('*.md'): # rglob searches recursively
-                if md_file.is_file():
-                    process_logseq_md_file(md_file, obsidian_vault_path, namespaceToFolder)
-                    file_count += 1
-            logging.info(f"Copied {file_count} journal files to {obsidian_journals}")
-            
+        if not referenced_assets_only:
+            copy_assets()
 
-        except Exception as e:
-            logging.error(f"Could not copy journals from {logseq_journals}: {e}")
-    else:
-        logging.warning(f"Logseq journals directory not found: {logseq_journals}")
+        logseq_excalidraw = logseq_graph_path / LOGSEQ_EXCALIDRAW_DIR
+        obsidian_excalidraw = obsidian_vault_path / OBSIDIAN_EXCALIDRAW_DIR
 
-    # --- Copy Excalidraw Files ---
-    logseq_excalidraw = logseq_graph_path / LOGSEQ_EXCALIDRAW_DIR
-    obsidian_excalidraw = obsidian_vault_path / OBSIDIAN_EXCALIDRAW_DIR
-    if logseq_excalidraw.is_dir():
-        try:
-            # Ensure target Excalidraw folder exists
-            obsidian_excalidraw.mkdir(parents=True, exist_ok=True)
-            shutil.copytree(logseq_excalidraw, obsidian_excalidraw, dirs_exist_ok=True) # Important for copying into existing dir
-            logging.info(f"Copied Excalidraw files to {obsidian_excalidraw}")
-        except Exception as e:
-            logging.error(f"Could not copy Excalidraw files from {logseq_excalidraw}: {e}")
-            logging.warning("Excalidraw file copying failed. Links in notes might be broken.")
-    else:
-        logging.warning(f"Logseq Excalidraw directory '{LOGSEQ_EXCALIDRAW_DIR}' not found: {logseq_excalidraw}")
+        # --- Copy Journals ---
+        logseq_journals = logseq_graph_path / LOGSEQ_JOURNALS_DIR
+        obsidian_journals = obsidian_vault_path / LOGSEQ_JOURNALS_DIR # Keep same name usually
+        file_count = 0
+        with timed_stage('journals') as stage:
+            if logseq_journals.is_dir():
+                try:
+                    logging.info(f"Copying journals to {obsidian_journals}")
 
+                    file_count = stage['files'] = convert_pending(logseq_journals, page_parser=page_parser)
+                    logging.info(f"Copied {file_count} journal files to {obsidian_journals}")
+                
 
-    # --- Process Pages ---
-    logging.info(f"Processing Logseq pages from: {logseq_pages}")
-    file_count = 0
-    for md_file in logseq_pages.rglob('*.md'): # rglob searches recursively
-         if md_file.is_file():
-            if EXCALIDRAW_FILE_PATTERN.match(md_file.name):
-                 process_logseq_excalidraw_file(logseq_graph_path, md_file, obsidian_excalidraw)
+                except Exception as e:
+                    logging.error(f"Could not copy journals from {logseq_journals}: {e}")
             else:
-                process_logseq_md_file(md_file, obsidian_vault_path, namespaceToFolder)
-            file_count += 1
-
-    # --- Process PaDrawsges ---
-    logging.info(f"Processing Logseq pages from: draws")
-    logseq_draws = logseq_graph_path / "draws"
-    obsidian_draws = obsidian_vault_path / "draws"
-    file_count = 0
-    if logseq_draws.is_dir():
-        try:
-            shutil.copytree(logseq_draws, obsidian_draws)
-            logging.info(f"Copied draws to {obsidian_assets}")
-        except Exception as e:
-            logging.error(f"Could not copy draws from {logseq_draws}: {e}")
-            # Continue conversion even if assets fail? Yes.
-    else:
-        logging.warning(f"Logseq assets directory not found: {logseq_draws}")
-    
-
-    logging.info(f"Processed {file_count} Markdown files from the 'pages' directory.")
-    logging.info("----- Conversion Summary -----")
-    logging.info(f"Logseq Graph Source: {logseq_graph_path}")
-    logging.info(f"Obsidian Vault Destination: {obsidian_vault_path}")
-    logging.warning("Review your new Obsidian vault, especially:")
-    logging.warning("- Links (internal, assets, Excalidraw)")
-    logging.warning("- Page properties (frontmatter)")
-    logging.warning("- Formatting and block structures")
-    logging.warning("- Excalidraw drawings may need manual relinking if Logseq used complex plugin data.")
-    logging.warning("- TODOs might fail to convert to tasks correctly due to indentation. Tip: Search for '- [ ]' in your vault to find them")
-    logging.warning("- Using daily notes? Check the 'journals' folder for converted files.")
-
-    # write all the errors to a file in the obsidian vault root, named migration-errors.md
-    if migration_errors:
-        error_file_path = obsidian_vault_path / "migration-errors.md"
-        with error_file_path.open('w', encoding='utf-8') as error_file:
-            for error in migration_errors:
-                error_file.write(f"- {error}\n")
-        logging.info(f"Errors logged to {error_file_path}")
+                logging.warning(f"Logseq journals directory not found: {logseq_journals}")
+
+        # --- Copy Excalidraw Files ---
+        with timed_stage('excalidraw') as stage:
+            if logseq_excalidraw.is_dir():
+                try:
+                    # Ensure target Excalidraw folder exists
+                    if output_archive is None:
+                        obsidian_excalidraw.mkdir(parents=True, exist_ok=True)
+                    if changed is None:
+                        stage['files'] = transfer_tree(logseq_excalidraw, obsidian_excalidraw, link_mode)
+                    else:
+                        stage['files'], copy_failed = copy_changed_files(logseq_graph_path, obsidian_vault_path, LOGSEQ_EXCALIDRAW_DIR, changed, link_mode)
+                        failed |= copy_failed
+                    logging.info(f"Copied Excalidraw files to {obsidian_excalidraw}")
+                except Exception as e:
+                    logging.error(f"Could not copy Excalidraw files from {logseq_excalidraw}: {e}")
+                    logging.warning("Excalidraw file copying failed. Links in notes might be broken.")
+            else:
+                logging.warning(f"Logseq Excalidraw directory '{LOGSEQ_EXCALIDRAW_DIR}' not found: {logseq_excalidraw}")
+
+
+        # --- Process Pages ---
+        logging.info(f"Processing Logseq pages from: {logseq_pages}")
+        with timed_stage('pages') as stage:
+            stage['files'] = convert_pending(logseq_pages, excalidraw=True, excalidraw_compact=excalidraw_json == 'compact', page_parser=page_parser)
+
+        # --- Copy only the referenced assets, now that all pages are converted ---
+        if referenced_assets_only:
+            if manifest is not None and changed is not None:
+                # pages that were not converted again
+                referenced.update(name for relative_path, entry in manifest['sources'].items()
+                                  if relative_path not in page_results and relative_path in sources for name in entry['assets'])
+            copy_assets(referenced)
+            stage_metrics['assets']['orphans'] = len(orphans)
+            write_orphaned_assets(obsidian_vault_path, orphans)
+
+        # --- Process PaDrawsges ---
+        logging.info(f"Processing Logseq pages from: draws")
+        logseq_draws = logseq_graph_path / LOGSEQ_DRAWS_DIR
+        obsidian_draws = obsidian_vault_path / LOGSEQ_DRAWS_DIR
+        file_count = 0
+        with timed_stage('draws') as stage:
+            if logseq_draws.is_dir():
+                try:
+                    if changed is None:
+                        stage['files'] = transfer_tree(logseq_draws, obsidian_draws, link_mode)
+                    else:
+                        stage['files'], copy_failed = copy_changed_files(logseq_graph_path, obsidian_vault_path, LOGSEQ_DRAWS_DIR, changed, link_mode)
+                        failed |= copy_failed
+                    logging.info(f"Copied draws to {obsidian_assets}")
+                except Exception as e:
+                    logging.error(f"Could not copy draws from {logseq_draws}: {e}")
+                    # Continue conversion even if assets fail? Yes.
+            else:
+                logging.warning(f"Logseq assets directory not found: {logseq_draws}")
+
+        if incremental:
+            duplicates = {f"{LOGSEQ_ASSETS_DIR}/{name}" for name in asset_canonical}
+            new_manifest = update_manifest(manifest, sources, options, page_results, failed, orphans | duplicates)
+            remove_stale_outputs(obsidian_vault_path, manifest, new_manifest, page_results)
+            save_manifest(obsidian_vault_path, new_manifest)
+
+        logging.info(f"Processed {file_count} Markdown files from the 'pages' directory.")
+        logging.info("----- Conversion Summary -----")
+        logging.info(f"Logseq Graph Source: {logseq_graph_path}")
+        logging.info(f"Obsidian Vault Destination: {obsidian_vault_path}")
+        logging.info(f"Tag/link resolution: {file_index.stats['direct']} direct, {file_index.stats['fallback']} fallback, {file_index.stats['alias']} alias, {file_index.stats['miss']} unresolved")
+        if file_index.blocks is not None:
+            logging.info(f"Block references: {file_index.stats['block']} resolved, {file_index.stats['block_miss']} unresolved, {len(file_index.blocks)} blocks indexed")
+        if conversion_cache is not None:
+            conversion_cache.evict()
+            logging.info(f"Conversion cache: {conversion_cache.stats['hits']} hits, {conversion_cache.stats['misses']} misses "
+                         f"(hit rate {conversion_cache.hit_rate()}), {conversion_cache.stats['evicted']} evicted")
+        for stage, entry in stage_metrics.items():
+            logging.info(f"Stage {stage}: {entry['files']} files in {entry['seconds']:.2f}s")
+        logging.info(f"Files copied: {transfer_stats['copied']}, linked: {transfer_stats['linked']} ({link_mode}), unchanged: {transfer_stats['skipped']}, "
+                     f"link fallbacks: {transfer_stats['fallbacks']}, bytes avoided: {transfer_stats['bytes_avoided']}")
+        logging.warning("Review your new Obsidian vault, especially:")
+        logging.warning("- Links (internal, assets, Excalidraw)")
+        logging.warning("- Page properties (frontmatter)")
+        logging.warning("- Formatting and block structures")
+        logging.warning("- Excalidraw drawings may need manual relinking if Logseq used complex plugin data.")
+        logging.warning("- TODOs might fail to convert to tasks correctly due to indentation. Tip: Search for '- [ ]' in your vault to find them")
+        logging.warning("- Using daily notes? Check the 'journals' folder for converted files.")
+
+        # write all the errors to a file in the obsidian vault root, named migration-errors.md
+        if isinstance(migration_errors, ErrorLog):
+            migration_errors.close()
+            if migration_errors:
+                logging.info(f"Errors logged to {migration_errors.path}")
+        elif migration_errors:
+            error_file_path = obsidian_vault_path / "migration-errors.md"
+            with open_output(error_file_path) as error_file:
+                for error in migration_errors:
+                    error_file.write(f"- {error}\n")
+            logging.info(f"Errors logged to {error_file_path}")
+        if not migration_errors and output_archive is None:
+            # the vault is not cleaned by incremental and resumed runs, the report of an earlier run is stale
+            (obsidian_vault_path / "migration-errors.md").unlink(missing_ok=True)
+
+        if output_archive is not None:
+            members = output_archive.members
+            output_archive.close()
+            output_archive = None
+            logging.info(f"Wrote {members} files to the archive {obsidian_vault_path} ({obsidian_vault_path.stat().st_size} bytes)")
+
+        if metrics_json:
+            write_metrics_json(metrics_json, metrics_top)
+
+        progress.close(completed=True)
+        return True
+    finally:
+        # also when the conversion raised: the log is closed and not left as the module global
+        if isinstance(migration_errors, ErrorLog):
+            migration_errors.close()
+        migration_errors = saved_errors
+        if output_archive is not None: # the conversion raised before the archive was closed
+            output_archive.abort()
+            output_archive = None
+
+# --- Library API ---
+
+# The module globals a conversion works with, see Converter
+CONVERTER_STATE = ('logseq_graph_path', 'file_index', 'migration_errors', 'asset_references', 'asset_canonical',
+                   'conversion_cache', 'output_archive', 'rule_hits', 'stage_metrics', 'file_timings', 'transfer_stats')
+
+class Converter:
+    '''
+    Converts Logseq graphs and pages when this module is used as a library. Between calls, a
+    Converter keeps its own page index, options, errors (migration_errors) and metrics, one
+    attribute for each of CONVERTER_STATE, so converting several graphs one after the other does
+    not mix them up.
+
+    The state is not passed to the conversion functions: they work on the module globals, and
+    each call swaps the converter's state into them, and back out when it returns, holding
+    _converter_lock. So only one conversion runs in a process at a time: calls of converters in
+    other threads, and of convert_logseq_to_obsidian and watch_graph (see serialized), wait for
+    it, and other module functions called from another thread meanwhile see the converter's
+    state. Converters are not meant for converting concurrently, e.g. in a service; use jobs
+    (worker processes) for parallelism within a graph, or one process per graph.
+    '''
 
+    def __init__(self, namespaceToFolder=False, block_refs=False, include=INDEX_INCLUDE, exclude=INDEX_EXCLUDE, index_db=None, **options):
+        '''
+        options are passed to convert_logseq_to_obsidian by convert_graph, e.g. jobs or link_mode.
+        With index_db, the index of a graph on disk is kept in that database (see DiskFileIndex).
+        '''
+        self.namespaceToFolder = namespaceToFolder
+        self.block_refs = block_refs
+        self.include, self.exclude = tuple(include), tuple(exclude)
+        self.index_db = index_db
+        self.options = options
+        self.logseq_graph_path = None
+        self.file_index = FileIndex()
+        self.migration_errors = []
+        self.asset_references = set()
+        self.asset_canonical = {}
+        self.conversion_cache = None
+        self.output_archive = None
+        self.rule_hits = dict.fromkeys(rule_hits, 0)
+        self.stage_metrics = {}
+        self.file_timings = FileTimings()
+        self.transfer_stats = dict.fromkeys(transfer_stats, 0)
+
+    @contextmanager
+    def activated(self):
+        '''Makes the state of this converter the module globals while the block runs.'''
+        module = globals()
+        with _converter_lock:
+            saved = {name: module[name] for name in CONVERTER_STATE}
+            module.update((name, getattr(self, name)) for name in CONVERTER_STATE)
+            try:
+                yield self
+            finally:
+                # the conversion may have replaced some of them, e.g. the file index
+                for name in CONVERTER_STATE:
+                    setattr(self, name, module[name])
+                module.update(saved)
+
+    def index_graph(self, logseq_graph_path):
+        '''Indexes the pages of the graph on disk, as the targets of the tags and links of converted pages.'''
+        global file_index
+        with self.activated():
+            globals()['logseq_graph_path'] = Path(logseq_graph_path).resolve()
+            file_index = create_file_index(Path(logseq_graph_path).resolve(), self.namespaceToFolder, block_refs=self.block_refs,
+                                           include=self.include, exclude=self.exclude, index_db=self.index_db)
+
+    def index_pages(self, pages):
+        '''
+        Indexes pages in memory, as the targets of the tags and links of converted pages: `pages`
+        maps graph-relative paths (e.g. pages/Start.md) to their text or a file object to read it from.
+        Returns the texts of the pages, by path.
+        '''
+        texts = {relative_path: read_text(source) for relative_path, source in pages.items()}
+        index = FileIndex()
+        index.include, index.exclude = self.include, self.exclude
+        for relative_path, text in texts.items():
+            if not in_index_scope(relative_path, self.include, self.exclude):
+                continue
+            index[page_name(relative_path)] = relative_path
+            if is_page_file(relative_path):
+                for alias in property_aliases(parse_property_block(text.splitlines())):
+                    index.add_alias(alias, relative_path)
+                if self.block_refs:
+                    block_uuids = [match.group(1).decode() for match in BLOCK_ID_BYTES_PATTERN.finditer(text.encode('utf-8'))]
+                    if block_uuids:
+                        index.add_blocks(block_page_link(relative_path, self.namespaceToFolder), block_uuids)
+        if self.block_refs and index.blocks is None:
+            index.blocks = {}
+        self.file_index = index.build_lookup()
+        return texts
+
+    def convert_page(self, page):
+        '''Converts the text of a journal or page (or a file object to read it from) and returns the text of the Obsidian note.'''
+        with self.activated():
+            return convert_page_content(read_text(page), self.namespaceToFolder, self.options.get('page_parser', 'lines'))
+
+    def convert_graph(self, logseq_graph, obsidian_vault_path=None, **options):
+        '''
+        Converts a graph. `logseq_graph` is either the path of a graph on disk, converted into a vault
+        at obsidian_vault_path (see convert_logseq_to_obsidian, with the options of the converter and
+        `options`; returns whether it succeeded), or a mapping of graph-relative paths to texts or file
+        objects (see index_pages), whose journals and pages are converted in memory and returned as
+        {vault-relative path: text}. Errors are collected in migration_errors.
+        '''
+        if not isinstance(logseq_graph, (str, os.PathLike)):
+            texts = self.index_pages(logseq_graph)
+            converted = {}
+            with self.activated():
+                for relative_path, text in texts.items():
+                    if not is_page_file(relative_path):
+                        continue
+                    try:
+                        converted[obsidian_page_path(relative_path, self.namespaceToFolder)] = convert_page_content(
+                            text, self.namespaceToFolder, self.options.get('page_parser', 'lines'))
+                    except Exception as e:
+                        logging.error(f"Error when processing {relative_path}: {e}")
+                        migration_errors.append(f"- Error processing {relative_path}:\n  - {e}\n occured ")
+            return converted
+
+        self.index_graph(logseq_graph)
+        with self.activated():
+            return convert_logseq_to_obsidian(self.logseq_graph_path, obsidian_vault_path, namespaceToFolder=self.namespaceToFolder,
+                                              **dict(self.options, **options))
+
+def read_text(source):
+    '''The text of a page given as a str, or as a file object opened in text or binary mode.'''
+    if isinstance(source, str):
+        return source
+    text = source.read()
+    return text.decode('utf-8') if isinstance(text, bytes) else text
 
-    return True
 
 # --- Command Line Interface ---
 if __name__ == "__main__":
@@ -594,17 +3373,71 @@ if __name__ == "__main__":
     parser.add_argument("-c", "--clean", action="store_true", help="Remove the output directory if it exists, but keeping any .obsidian settings.")
     parser.add_argument("-v", "--verbose", action="store_true", help="Enable verbose debug logging.")
     parser.add_argument("-n", "--namespaces", action="store_true", help="Convert namespaces to folders.")
+    parser.add_argument("-b", "--block-refs", action="store_true", help="Index the blocks with an id:: first, and convert ((uuid)) block references and embeds to links to block anchors.")
+    parser.add_argument("-w", "--watch", action="store_true", help="After converting, keep watching the graph and convert or copy the files that change (implies --incremental).")
+    parser.add_argument("--watch-interval", type=float, default=WATCH_INTERVAL, help=f"Seconds between two checks for changes with --watch (default: {WATCH_INTERVAL}).")
+    parser.add_argument("-r", "--resume", action="store_true", help="Continue a conversion into the same vault that was interrupted, skipping the files it finished.")
+    parser.add_argument("--index-include", action="append", metavar="GLOB",
+                        help="Files that tags and links can refer to, as globs relative to the graph where * also matches '/' "
+                             f"(repeatable, default: {' '.join(INDEX_INCLUDE)}).")
+    parser.add_argument("--index-exclude", action="append", default=[], metavar="GLOB",
+                        help=f"Files or folders left out of the index, in addition to hidden ones ({' '.join(INDEX_EXCLUDE)}), e.g. 'pages/archive' (repeatable).")
+    parser.add_argument("--index-db", metavar="FILE",
+                        help="Keep the index of the pages in this sqlite database (created again) instead of in memory, for huge graphs.")
+    parser.add_argument("--stream-errors", action="store_true",
+                        help="Append errors to migration-errors.md as they happen, instead of keeping them in memory until the end.")
+    parser.add_argument("--cache-dir", help="Keep converted journals and pages in this folder, and reuse them in later runs and other vaults.")
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE_MB, help=f"Size cap of the --cache-dir in MB, least recently used pages are evicted (default: {CACHE_SIZE_MB}).")
+    parser.add_argument("-i", "--incremental", action="store_true", help="Keep a manifest in the vault and only convert, copy or delete files that changed since the last run.")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Number of worker processes used to convert pages and journals (default: 1).")
+    parser.add_argument("--link-mode", choices=LINK_MODES, default='copy',
+                        help="How assets, excalidraw and draws files are put in the vault (default: copy). Falls back to copying when not possible. "
+                             "Note that with hardlink and symlink, editing these files in the vault also changes them in the Logseq graph.")
+    parser.add_argument("--referenced-assets-only", action="store_true", help="Only copy assets that a page refers to, list the others in orphaned-assets.md.")
+    parser.add_argument("--dedupe-assets", action="store_true", help="Copy assets with the same content once, and point the links to the duplicates to the copy.")
+    parser.add_argument("--excalidraw-json", choices=EXCALIDRAW_JSON_FORMATS, default='pretty',
+                        help="How drawings embedded in pages are written (default: pretty). compact copies the json as it is, "
+                             "without parsing it, which is faster and uses less memory for large drawings.")
+    parser.add_argument("--page-parser", choices=PAGE_PARSERS, default='lines',
+                        help="How journals and pages are converted (default: lines). blocks parses each page into its blocks first, "
+                             "which keeps the nesting of blocks and leaves code blocks alone.")
+    parser.add_argument("--io-threads", type=int, default=IO_THREADS,
+                        help=f"Threads reading and threads writing files while pages are converted without -j, 0 to read and write in line (default: {IO_THREADS}).")
+    parser.add_argument("--read-ahead", type=int, default=READ_AHEAD, help=f"Source files read ahead of the conversion, at most, with --io-threads (default: {READ_AHEAD}).")
+    parser.add_argument("--write-behind", type=int, default=WRITE_BEHIND, help=f"Converted files waiting to be written, at most, with --io-threads (default: {WRITE_BEHIND}).")
+    parser.add_argument("--progress-interval", type=float, default=PROGRESS_INTERVAL,
+                        help=f"Seconds between two progress messages (files/s, lines/s, time left) while pages are converted, 0 for none (default: {PROGRESS_INTERVAL}).")
+    parser.add_argument("-a", "--archive", action="store_true",
+                        help=f"Write the vault to obsidian_dir as an archive instead of a directory, in the format of its extension ({', '.join(ARCHIVE_FORMATS)}).")
+    parser.add_argument("--compression-level", type=int, help="Compression level of the --archive (zip and gz: 0-9, bz2: 1-9, xz: preset 0-9).")
+    parser.add_argument("--metrics-json", help="Write stage and per-file timings and rewrite rule counters to this JSON file.")
+    parser.add_argument("--metrics-top", type=int, default=20, help="Number of slowest files listed in the metrics (default: 20).")
 
     args = parser.parse_args()
 
-    if args.verbose:
-        logging.getLogger().setLevel(logging.DEBUG)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format=LOG_FORMAT)
 
     # Make global paths accessible within functions if needed (though passed is better)
     logseq_graph_path = Path(args.logseq_dir).resolve()
     # obsidian_vault_path is handled inside the main function
 
     # init the file index for the logseq graph
-    file_index = create_file_index(logseq_graph_path, args.namespaces)
-
-    convert_logseq_to_obsidian(logseq_graph_path, args.obsidian_dir, args.force, args.clean, args.namespaces)
\ No newline at end of file
+    file_index = create_file_index(logseq_graph_path, args.namespaces, block_refs=args.block_refs,
+                                   include=args.index_include or INDEX_INCLUDE, exclude=INDEX_EXCLUDE + tuple(args.index_exclude),
+                                   index_db=args.index_db)
+
+    converted = convert_logseq_to_obsidian(logseq_graph_path, args.obsidian_dir, args.force, args.clean, args.namespaces, jobs=args.jobs,
+                                           incremental=args.incremental or args.watch,
+                                           metrics_json=args.metrics_json, metrics_top=args.metrics_top, link_mode=args.link_mode,
+                                           referenced_assets_only=args.referenced_assets_only, excalidraw_json=args.excalidraw_json,
+                                           resume=args.resume, cache_dir=args.cache_dir, cache_size_mb=args.cache_size,
+                                           archive=args.archive, compression_level=args.compression_level, dedupe_assets=args.dedupe_assets,
+                                           page_parser=args.page_parser, io_threads=args.io_threads,
+                                           read_ahead=args.read_ahead, write_behind=args.write_behind,
+                                           progress_interval=args.progress_interval, stream_errors=args.stream_errors)
+
+    if converted and args.watch:
+        try:
+            watch_graph(logseq_graph_path, args.obsidian_dir, link_mode=args.link_mode, interval=args.watch_interval)
+        except KeyboardInterrupt:
+            logging.info("Stopped watching")
\ No newline at end of file
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+
+# Golden-output parity harness for logseq_to_obsidian.py
+#
+# Converts a corpus of graphs with the reference conversion and with each optimized mode,
+# compares the vaults byte for byte and reports the throughput of each mode side by side. Exits
+# with status 1 if any vault differs. The fixture graphs in tests/golden have their expected
+# vaults committed next to them, and every conversion of them (the reference one too) is compared
+# with that golden vault, so a change of the rewriting all modes share shows up as well. Other
+# graphs (synthetic ones, see bench_logseq_to_obsidian.generate_graph, and the ones given with
+# --graph) have no golden vault: their modes are compared with the reference conversion.
+#
+# > python parity_logseq_to_obsidian.py
+# > python parity_logseq_to_obsidian.py --graph ~/logseq/notes --mode parallel --mode cached -j 8
+#
+# After an intended change of the output, review the differences and write the golden vaults again:
+#
+# > python parity_logseq_to_obsidian.py --update-golden
+
+import argparse
+import json
+import logging
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+
+from pathlib import Path
+
+import logseq_to_obsidian
+from bench_logseq_to_obsidian import generate_graph
+
+
+# Synthetic graphs of the corpus, parameters of generate_graph
+CORPUS = {
+    'synthetic': {'pages': 200, 'journals': 100},
+    'namespaces': {'pages': 200, 'journals': 20, 'namespaces': 1.0, 'properties': 1.0},
+    'long_pages': {'pages': 50, 'journals': 10, 'lines': 200, 'code_blocks': 1.0},
+}
+
+# The reference conversion: serial, reading and writing each file in line
+REFERENCE = {'jobs': 1, 'io_threads': 0}
+
+# Fixture graphs with their golden vaults: <name>/graph and <name>/vault, converted as convert does
+GOLDEN_PATH = Path(__file__).resolve().parent / "tests" / "golden"
+
+# Optimized modes, options of convert_logseq_to_obsidian (True for the paths in the work directory)
+MODES = {
+    'io_pipeline': {'io_threads': logseq_to_obsidian.IO_THREADS},
+    'parallel': {'jobs': 2},
+    'incremental': {'incremental': True}, # an update of a vault converted from an older graph
+    'cached': {'cache_dir': True}, # a second run, converted pages come from the cache
+    'archive': {'archive': True},
+    'index_db': {'index_db': True, 'stream_errors': True},
+}
+
+# Files of the vault that are not output but bookkeeping of a mode
+BOOKKEEPING_FILES = {logseq_to_obsidian.MANIFEST_FILE, logseq_to_obsidian.PROGRESS_FILE}
+
+
+def vault_files(vault_path):
+    '''Returns the files of a vault (a directory, or a zip archive) as {relative path: bytes}.'''
+    vault_path = Path(vault_path)
+    if vault_path.is_file():
+        with zipfile.ZipFile(vault_path) as archive:
+            return {name: archive.read(name) for name in sorted(archive.namelist()) if name not in BOOKKEEPING_FILES}
+    return {path.relative_to(vault_path).as_posix(): path.read_bytes() for path in sorted(vault_path.rglob("*"))
+            if path.is_file() and path.name not in BOOKKEEPING_FILES}
+
+
+def diff_vaults(expected, actual):
+    '''Returns the differences between two vaults (see vault_files), one line each.'''
+    differences = [f"missing: {name}" for name in expected if name not in actual]
+    differences += [f"extra: {name}" for name in actual if name not in expected]
+    for name, data in expected.items():
+        if name in actual and actual[name] != data:
+            expected_lines, actual_lines = data.splitlines(), actual[name].splitlines()
+            number = next((number for number, (line, other) in enumerate(zip(expected_lines, actual_lines)) if line != other),
+                          min(len(expected_lines), len(actual_lines)))
+            expected_line = expected_lines[number] if number < len(expected_lines) else b'<end>'
+            actual_line = actual_lines[number] if number < len(actual_lines) else b'<end>'
+            differences.append(f"differs: {name} line {number + 1}: {expected_line!r} != {actual_line!r}")
+    return differences
+
+
+def golden_graphs(golden_path=GOLDEN_PATH):
+    '''Returns {name: (graph path, golden vault path)} of the fixture graphs in golden_path.'''
+    if not Path(golden_path).is_dir():
+        return {}
+    return {path.name: (path / "graph", path / "vault") for path in sorted(Path(golden_path).iterdir()) if (path / "graph").is_dir()}
+
+
+def write_golden(vault_path, files):
+    '''Replaces the golden vault at vault_path with files (see vault_files).'''
+    vault_path = Path(vault_path)
+    if vault_path.exists():
+        shutil.rmtree(vault_path)
+    for name, data in files.items():
+        (vault_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (vault_path / name).write_bytes(data)
+
+
+def convert(graph_path, vault_path, index_db=None, **options):
+    '''Converts a graph the way the command line does (with block references), returns the time it took in seconds.'''
+    graph_path = Path(graph_path).resolve()
+    logseq_to_obsidian.reset_metrics()
+    logseq_to_obsidian.migration_errors.clear()
+    logseq_to_obsidian.logseq_graph_path = graph_path
+    start = time.perf_counter()
+    logseq_to_obsidian.file_index = logseq_to_obsidian.create_file_index(graph_path, block_refs=True, index_db=index_db)
+    if not logseq_to_obsidian.convert_logseq_to_obsidian(graph_path, vault_path, force_overwrite=True,
+                                                         clean=not options.get('incremental'), **options):
+        raise RuntimeError(f"Could not convert {graph_path}")
+    return time.perf_counter() - start
+
+
+def changed_graph(graph_path):
+    '''
+    Changes a graph (edits, removes and adds a page), and returns a function that restores it.
+    The restored files are written again, so an incremental run sees them as changed.
+    '''
+    pages = sorted((Path(graph_path) / logseq_to_obsidian.LOGSEQ_PAGES_DIR).glob("*.md"))
+    saved = {page: page.read_bytes() for page in pages[:2]}
+    added = Path(graph_path) / logseq_to_obsidian.LOGSEQ_PAGES_DIR / "parity added page.md"
+    if pages:
+        pages[0].write_bytes(saved[pages[0]] + b"- an edit with a [[link]] and #tag\n")
+    if len(pages) > 1:
+        pages[1].unlink()
+    added.write_text(f"alias:: {pages[-1].stem if pages else 'added'}\n\n- added [[{pages[0].stem if pages else 'x'}]]\n", encoding='utf-8')
+    def restore():
+        added.unlink(missing_ok=True)
+        for page, data in saved.items():
+            page.write_bytes(data)
+    return restore
+
+
+def run_mode(graph_path, work_path, mode, options):
+    '''Converts a graph in a mode (see MODES) below work_path, returns (seconds, vault files).'''
+    options = dict(options)
+    vault_path = work_path / f"{mode}-vault"
+    for key in ('cache_dir', 'index_db'):
+        if options.get(key) is True:
+            options[key] = work_path / f"{mode}-{key}"
+            if options[key].is_dir():
+                shutil.rmtree(options[key])
+    if options.get('archive'):
+        vault_path = work_path / f"{mode}-vault.zip"
+        vault_path.unlink(missing_ok=True)
+    elif vault_path.exists():
+        shutil.rmtree(vault_path)
+
+    if options.get('incremental'):
+        restore = changed_graph(graph_path)
+        try:
+            convert(graph_path, vault_path, **options)
+        finally:
+            restore()
+    elif options.get('cache_dir'):
+        convert(graph_path, work_path / f"{mode}-cold-vault", **options)
+    seconds = convert(graph_path, vault_path, **options)
+    return seconds, vault_files(vault_path)
+
+
+def run_parity(graphs, modes=tuple(MODES), page_parsers=('lines',), jobs=2, work_path=None, golden=None):
+    '''
+    Converts each graph (name -> path) with the reference conversion and in each mode, for each
+    page parser, and compares the vaults with the golden vault of the graph in golden (name ->
+    vault path, see golden_graphs), or with the reference conversion if it has none. Returns a
+    row for each conversion: graph, page_parser, mode, seconds, files (journals and pages) and the
+    differences found.
+    '''
+    golden = golden or {}
+    results = []
+    with tempfile.TemporaryDirectory(prefix="logseq-parity-") as tmp:
+        work_path = Path(work_path or tmp)
+        for name, graph_path in graphs.items():
+            files = sum(1 for _ in Path(graph_path).glob("journals/**/*.md")) + sum(1 for _ in Path(graph_path).glob("pages/**/*.md"))
+            for page_parser in page_parsers:
+                run_path = work_path / name / page_parser
+                run_path.mkdir(parents=True, exist_ok=True)
+                seconds, reference = run_mode(graph_path, run_path, 'reference', dict(REFERENCE, page_parser=page_parser))
+                expected = vault_files(golden[name]) if name in golden else reference
+                results.append({'graph': name, 'page_parser': page_parser, 'mode': 'reference', 'seconds': seconds,
+                                'files': files, 'differences': diff_vaults(expected, reference)})
+                for mode in modes:
+                    options = dict(MODES[mode], page_parser=page_parser)
+                    if 'jobs' in options:
+                        options['jobs'] = jobs
+                    seconds, actual = run_mode(graph_path, run_path, mode, options)
+                    results.append({'graph': name, 'page_parser': page_parser, 'mode': mode, 'seconds': seconds,
+                                    'files': files, 'differences': diff_vaults(expected, actual)})
+    return results
+
+
+def print_parity(results):
+    print(f"{'graph':<14} {'parser':<7} {'mode':<12} {'seconds':>8} {'files/s':>9} {'vs ref':>7}  parity")
+    reference = None
+    for result in results:
+        if result['mode'] == 'reference':
+            reference = result['seconds']
+        differences = result['differences']
+        print(f"{result['graph']:<14} {result['page_parser']:<7} {result['mode']:<12} {result['seconds']:>8.3f} "
+              f"{result['files'] / result['seconds']:>9.1f} {reference / result['seconds']:>6.2f}x  "
+              + ("identical" if not differences else f"{len(differences)} differences"))
+    for result in results:
+        for difference in result['differences'][:20]:
+            print(f"{result['graph']} {result['page_parser']} {result['mode']}: {difference}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the vaults of the optimized conversion modes with the reference conversion.")
+    parser.add_argument("--graph", action="append", default=[], help="A fixture graph to convert as well (repeatable).")
+    parser.add_argument("--no-synthetic", action="store_true", help="Do not convert the synthetic graphs.")
+    parser.add_argument("--no-golden", action="store_true", help="Do not convert the fixture graphs with golden vaults (tests/golden).")
+    parser.add_argument("--update-golden", action="store_true",
+                        help="Write the golden vaults of the fixture graphs again with the reference conversion, and exit.")
+    parser.add_argument("--mode", action="append", choices=MODES, help="A mode to compare (repeatable, default: all).")
+    parser.add_argument("--page-parser", action="append", choices=logseq_to_obsidian.PAGE_PARSERS,
+                        help="A page parser to compare the modes with (repeatable, default: all).")
+    parser.add_argument("-j", "--jobs", type=int, default=2, help="Worker processes of the parallel modes (default: 2).")
+    parser.add_argument("--work-dir", help="Directory for the synthetic graphs and the vaults (default: a temporary directory).")
+    parser.add_argument("--json", help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR, format=logseq_to_obsidian.LOG_FORMAT)
+
+    with tempfile.TemporaryDirectory(prefix="logseq-parity-") as tmp:
+        work_path = Path(args.work_dir or tmp)
+        if args.update_golden:
+            for name, (graph, vault) in golden_graphs().items():
+                convert(graph, work_path / name, **REFERENCE)
+                write_golden(vault, vault_files(work_path / name))
+                print(f"Wrote the golden vault {vault}")
+            sys.exit(0)
+        graphs, golden = {}, {}
+        if not args.no_golden:
+            for name, (graph, vault) in golden_graphs().items():
+                # converted from a copy, the incremental mode changes the graph while it runs
+                graphs[name] = work_path / "graphs" / name
+                if graphs[name].exists():
+                    shutil.rmtree(graphs[name])
+                shutil.copytree(graph, graphs[name])
+                golden[name] = vault
+        if not args.no_synthetic:
+            for name, params in CORPUS.items():
+                graph_path = work_path / "graphs" / name
+                if graph_path.exists():
+                    shutil.rmtree(graph_path)
+                generate_graph(graph_path, **params)
+                graphs[name] = graph_path
+        for graph in args.graph:
+            # converted from a copy, the incremental mode changes the graph while it runs
+            graph_path = work_path / "graphs" / Path(graph).name
+            if graph_path.exists():
+                shutil.rmtree(graph_path)
+            shutil.copytree(graph, graph_path)
+            graphs[Path(graph).name] = graph_path
+        results = run_parity(graphs, args.mode or tuple(MODES), args.page_parser or logseq_to_obsidian.PAGE_PARSERS,
+                             jobs=args.jobs, work_path=work_path / "vaults", golden=golden)
+
+    print_parity(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    sys.exit(1 if any(result['differences'] for result in results) else 0)
@@ -1,5 +1,48 @@
+import io
+import json
+import os
+import pickle
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+import time
 import unittest
-from logseq_to_obsidian import from_logseq_line
+import zipfile
+from unittest import mock
+from pathlib import Path
+
+import logseq_to_obsidian
+import parity_logseq_to_obsidian
+from logseq_to_obsidian import from_logseq_line, replace_any_linked_items, replace_tags, FileIndex
+
+
+def make_graph(root):
+    """Writes a small Logseq graph to root and returns its path."""
+    graph = Path(root) / "graph"
+    for name, content in {
+        "pages/Start.md": "alias:: Begin\ntags:: [a, b]\n\n- Hello #beta and [[Projects/Alpha]]\n\t- TODO task ![img](../assets/x.png)\n",
+        "pages/beta.md": "- beta page\n",
+        "pages/Projects___Alpha.md": "- DONE alpha #Start\n",
+        "journals/2024_01_01.md": "- NOW journal [[beta]]\n",
+        "assets/x.png": "png",
+    }.items():
+        path = graph / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content, encoding="utf-8")
+    return graph
+
+
+def convert_graph(graph, vault, block_refs=False, **kwargs):
+    """Runs a full conversion the way the command line does, returns {relative path: bytes}."""
+    logseq_to_obsidian.logseq_graph_path = graph.resolve()
+    logseq_to_obsidian.file_index = logseq_to_obsidian.create_file_index(graph.resolve(), block_refs=block_refs)
+    logseq_to_obsidian.migration_errors.clear()
+    logseq_to_obsidian.convert_logseq_to_obsidian(graph, vault, force_overwrite=True, clean=True, **kwargs)
+    return {str(path.relative_to(vault)): path.read_bytes() for path in sorted(vault.rglob("*")) if path.is_file()}
+
 
 class TestFromLogseqLine(unittest.TestCase):
     def test_remove_leading_bullets(self):
@@ -27,6 +70,762 @@ class TestFromLogseqLine(unittest.TestCase):
         self.assertEqual(from_logseq_line("This is a normal line"), "This is a normal line")
         self.assertEqual(from_logseq_line("  Indented line"), "  Indented line")
 
+class TestInlineRules(unittest.TestCase):
+    def setUp(self):
+        self.saved_index = logseq_to_obsidian.file_index
+        logseq_to_obsidian.file_index = FileIndex({"beta": "pages/beta.md"}).build_lookup()
+
+    def tearDown(self):
+        logseq_to_obsidian.file_index = self.saved_index
+
+    def test_links(self):
+        self.assertEqual(from_logseq_line("- see [[a/b]] and #[[c/d]]"), "see [[a___b]] and #[[c___d]]")
+        self.assertEqual(from_logseq_line("[[a___b]]", namespaceToFolder=True), "[[a\\/b]]")
+
+    def test_excalidraw_render(self):
+        self.assertEqual(from_logseq_line("- {{renderer excalidraw, excalidraw-2025-04-07-16-22-56}}"),
+                         "![[Excalidraw/excalidraw-2025-04-07-16-22-56]]")
+
+    def test_tags(self):
+        self.assertEqual(from_logseq_line("- DONE with #beta and #gamma"), "- [x] with #[[beta]] and #gamma")
+        self.assertEqual(from_logseq_line("#beta in [[beta]]"), "#[[beta]] in [[beta]]")
+
+    def test_helpers_only_touch_matches(self):
+        self.assertEqual(replace_tags("a beta #beta alphabeta"), "a beta #[[beta]] alphabeta")
+        self.assertEqual(replace_any_linked_items("x/y [[x/y]] x/y"), "x/y [[x___y]] x/y")
+
+
+class TestPropertyBlock(unittest.TestCase):
+    LINES = ["alias:: Foo", "tags:: [a, b]", "", "public:: true", "rank:: 3", "- body", "late:: property"]
+
+    def test_parse(self):
+        block = logseq_to_obsidian.parse_property_block(self.LINES)
+        self.assertEqual(block.properties, {"alias": "Foo", "tags": ["a", "b"], "public": True, "rank": 3})
+        self.assertEqual(block.raw["tags"], "[a, b]")
+        self.assertEqual(block.end, 5)
+        self.assertEqual(logseq_to_obsidian.parse_property_block(self.LINES, allow_blank=False).end, 2)
+
+    def test_frontmatter(self):
+        block = logseq_to_obsidian.parse_property_block(self.LINES)
+        self.assertEqual(logseq_to_obsidian.format_frontmatter(block.properties),
+                         "---\ntags:\n  - a\n  - b\npublic: true\nrank: 3\naliases: Foo\n---\n\n")
+        self.assertEqual(logseq_to_obsidian.format_frontmatter({}), "")
+
+
+class TestBlockTree(unittest.TestCase):
+    PAGE = ("title:: T\n\n- top #beta\n  more\ttext\n\t- child [[a/b]]\n\t  id:: 6624f4c2-6e1a-4b2b-9a4e-1f1e8d3a0b7c\n"
+            "\t\t- TODO grand\n\t- ```python\n\t  # [[x/y]] #beta\n\t  - TODO not a task\n\t  ```\n- ![i](../assets/a.png)\n")
+
+    def setUp(self):
+        self.saved_index = logseq_to_obsidian.file_index
+        logseq_to_obsidian.file_index = FileIndex({"beta": "pages/beta.md"}).build_lookup()
+
+    def tearDown(self):
+        logseq_to_obsidian.file_index = self.saved_index
+
+    def test_parse(self):
+        blocks = list(logseq_to_obsidian.parse_blocks(self.PAGE.splitlines(), 2))
+        self.assertEqual([(block.depth, block.marker) for block in blocks], [(0, None), (1, None), (2, "TODO"), (1, None), (0, None)])
+        self.assertEqual(blocks[1].properties, {"id": "6624f4c2-6e1a-4b2b-9a4e-1f1e8d3a0b7c"})
+        self.assertEqual(blocks[2].lines, ["grand"])
+        self.assertEqual(blocks[3].fenced, {0, 1, 2, 3})
+
+    def test_convert(self):
+        self.assertEqual(logseq_to_obsidian.convert_page_content(self.PAGE, page_parser="blocks"),
+                         "---\ntitle: T\n---\n\ntop #[[beta]]\n  more\ttext\nchild [[a___b]]\n  id:: 6624f4c2-6e1a-4b2b-9a4e-1f1e8d3a0b7c\n"
+                         "\t- [ ] grand\n```python\n  # [[x/y]] #beta\n  - TODO not a task\n  ```\n![i](assets/a.png)")
+
+
+class TestFileIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = FileIndex({
+            "Projects/Alpha": "pages/Projects___Alpha.md",
+            "meeting": "journals/meeting.md",
+        }).build_lookup()
+
+    def test_direct_lookup(self):
+        self.assertEqual(self.index.resolve("meeting"), "journals/meeting.md")
+        self.assertEqual(self.index.stats["direct"], 1)
+
+    def test_fallback_forms(self):
+        self.assertEqual(self.index.resolve("Projects___Alpha"), "pages/Projects___Alpha.md")
+        self.assertEqual(self.index.resolve("pages/Projects___Alpha"), "pages/Projects___Alpha.md")
+        self.assertEqual(self.index.resolve("pages/Projects/Alpha"), "pages/Projects___Alpha.md")
+        self.assertEqual(self.index.resolve("projects/alpha"), "pages/Projects___Alpha.md")
+        self.assertEqual(self.index.stats["fallback"], 4)
+
+    def test_miss(self):
+        self.assertIsNone(self.index.resolve("nothing"))
+        self.assertEqual(self.index.stats["miss"], 1)
+
+    def test_scope(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            graph = make_graph(tmp)
+            for name in ("logseq/bak/pages/beta.md", "pages/.recycle/old.md", "pages/archive/Old.md", "pages/.DS_Store"):
+                (graph / name).parent.mkdir(parents=True, exist_ok=True)
+                (graph / name).write_text("- x\n", encoding="utf-8")
+            index = logseq_to_obsidian.create_file_index(graph)
+            self.assertEqual(dict(index), {"Start": "pages/Start.md", "beta": "pages/beta.md", "Projects/Alpha": "pages/Projects___Alpha.md",
+                                           "Old": "pages/archive/Old.md", "2024_01_01": "journals/2024_01_01.md"})
+            index = logseq_to_obsidian.create_file_index(graph, include=["pages/*"], exclude=["pages/archive", "*/.*"])
+            self.assertEqual(set(index), {"Start", "beta", "Projects/Alpha"})
+        self.assertFalse(logseq_to_obsidian.in_index_scope("pages/archive/Old.md", ["pages/*"], ["pages/archive"]))
+        self.assertTrue(logseq_to_obsidian.in_index_scope("pages/Old.md", ["pages/*"], ["pages/archive"]))
+
+    def test_aliases(self):
+        self.index.add_alias("Alpha Project", "pages/Projects___Alpha.md")
+        self.index.add_alias("meeting", "pages/Projects___Alpha.md")
+        self.index.build_lookup()
+        self.assertEqual(self.index.resolve_with_kind("alpha project"), ("pages/Projects___Alpha.md", "alias"))
+        self.assertEqual(self.index.resolve_with_kind("meeting"), ("journals/meeting.md", "direct"))
+        self.assertEqual(self.index.stats["alias"], 1)
+
+    def test_update_lookup_matches_build(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            graph = make_graph(tmp)
+            # names several pages claim: case variants, and an alias the way of a page name
+            for name, content in {"Foo.md": "- foo\n", "FOO.md": "- FOO\n", "gamma.md": "alias:: foo, Delta\n\n- g\n",
+                                  "delta.md": "alias:: DELTA\n\n- d\n"}.items():
+                (graph / "pages" / name).write_text(content, encoding="utf-8")
+            memory = logseq_to_obsidian.create_file_index(graph)
+            disk = logseq_to_obsidian.create_file_index(graph, index_db=Path(tmp) / "index.db")
+            (graph / "pages/Foo.md").unlink()
+            (graph / "pages/delta.md").unlink()
+            (graph / "pages/fOO.md").write_text("alias:: Delta\n\n- fOO\n", encoding="utf-8")
+            (graph / "pages/gamma.md").write_text("- no aliases\n", encoding="utf-8")
+            for index in (memory, disk):
+                logseq_to_obsidian.update_file_index(index, graph, ["pages/fOO.md", "pages/gamma.md"], ["pages/Foo.md", "pages/delta.md"])
+            built = FileIndex(memory)
+            built.aliases = dict(memory.aliases)
+            built.build_lookup()
+            self.assertEqual(memory.lookup, built.lookup)
+            self.assertEqual(memory.lookup_claims, built.lookup_claims)
+            self.assertEqual(memory.alias_lookup, built.alias_lookup)
+            self.assertEqual(memory.lookup["foo"], "pages/FOO.md")
+            self.assertEqual(memory.resolve("delta"), "pages/fOO.md")
+            self.assertEqual(dict(disk.lookup.items()), built.lookup)
+            self.assertEqual(dict(disk.alias_lookup.items()), built.alias_lookup)
+            disk.build_lookup()
+            self.assertEqual(dict(disk.lookup.items()), built.lookup)
+            self.assertEqual(dict(disk.lookup_claims.items()), {name: json.dumps(claims) for name, claims in built.lookup_claims.items()})
+            disk.db.close()
+
+    def test_read_page_aliases(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            page = Path(tmp) / "page.md"
+            properties = "".join(f"prop-{i}:: value {i}\n" for i in range(500)) # longer than the first read
+            page.write_text(properties + "alias:: [[One]], two\n\n- alias:: not a property\n", encoding="utf-8")
+            self.assertEqual(logseq_to_obsidian.read_page_aliases(page), ["One", "two"])
+            page.write_text("- body\nalias:: late\n", encoding="utf-8")
+            self.assertEqual(logseq_to_obsidian.read_page_aliases(page), [])
+
+    def test_disk_index_matches_memory(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            graph = make_graph(tmp)
+            (graph / "pages/beta.md").write_text("- beta\n  id:: 6650a1b2-0000-4000-8000-000000000001\n", encoding="utf-8")
+            memory = logseq_to_obsidian.create_file_index(graph, block_refs=True)
+            disk = logseq_to_obsidian.create_file_index(graph, block_refs=True, index_db=Path(tmp) / "index.db")
+            self.assertIsInstance(disk, logseq_to_obsidian.DiskFileIndex)
+            self.assertEqual(dict(disk), dict(memory))
+            self.assertEqual(disk.digest(), memory.digest())
+            names = ["Start", "begin", "projects/alpha", "Projects___Alpha", "nothing", "((6650a1b2-0000-4000-8000-000000000001))"]
+            self.assertEqual([disk.resolve_with_kind(name) for name in names], [memory.resolve_with_kind(name) for name in names])
+            # worker processes open the same database
+            self.assertEqual(pickle.loads(pickle.dumps(disk)).resolve("begin"), "pages/Start.md")
+
+            (graph / "pages/beta.md").unlink()
+            (graph / "pages/gamma.md").write_text("alias:: g\n\n- gamma\n", encoding="utf-8")
+            for index in (memory, disk):
+                logseq_to_obsidian.update_file_index(index, graph, ["pages/gamma.md"], ["pages/beta.md"])
+            self.assertEqual(disk.digest(), memory.digest())
+            self.assertEqual(disk.resolve("G"), "pages/gamma.md")
+            self.assertIsNone(disk.find_block("6650a1b2-0000-4000-8000-000000000001"))
+            # indexing a page again reuses its number in block_pages
+            (graph / "pages/gamma.md").write_text("- gamma\n  id:: 6650a1b2-0000-4000-8000-000000000002\n", encoding="utf-8")
+            (graph / "pages/delta.md").write_text("- delta\n  id:: 6650a1b2-0000-4000-8000-000000000003\n", encoding="utf-8")
+            for index in (memory, disk):
+                logseq_to_obsidian.update_file_index(index, graph, ["pages/gamma.md", "pages/delta.md"], [])
+            for _ in range(3):
+                for index in (memory, disk):
+                    logseq_to_obsidian.update_file_index(index, graph, ["pages/gamma.md"], [])
+            self.assertEqual(len(memory.block_pages), 2)
+            self.assertEqual(sorted(disk.block_pages), [0, 1])
+            self.assertEqual(disk.digest(), memory.digest())
+            self.assertEqual(disk.find_block("6650a1b2-0000-4000-8000-000000000002"),
+                             memory.find_block("6650a1b2-0000-4000-8000-000000000002"))
+            disk.db.close()
+
+class TestTransferFile(unittest.TestCase):
+    def test_link_modes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source = Path(tmp) / "source.png"
+            source.write_bytes(b"image")
+            for link_mode in logseq_to_obsidian.LINK_MODES:
+                target = Path(tmp) / f"{link_mode}.png"
+                self.assertIn(logseq_to_obsidian.transfer_file(source, target, link_mode), ("copied", "linked"))
+                self.assertEqual(target.read_bytes(), b"image")
+                self.assertEqual(logseq_to_obsidian.transfer_file(source, target, link_mode), "skipped")
+            self.assertTrue((Path(tmp) / "symlink.png").is_symlink())
+            self.assertTrue((Path(tmp) / "hardlink.png").samefile(source))
+
+    def test_changed_file_is_replaced(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source = Path(tmp) / "source.png"
+            source.write_bytes(b"image")
+            target = Path(tmp) / "target.png"
+            logseq_to_obsidian.transfer_file(source, target, "symlink")
+            source.write_bytes(b"new image")
+            self.assertEqual(logseq_to_obsidian.transfer_file(source, target, "copy"), "copied")
+            self.assertFalse(target.is_symlink())
+            self.assertEqual(source.read_bytes(), b"new image")
+
+    def test_link_mode_change(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source, target = Path(tmp) / "source.png", Path(tmp) / "target.png"
+            source.write_bytes(b"image")
+            logseq_to_obsidian.transfer_file(source, target, "hardlink")
+            self.assertEqual(logseq_to_obsidian.transfer_file(source, target, "copy"), "copied")
+            self.assertFalse(target.samefile(source))
+            self.assertEqual(logseq_to_obsidian.transfer_file(source, target, "copy"), "skipped")
+            self.assertEqual(logseq_to_obsidian.transfer_file(source, target, "hardlink"), "linked")
+            self.assertTrue(target.samefile(source))
+
+
+class TestExcalidraw(unittest.TestCase):
+    drawing = {"elements": [{"id": "a", "text": "x}y"}], "appState": {}, "files": {"f": {"dataURL": "data:" + "A" * 5000}}}
+
+    def convert(self, tmp, compact, drawing):
+        page = Path(tmp) / "excalidraw-2024-01-01-00-00-00.md"
+        page.write_text(f"excalidraw-plugin-alias:: /Sketch/\n- ```json\n  {drawing}\n  ```\n", encoding="utf-8")
+        vault = Path(tmp) / ("compact" if compact else "pretty")
+        logseq_to_obsidian.process_logseq_excalidraw_file(Path(tmp), page, vault, compact=compact)
+        content = (vault / page.name).read_text(encoding="utf-8")
+        self.assertIn("aliases: [Sketch]", content)
+        return json.loads(content.split("```json\n")[1].split("\n```")[0])
+
+    def test_compact_matches_pretty(self):
+        expected = dict(self.drawing, type="excalidraw", version=2, source="https://excalidraw.com")
+        with tempfile.TemporaryDirectory() as tmp:
+            for compact in (False, True):
+                self.assertEqual(self.convert(tmp, compact, json.dumps(self.drawing)), expected)
+            self.assertEqual(self.convert(tmp, True, "{}"), {"type": "excalidraw", "version": 2, "source": "https://excalidraw.com"})
+
+    def test_compact_replaces_existing_keys(self):
+        drawing = dict(type="excalidraw", version=2, source="https://logseq.com", **self.drawing)
+        drawing["elements"] = [{"id": "a", "type": "text", "text": "\"source\": {[x]}"}]
+        expected = dict(drawing, source="https://excalidraw.com")
+        with tempfile.TemporaryDirectory() as tmp:
+            for compact in (False, True):
+                self.assertEqual(self.convert(tmp, compact, json.dumps(drawing)), expected)
+            content = (Path(tmp) / "compact/excalidraw-2024-01-01-00-00-00.md").read_text(encoding="utf-8")
+        pairs = json.loads(content.split("```json\n")[1].split("\n```")[0], object_pairs_hook=list)
+        self.assertEqual([key for key, value in pairs], ["type", "version", "source", "elements", "appState", "files"])
+        for chunk_size in (1, 3, 64):
+            target = io.StringIO()
+            self.assertTrue(logseq_to_obsidian._stream_json_line(io.StringIO(json.dumps(drawing) + "\n"), target, chunk_size=chunk_size))
+            self.assertEqual(json.loads(target.getvalue()), expected)
+
+    def test_stream_in_small_chunks(self):
+        line = json.dumps(self.drawing) + " \n- ```\n"
+        for chunk_size in (1, 2, 7, 64):
+            target = io.StringIO()
+            self.assertTrue(logseq_to_obsidian._stream_json_line(io.StringIO(line), target, chunk_size=chunk_size))
+            self.assertEqual(json.loads(target.getvalue())["files"], self.drawing["files"])
+        self.assertFalse(logseq_to_obsidian._stream_json_line(io.StringIO('{"a": 1} x\n'), io.StringIO()))
+        self.assertFalse(logseq_to_obsidian._stream_json_line(io.StringIO('{"a": 1}'), io.StringIO()))
+
+
+class TestConvertGraph(unittest.TestCase):
+    def test_parallel_matches_serial(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            graph = make_graph(tmp)
+            serial = convert_graph(graph, Path(tmp) / "serial")
+            parallel = convert_graph(graph, Path(tmp) / "parallel", jobs=2)
+        self.assertIn("pages/Start.md", serial)
+        self.assertEqual(serial, parallel)
+
+    def test_io_pipeline_matches_in_line(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            graph = make_graph(tmp)
+            in_line = convert_graph(graph, Path(tmp) / "in-line", io_threads=0)
+            pipelined = convert_graph(graph, Path(tmp) / "pipelined", io_threads=2, read_ahead=1, write_behind=1)
+        self.assertEqual(in_line, pipelined)
+
+    def test_io_pipeline_write_error(self):
+        atomic_write = logseq_to_obsidian.atomic_write
+        def failing(path, *args, **kwargs):
+            if path.name == "beta.md":
+                raise OSError("disk full")
+            return atomic_write(path, *args, **kwargs)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            graph = make_graph(tmp)
+            with mock.patch.object(logseq_to_obsidian, "atomic_write", failing):
+                vault = convert_graph(graph, Path(tmp) / "vault", io_threads=2)
+        self.assertNotIn("pages/beta.md", vault)
+        self.assertIn("pages/Start.md", vault)
+        self.assertIn(b"beta.md:\n  - disk full", vault["migration-errors.md"])
+
+    def test_stream_errors(self):
+        atomic_write = logseq_to_obsidian.atomic_write
+        def failing(path, *args, **kwargs):
+            if path.name in ("beta.md", "Start.md"):
+                raise OSError("disk full")
+            return atomic_write(path, *args, **kwargs)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            graph = make_graph(tmp)
+            with mock.patch.object(logseq_to_obsidian, "atomic_write", failing):
+                kept = convert_graph(graph, Path(tmp) / "kept", io_threads=0)
+                streamed = convert_graph(graph, Path(tmp) / "streamed", io_threads=0, stream_errors=True)
+        self.assertIn(b"disk full", streamed["migration-errors.md"])
+        self.assertEqual(streamed["migration-errors.md"], kept["migration-errors.md"].replace(b"/kept/", b"/streamed/"))
+        self.assertIsInstance(logseq_to_obsidian.migration_errors, list)
+
+    def test_stream_errors_interrupted(self):
+        process_logseq_md_file = logseq_to_obsidian.process_logseq_md_file
+        def interrupted(md_file, *args, **kwargs):
+            if md_file.name == "beta.md":
+                raise KeyboardInterrupt
+            process_logseq_md_file(md_file, *args, **kwargs)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            graph = make_graph(tmp)
+            with mock.patch.object(logseq_to_obsidian, "process_logseq_md_file", interrupted):
+                with self.assertRaises(KeyboardInterrupt):
+                    convert_graph(graph, Path(tmp) / "streamed", stream_errors=True)
+            # the log of the interrupted run is not left behind to write the errors of the next one
+            self.assertIsInstance(logseq_to_obsidian.migration_errors, list)
+            logseq_to_obsidian.migration_errors.append("an error")
+            logseq_to_obsidian.convert_logseq_to_obsidian(graph, Path(tmp) / "kept", force_overwrite=True)
+            self.assertEqual((Path(tmp) / "kept/migration-errors.md").read_text(encoding="utf-8"), "- an error\n")
+            self.assertFalse((Path(tmp) / "streamed/migration-errors.md").exists())
+
+    def test_metrics_json(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            graph = make_graph(tmp)
+            logseq_to_obsidian.reset_metrics()
+            metrics_path = Path(tmp) / "metrics.json"
+            convert_graph(graph, Path(tmp) / "vault", metrics_json=metrics_path, metrics_top=2)
+            metrics = json.loads(metrics_path.read_text(encoding="utf-8"))
+        self.assertEqual(set(metrics["stages"]), {"index", "alias_index", "assets", "journals", "excalidraw", "pages", "draws"})
+        self.assertEqual(metrics["stages"]["pages"]["files"], 3)
+        self.assertEqual(metrics["files"]["count"], 4)
+        self.assertEqual(len(metrics["slowest"]), 2)
+        self.assertEqual(metrics["rules"]["todo"], 3)
+        self.assertEqual(metrics["rules"]["asset_link"], 1)
+
+    def test_referenced_assets_only(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            graph = make_graph(tmp)
+            (graph / "assets/orphan.png").write_text("orphan", encoding="utf-8")
+            vault = convert_graph(graph, Path(tmp) / "vault", referenced_assets_only=True)
+        self.assertIn("assets/x.png", vault)
+        self.assertNotIn("assets/orphan.png", vault)
+        self.assertEqual(vault["orphaned-assets.md"], b"- assets/orphan.png\n")
+
+    def test_orphans_removed_incrementally(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            graph = make_graph(tmp)
+            (graph / "assets/orphan.png").write_text("orphan", encoding="utf-8")
+            vault = Path(tmp) / "vault"
+            convert_graph(graph, vault, incremental=True, referenced_assets_only=True)
+            (graph / "assets/orphan.png").unlink()
+            self.assertTrue(logseq_to_obsidian.watch_graph(graph, vault, interval=0, debounce=0, polls=2))
+            self.assertFalse((vault / "orphaned-assets.md").exists())
+            (graph / "assets/other.png").write_text("other", encoding="utf-8")
+            self.assertIn("orphaned-assets.md", convert_graph(graph, vault, incremental=True, referenced_assets_only=True))
+            (graph / "assets/other.png").unlink()
+            rerun = convert_graph(graph, vault, incremental=True, referenced_assets_only=True)
+        self.assertIn("assets/x.png", rerun)
+        self.assertNotIn("orphaned-assets.md", rerun)
+
+    def test_incremental_matches_full(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            graph = make_graph(tmp)
+            vault = Path(tmp) / "incremental"
+            convert_graph(graph, vault, incremental=True)
+            # removing Start.md changes how #Start resolves in the unchanged Projects___Alpha.md
+            (graph / "pages/Start.md").unlink()
+            (graph / "pages/Other.md").write_text("- see #beta\n", encoding="utf-8")
+            incremental = convert_graph(graph, vault, incremental=True)
+            full = convert_graph(graph, Path(tmp) / "full")
+        self.assertEqual(incremental.pop(logseq_to_obsidian.MANIFEST_FILE)[:1], b"{")
+        self.assertNotIn("pages/Start.md", incremental)
+        self.assertIn(b"#Start", incremental["pages/Projects___Alpha.md"])
+        self.assertEqual(incremental, full)
+    def test_incremental_first_alias(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            graph = make_graph(tmp)
+            (graph / "pages/Start.md").write_text("- see [[Foo]]\n", encoding="utf-8") # no aliases in the graph
+            vault = Path(tmp) / "incremental"
+            convert_graph(graph, vault, incremental=True)
+            (graph / "pages/beta.md").write_text("alias:: Foo\n\n- beta page\n", encoding="utf-8")
+            incremental = convert_graph(graph, vault, incremental=True)
+            full = convert_graph(graph, Path(tmp) / "full")
+        incremental.pop(logseq_to_obsidian.MANIFEST_FILE)
+        self.assertEqual(incremental["pages/Start.md"], b"see [[beta|Foo]]")
+        self.assertEqual(incremental, full)
+
+    def test_incremental_after_errors(self):
+        atomic_write = logseq_to_obsidian.atomic_write
+        def failing(path, *args, **kwargs):
+            if path.name == "beta.md":
+                raise OSError("disk full")
+            return atomic_write(path, *args, **kwargs)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            graph = make_graph(tmp)
+            vault = Path(tmp) / "vault"
+            with mock.patch.object(logseq_to_obsidian, "atomic_write", failing):
+                first = convert_graph(graph, vault, incremental=True)
+            second = convert_graph(graph, vault, incremental=True)
+        self.assertIn("migration-errors.md", first)
+        # beta.md is written this time, the report of the first run is gone
+        self.assertIn("pages/beta.md", second)
+        self.assertNotIn("migration-errors.md", second)
+
+    def test_resume_after_interruption(self):
+        process_logseq_md_file = logseq_to_obsidian.process_logseq_md_file
+        def interrupted(md_file, *args, **kwargs):
+            if md_file.name == "beta.md":
+                raise KeyboardInterrupt # not caught like conversion errors
+            process_logseq_md_file(md_file, *args, **kwargs)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            graph = make_graph(tmp)
+            vault = Path(tmp) / "vault"
+            with mock.patch.object(logseq_to_obsidian, "process_logseq_md_file", interrupted):
+                with self.assertRaises(KeyboardInterrupt):
+                    convert_graph(graph, vault)
+            progress = (vault / logseq_to_obsidian.PROGRESS_FILE).read_text(encoding="utf-8").splitlines()
+            self.assertEqual([json.loads(line)["source"] for line in progress[1:]],
+                             ["journals/2024_01_01.md", "pages/Projects___Alpha.md", "pages/Start.md"])
+            self.assertFalse(list(vault.rglob(".*.tmp")))
+
+            logseq_to_obsidian.reset_metrics()
+            resumed = convert_graph(graph, vault, resume=True)
+            self.assertEqual(logseq_to_obsidian.stage_metrics["pages"]["files"], 1)
+            full = convert_graph(graph, Path(tmp) / "full")
+        self.assertEqual(resumed, full)
+        self.assertNotIn(logseq_to_obsidian.PROGRESS_FILE, resumed)
+
+    def test_watch_syncs_changes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            graph = make_graph(tmp)
+            vault = Path(tmp) / "vault"
+            convert_graph(graph, vault, incremental=True)
+            (graph / "pages/Projects___Alpha.md").unlink()
+            (graph / "pages/beta.md").write_text("- beta page, edited\n", encoding="utf-8")
+            (graph / "pages/gamma.md").write_text("- new page #beta\n", encoding="utf-8")
+            (graph / "assets/y.png").write_text("png", encoding="utf-8")
+            # one snapshot sees the changes, the next one (no more changes) syncs them
+            self.assertTrue(logseq_to_obsidian.watch_graph(graph, vault, interval=0, debounce=0, polls=2))
+            watched = {str(path.relative_to(vault)): path.read_bytes() for path in sorted(vault.rglob("*")) if path.is_file()}
+            full = convert_graph(graph, Path(tmp) / "full")
+        self.assertEqual(set(logseq_to_obsidian.file_index), {"Start", "beta", "gamma", "2024_01_01"})
+        # Start.md links to the removed page and is converted again, with the same output
+        self.assertEqual(watched.pop(logseq_to_obsidian.MANIFEST_FILE)[:1], b"{")
+        self.assertEqual(watched, full)
+
+    def test_watch_with_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            graph = make_graph(tmp)
+            (graph / "pages/A.md").write_text("- see #Foo\n", encoding="utf-8")
+            vault = Path(tmp) / "vault"
+            convert_graph(graph, vault, incremental=True, cache_dir=Path(tmp) / "cache")
+            self.assertEqual((vault / "pages/A.md").read_text(encoding="utf-8"), "see #Foo")
+            # #Foo resolves to the new page now, A.md must not come from the cache of the old index
+            (graph / "pages/Foo.md").write_text("- foo\n", encoding="utf-8")
+            self.assertTrue(logseq_to_obsidian.watch_graph(graph, vault, interval=0, debounce=0, polls=2))
+            self.assertEqual((vault / "pages/A.md").read_text(encoding="utf-8"), "see #[[Foo]]")
+
+    def test_watch_reports_errors(self):
+        atomic_write = logseq_to_obsidian.atomic_write
+        def failing(path, *args, **kwargs):
+            if path.name == "beta.md":
+                raise OSError("disk full")
+            return atomic_write(path, *args, **kwargs)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            graph = make_graph(tmp)
+            vault = Path(tmp) / "vault"
+            convert_graph(graph, vault, incremental=True)
+            self.assertFalse((vault / "migration-errors.md").exists())
+            (graph / "pages/beta.md").write_text("- changed\n", encoding="utf-8")
+            with mock.patch.object(logseq_to_obsidian, "atomic_write", failing):
+                self.assertTrue(logseq_to_obsidian.watch_graph(graph, vault, interval=0, debounce=0, polls=2))
+            self.assertIn("beta.md:\n  - disk full", (vault / "migration-errors.md").read_text(encoding="utf-8"))
+            # the bookkeeping is that of the last sync only
+            self.assertEqual(logseq_to_obsidian.migration_errors, [])
+            self.assertEqual(logseq_to_obsidian.file_timings.count, 1)
+
+    def test_snapshot_sources(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            graph = make_graph(tmp)
+            before = logseq_to_obsidian.snapshot_sources(graph)
+            (graph / "pages/beta.md").write_text("- changed\n", encoding="utf-8")
+            (graph / "assets/x.png").unlink()
+            changed, removed = logseq_to_obsidian.diff_snapshots(before, logseq_to_obsidian.snapshot_sources(graph))
+        self.assertEqual(sorted(before), ["assets/x.png", "journals/2024_01_01.md", "pages/Projects___Alpha.md",
+                                          "pages/Start.md", "pages/beta.md"])
+        self.assertEqual((changed, removed), ({"pages/beta.md"}, {"assets/x.png"}))
+
+    def test_walk_md_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            graph = make_graph(tmp)
+            (graph / "pages/Projects").mkdir()
+            (graph / "pages/Projects/Beta.md").write_text("- beta\n", encoding="utf-8")
+            (graph / "pages/notes.txt").write_text("not a page\n", encoding="utf-8")
+            walked = list(logseq_to_obsidian.walk_md_files(graph))
+            expected = sorted(md_file for md_file in graph.rglob("*.md") if md_file.is_file())
+        self.assertEqual(walked, expected)
+
+    def test_conversion_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            graph = make_graph(tmp)
+            cache_dir = Path(tmp) / "cache"
+            plain = convert_graph(graph, Path(tmp) / "plain", incremental=True)
+            first = convert_graph(graph, Path(tmp) / "first", incremental=True, cache_dir=cache_dir)
+            self.assertEqual(logseq_to_obsidian.conversion_cache.stats, {"hits": 0, "misses": 4, "evicted": 0})
+            second = convert_graph(graph, Path(tmp) / "second", incremental=True, cache_dir=cache_dir, jobs=2)
+            self.assertEqual(logseq_to_obsidian.conversion_cache.stats, {"hits": 4, "misses": 0, "evicted": 0})
+            convert_graph(graph, Path(tmp) / "folders", namespaceToFolder=True, cache_dir=cache_dir)
+            self.assertEqual(logseq_to_obsidian.conversion_cache.stats["misses"], 4)
+        self.assertEqual(first, plain)
+        self.assertEqual(second, plain) # including the dependencies in the manifest
+
+    def test_cache_eviction(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = logseq_to_obsidian.ConversionCache(tmp, "context", max_bytes=250)
+            for i in range(5):
+                cache.put(f"page {i}".encode(), {"content": "x" * 80, "assets": [], "deps": {}})
+                entry_path = cache._entry_path(f"page {i}".encode())
+                os.utime(entry_path, ns=(i * 10**9, i * 10**9))
+            self.assertIsNotNone(cache.get(b"page 0")) # now the most recently used
+            self.assertEqual(cache.evict(), 3)
+            self.assertIsNotNone(cache.get(b"page 0"))
+            self.assertIsNotNone(cache.get(b"page 4"))
+            self.assertIsNone(cache.get(b"page 1"))
+            self.assertEqual(cache.hit_rate(), 0.75)
+
+    def test_block_references(self):
+        block = "6624f4c2-6e1a-4b2b-9a4e-1f1e8d3a0b7c"
+        unknown = "00000000-0000-4000-8000-000000000000"
+        with tempfile.TemporaryDirectory() as tmp:
+            graph = make_graph(tmp)
+            (graph / "pages/beta.md").write_text(f"- beta page\n\t- quoted block\n\t  id:: {block}\n", encoding="utf-8")
+            (graph / "journals/2024_01_02.md").write_text(
+                f"- see (({block})) and (({unknown}))\n- {{{{embed (({block}))}}}}\n", encoding="utf-8")
+            plain = convert_graph(graph, Path(tmp) / "plain")
+            vault = Path(tmp) / "vault"
+            converted = convert_graph(graph, vault, block_refs=True, incremental=True)
+            # moving the block reconverts the journal that refers to it
+            (graph / "pages/beta.md").write_text("- beta page\n", encoding="utf-8")
+            (graph / "pages/gamma.md").write_text(f"- quoted block\n  id:: {block}\n", encoding="utf-8")
+            moved = convert_graph(graph, vault, block_refs=True, incremental=True)
+        self.assertEqual(plain["journals/2024_01_02.md"], f"see (({block})) and (({unknown}))\n{{{{embed (({block}))}}}}".encode())
+        self.assertEqual(converted["pages/beta.md"], f"beta page\nquoted block\n  ^{block}".encode())
+        self.assertEqual(converted["journals/2024_01_02.md"],
+                         f"see [[pages/beta#^{block}]] and (({unknown}))\n![[pages/beta#^{block}]]".encode())
+        self.assertEqual(moved["journals/2024_01_02.md"],
+                         f"see [[pages/gamma#^{block}]] and (({unknown}))\n![[pages/gamma#^{block}]]".encode())
+
+    def test_aliases(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            graph = make_graph(tmp)
+            (graph / "pages/beta.md").write_text("- see #Begin and [[begin]], #[[Begin]] or [[Start]]\n", encoding="utf-8")
+            vault = convert_graph(graph, Path(tmp) / "vault")
+        self.assertEqual(vault["pages/beta.md"], b"see #[[Start|Begin]] and [[Start|begin]], #[[Start|Begin]] or [[Start]]")
+
+    def test_block_index(self):
+        index = FileIndex()
+        index.add_blocks("pages/beta", ["6624f4c2-6e1a-4b2b-9a4e-1f1e8d3a0b7c"])
+        self.assertEqual(index.resolve_block("6624f4c2-6e1a-4b2b-9a4e-1f1e8d3a0b7c"), "pages/beta")
+        self.assertIsNone(index.resolve_block("00000000-0000-4000-8000-000000000000"))
+        self.assertEqual((index.stats["block"], index.stats["block_miss"]), (1, 1))
+
+    def test_dedupe_assets(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            graph = make_graph(tmp)
+            (graph / "assets/y copy.png").write_text("png", encoding="utf-8")
+            (graph / "assets/other.png").write_text("abc", encoding="utf-8")
+            (graph / "pages/Copies.md").write_text("file:: ../assets/y%20copy.png\n\n- [x](../assets/y%20copy.png) ![other](../assets/other.png)\n", encoding="utf-8")
+            logseq_to_obsidian.reset_metrics()
+            vault = convert_graph(graph, Path(tmp) / "vault", dedupe_assets=True)
+            self.assertEqual(logseq_to_obsidian.stage_metrics["asset_dedupe"]["bytes_saved"], 3)
+            self.assertEqual(convert_graph(graph, Path(tmp) / "parallel", dedupe_assets=True, jobs=2), vault)
+            self.assertEqual(convert_graph(graph, Path(tmp) / "referenced", dedupe_assets=True, referenced_assets_only=True), vault)
+        self.assertEqual(sorted(name for name in vault if name.startswith("assets/")), ["assets/other.png", "assets/x.png"])
+        self.assertEqual(vault["pages/Copies.md"], b"---\nfile: ../assets/x.png\n---\n\n[x](assets/x.png) ![other](assets/other.png)")
+
+    def test_archive_matches_directory(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            graph = make_graph(tmp)
+            (graph / "assets/orphan.png").write_text("orphan", encoding="utf-8")
+            vault = convert_graph(graph, Path(tmp) / "vault", referenced_assets_only=True)
+            convert_graph(graph, Path(tmp) / "vault.zip", archive=True, jobs=2, referenced_assets_only=True)
+            with zipfile.ZipFile(Path(tmp) / "vault.zip") as archive:
+                zipped = {name: archive.read(name) for name in sorted(archive.namelist())}
+            convert_graph(graph, Path(tmp) / "vault.tar.gz", archive=True, compression_level=1, referenced_assets_only=True)
+            with tarfile.open(Path(tmp) / "vault.tar.gz") as archive:
+                tarred = {member.name: archive.extractfile(member).read() for member in archive.getmembers()}
+            self.assertFalse(logseq_to_obsidian.convert_logseq_to_obsidian(graph, Path(tmp) / "vault.zip", archive=True, incremental=True))
+            self.assertEqual(sorted(os.listdir(tmp)), ["graph", "vault", "vault.tar.gz", "vault.zip"])
+        self.assertIn("orphaned-assets.md", vault)
+        self.assertEqual(zipped, vault)
+        self.assertEqual(tarred, vault)
+
+    def test_archive_streams_large_members(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            graph = make_graph(tmp)
+            drawing = {"elements": [{"id": f"e{i}", "type": "rectangle"} for i in range(100)]}
+            (graph / "pages/excalidraw-2024-01-01-00-00-00.md").write_text(
+                f"excalidraw-plugin-alias:: /drawing/\n- ```json\n  {json.dumps(drawing)}\n  ```\n", encoding="utf-8")
+            (graph / "pages/excalidraw-2024-01-02-00-00-00.md").write_text("- no drawing\n", encoding="utf-8")
+            vault = convert_graph(graph, Path(tmp) / "vault")
+            with mock.patch.object(logseq_to_obsidian, "ARCHIVE_SPOOL_BYTES", 1024):
+                convert_graph(graph, Path(tmp) / "vault.zip", archive=True)
+                convert_graph(graph, Path(tmp) / "vault.tar", archive=True)
+            with zipfile.ZipFile(Path(tmp) / "vault.zip") as archive:
+                zipped = {name: archive.read(name) for name in sorted(archive.namelist())}
+                self.assertNotEqual(archive.getinfo("Excalidraw/excalidraw-2024-01-01-00-00-00.md").date_time[0], 1980)
+            with tarfile.open(Path(tmp) / "vault.tar") as archive:
+                tarred = {member.name: archive.extractfile(member).read() for member in archive.getmembers()}
+        self.assertGreater(len(vault["Excalidraw/excalidraw-2024-01-01-00-00-00.md"]), 1024)
+        self.assertEqual(zipped, vault)
+        self.assertEqual(tarred, vault)
+
+    def test_archive_removed_when_conversion_fails(self):
+        def failing(*args, **kwargs):
+            raise KeyboardInterrupt
+
+        with tempfile.TemporaryDirectory() as tmp:
+            graph = make_graph(tmp)
+            for name in ("vault.zip", "vault.tar.gz"):
+                with mock.patch.object(logseq_to_obsidian, "process_logseq_md_file", failing):
+                    with self.assertRaises(KeyboardInterrupt):
+                        convert_graph(graph, Path(tmp) / name, archive=True)
+                self.assertIsNone(logseq_to_obsidian.output_archive)
+            self.assertEqual(sorted(os.listdir(tmp)), ["graph"])
+
+
+class TestConverter(unittest.TestCase):
+    def test_convert_pages_in_memory(self):
+        saved = logseq_to_obsidian.file_index, logseq_to_obsidian.migration_errors
+        converter = logseq_to_obsidian.Converter(namespaceToFolder=True)
+        vault = converter.convert_graph({
+            "pages/Start.md": "alias:: Begin\n\n- Hello #beta and [[Projects/Alpha]] ![img](../assets/x.png)\n",
+            "pages/beta.md": io.StringIO("- beta page, see [[Begin]]\n"),
+            "pages/Projects___Alpha.md": io.BytesIO(b"- DONE alpha #Start\n"),
+        })
+        self.assertEqual(vault["pages/Projects/Alpha.md"], "- [x] alpha #[[Start]]")
+        self.assertEqual(vault["pages/beta.md"], "beta page, see [[Start|Begin]]")
+        self.assertEqual(converter.asset_references, {"x.png"})
+        self.assertEqual(converter.rule_hits["alias_link"], 1)
+        self.assertEqual(converter.convert_page(io.StringIO("- #beta")), "#[[beta]]")
+        # other converters and the module globals are not affected
+        self.assertEqual(logseq_to_obsidian.Converter().convert_page("- #Start"), "#Start")
+        self.assertIs(logseq_to_obsidian.file_index, saved[0])
+        self.assertIs(logseq_to_obsidian.migration_errors, saved[1])
+
+    def test_convert_graph_on_disk(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            graph = make_graph(tmp)
+            expected = convert_graph(graph, Path(tmp) / "expected")
+            converter = logseq_to_obsidian.Converter(jobs=2)
+            self.assertTrue(converter.convert_graph(graph, Path(tmp) / "vault", force_overwrite=True))
+            vault = Path(tmp) / "vault"
+            self.assertEqual({str(path.relative_to(vault)): path.read_bytes() for path in sorted(vault.rglob("*")) if path.is_file()}, expected)
+        self.assertEqual(converter.stage_metrics["pages"]["files"], 3)
+        self.assertEqual(converter.migration_errors, [])
+
+    def test_conversions_wait_for_a_running_converter(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            graph = make_graph(tmp)
+            logseq_to_obsidian.logseq_graph_path = graph.resolve()
+            logseq_to_obsidian.file_index = logseq_to_obsidian.create_file_index(graph.resolve())
+            started, release = threading.Event(), threading.Event()
+            def run_converter():
+                with logseq_to_obsidian.Converter().activated():
+                    started.set()
+                    release.wait()
+            results = []
+            converter = threading.Thread(target=run_converter)
+            converter.start()
+            started.wait()
+            conversion = threading.Thread(target=lambda: results.append(logseq_to_obsidian.convert_logseq_to_obsidian(
+                graph, Path(tmp) / "vault", io_threads=0)))
+            conversion.start()
+            conversion.join(0.2)
+            self.assertTrue(conversion.is_alive())
+            release.set()
+            converter.join()
+            conversion.join()
+            self.assertEqual(results, [True])
+            self.assertEqual((Path(tmp) / "vault/pages/beta.md").read_text(encoding="utf-8"), "beta page")
+
+    def test_import_leaves_logging_alone(self):
+        code = "import logging, logseq_to_obsidian; print(logging.getLogger().handlers)"
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                                cwd=Path(logseq_to_obsidian.__file__).parent).stdout
+        self.assertEqual(output.strip(), "[]")
+
+
+class TestLogging(unittest.TestCase):
+    def test_no_debug_messages_when_disabled(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            graph = make_graph(tmp)
+            with mock.patch.object(logseq_to_obsidian.logging, "debug") as debug, \
+                 mock.patch.object(logseq_to_obsidian, "debug_enabled", return_value=False):
+                convert_graph(graph, Path(tmp) / "vault", io_threads=0)
+        debug.assert_not_called()
+
+    def test_progress_reporter(self):
+        reporter = logseq_to_obsidian.ProgressReporter(4, interval=0.001)
+        with self.assertLogs(level="INFO") as logs:
+            for _ in range(2):
+                time.sleep(0.002)
+                reporter.update(lines=100)
+        self.assertEqual(len(logs.records), 2)
+        self.assertRegex(logs.records[-1].getMessage(), r"^Converted 2 of 4 files \(\d+ files/s, \d+ lines/s\), about \d+s left$")
+
+    def test_no_progress_when_disabled(self):
+        reporter = logseq_to_obsidian.ProgressReporter(4, interval=0)
+        with mock.patch.object(logseq_to_obsidian.logging, "info") as info:
+            reporter.update(lines=100)
+        info.assert_not_called()
+        self.assertEqual((reporter.files, reporter.lines), (1, 100))
+
+class TestParity(unittest.TestCase):
+    def test_modes_match_reference(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            graph = make_graph(tmp)
+            results = parity_logseq_to_obsidian.run_parity({"fixture": graph}, page_parsers=logseq_to_obsidian.PAGE_PARSERS,
+                                                           work_path=Path(tmp) / "vaults")
+        self.assertEqual([result["mode"] for result in results], 2 * ["reference", *parity_logseq_to_obsidian.MODES])
+        self.assertEqual({(result["page_parser"], result["mode"]): result["differences"] for result in results if result["differences"]}, {})
+
+    def test_golden_vaults(self):
+        golden = parity_logseq_to_obsidian.golden_graphs()
+        self.assertIn("fixture", golden)
+        with tempfile.TemporaryDirectory() as tmp:
+            graphs = {name: shutil.copytree(graph, Path(tmp) / "graphs" / name) for name, (graph, _) in golden.items()}
+            vaults = {name: vault for name, (_, vault) in golden.items()}
+            results = parity_logseq_to_obsidian.run_parity(graphs, page_parsers=logseq_to_obsidian.PAGE_PARSERS,
+                                                           work_path=Path(tmp) / "vaults", golden=vaults)
+            # a change of the rewriting every mode shares differs from the golden vault, the reference too
+            with mock.patch.dict(logseq_to_obsidian.TODO_MARKERS, DONE="[X]"):
+                changed = parity_logseq_to_obsidian.run_parity(graphs, modes=(), work_path=Path(tmp) / "changed", golden=vaults)
+        self.assertEqual({(result["graph"], result["page_parser"], result["mode"]): result["differences"]
+                          for result in results if result["differences"]}, {})
+        self.assertIn("differs: pages/Start.md line 12: b'- [x] set up ![diagram](assets/diagram.png)' != "
+                      "b'- [X] set up ![diagram](assets/diagram.png)'", changed[0]["differences"])
+
+    def test_diff_vaults(self):
+        differences = parity_logseq_to_obsidian.diff_vaults({"a.md": b"x\ny\n", "b.md": b""}, {"a.md": b"x\nz\n", "c.md": b""})
+        self.assertEqual(differences, ["missing: b.md", "extra: c.md", "differs: a.md line 2: b'y' != b'z'"])
+
 if __name__ == "__main__":
     unittest.main()
 